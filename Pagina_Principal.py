@@ -1,9 +1,6 @@
 import streamlit as st
-import pandas as pd
-import sqlalchemy
-import plotly.express as px
-from datetime import datetime, timedelta
-import queries  # Importa o novo arquivo de queries
+import filtros_globais
+import instrumentacao
 
 st.set_page_config(
     page_title="Visão Geral | Dashboard Restaurante",
@@ -11,186 +8,250 @@ st.set_page_config(
     layout="wide"
 )
 
+instrumentacao.iniciar_pagina("Visão Geral")
 
-@st.cache_resource
-def get_engine():
-    try:
-        conn_string = st.secrets["connections"]["neon_db"]
-        engine = sqlalchemy.create_engine(conn_string)
-        return engine
-    except Exception as e:
-        st.error(f"Erro ao conectar ao banco de dados: {e}")
-        st.stop()
-
-engine = get_engine()
-
-
-@st.cache_data(ttl=3600)
-def carregar_limites_de_data():
-    with engine.connect() as conn:
-        result = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone()
-    if result and result.min_date and result.max_date:
-        return result.min_date, result.max_date
-    fallback_start = datetime.now().date() - timedelta(days=30)
-    fallback_end = datetime.now().date()
-    return (fallback_start, fallback_end)
-
-@st.cache_data(ttl=600, show_spinner="Carregando dimensões...")
-def carregar_tabelas_dimensao():
-    with engine.connect() as conn:
-        df_stores = pd.read_sql(queries.SELECT_STORES, conn)
-        df_channels = pd.read_sql(queries.SELECT_CHANNELS, conn)
-        df_payment_types = pd.read_sql(queries.SELECT_PAYMENT_TYPES, conn)
-    return df_stores, df_channels, df_payment_types
-
-@st.cache_data(ttl=600, show_spinner="Carregando dados de vendas...")
-def carregar_dados_fato_e_explorer(start_date, end_date):
-    end_date_sql = end_date + timedelta(days=1)
-    
-    query_params = {"start": start_date, "end": end_date_sql}
-    
-    with engine.connect() as conn:
-        
-        df_analysis_data = pd.read_sql(queries.SELECT_ANALYSIS_DATA, conn, params=query_params)
-
-        if df_analysis_data.empty:
-            return pd.DataFrame(), pd.DataFrame()
-
-        sales_ids_list = df_analysis_data['sale_id'].unique().tolist()
-        sales_ids = tuple(sales_ids_list) 
-        if not sales_ids:
-            return df_analysis_data, pd.DataFrame()
-
-        
-        sql_payments_query = f"SELECT sale_id, payment_type_id, value FROM payments WHERE sale_id IN {sales_ids}"
-        
-        
-        df_payments = pd.read_sql(sql_payments_query, conn)
-
-    return df_analysis_data, df_payments
-
-@st.cache_data(ttl=600, show_spinner="Analisando comportamento dos clientes...")
-def carregar_dados_rfm(data_referencia):
-    
-    query_params = {"data_ref": data_referencia}
-    
-    with engine.connect() as conn:
-        
-        df = pd.read_sql(queries.SELECT_RFM, conn, params=query_params)
-    return df
+if "diagnostico" in st.query_params:
+    instrumentacao.renderizar_painel()
+    st.stop()
 
+engine = filtros_globais.get_engine()
+filtros = filtros_globais.barra_lateral(comparar=True)
+start_date, end_date = filtros.start_date, filtros.end_date
+selected_store_names, selected_channel_names = filtros.lojas, filtros.canais
+filtrar_lojas_e_canais = filtros.filtrar
 
-min_date, max_date = carregar_limites_de_data()
-df_stores, df_channels, df_payment_types = carregar_tabelas_dimensao()
+modo_ao_vivo = st.sidebar.toggle(
+    "Modo ao vivo (hoje)",
+    help="Atualiza os indicadores do dia atual a cada poucos segundos, buscando apenas os pedidos novos."
+)
 
-st.sidebar.header("Filtros Globais")
-st.sidebar.write("Estes filtros afetam **todas** as páginas do dashboard.")
+instrumentacao.etapa("bootstrap")
 
-default_start = max(min_date, max_date - timedelta(days=30))
-default_end = max_date
+# Só depois da barra lateral desenhada: pandas, plotly e os carregadores
+# levam quase um segundo para importar numa partida fria.
+import plotly.express as px
+import cancelamento
+import carregadores
+import graficos
+import indicadores
+import limites_consulta
 
-date_range = st.sidebar.date_input(
-    "Selecione o Período",
-    (default_start, default_end),
-    min_value=min_date,
-    max_value=max_date,
-    format="DD/MM/YYYY"
-)
-if len(date_range) != 2:
-    st.sidebar.error("Por favor, selecione um período de início e fim.")
-    st.stop()
-start_date, end_date = date_range
+filtros_globais.iniciar_pre_aquecimento(engine)
 
-store_options = ["Todas as Lojas"] + df_stores['store_name'].tolist()
-selected_store_names = st.sidebar.multiselect(
-    "Selecione as Lojas",
-    options=store_options,
-    default=["Todas as Lojas"]
-)
+_, _, df_payment_types = filtros_globais.carregar_tabelas_dimensao()
 
-channel_options = ["Todos os Canais"] + df_channels['channel_name'].tolist()
-selected_channel_names = st.sidebar.multiselect(
-    "Selecione os Canais",
-    options=channel_options,
-    default=["Todos os Canais"]
-)
+def carregar_recortes_vendas(start_date, end_date):
+    with st.spinner("Aplicando os filtros..."):
+        return cancelamento.executar(carregadores.recortes_vendas, engine, start_date, end_date, *filtros.nomes())
 
-df_analysis_data, df_payments = carregar_dados_fato_e_explorer(start_date, end_date)
 
-if not df_analysis_data.empty:
-    df_analysis_data['created_at_date'] = pd.to_datetime(df_analysis_data['created_at']).dt.date
+def carregar_dados_fato_e_explorer(start_date, end_date):
+    with st.spinner("Carregando dados de vendas..."):
+        return cancelamento.executar(carregadores.dados_fato_e_explorer, engine, start_date, end_date)
+
+def carregar_dados_agregados(start_date, end_date):
+    with st.spinner("Agregando vendas no servidor..."):
+        try:
+            return cancelamento.executar(carregadores.dados_agregados, engine, start_date, end_date)
+        except limites_consulta.ConsultaCancelada:
+            st.error("A consulta excedeu o tempo limite. Reduza o período selecionado.")
+            st.stop()
+
+def carregar_sketch_clientes(start_date, end_date):
+    with st.spinner("Estimando clientes únicos..."):
+        try:
+            return cancelamento.executar(carregadores.sketch_clientes, engine, start_date, end_date)
+        except limites_consulta.ConsultaCancelada:
+            return None
+
+def carregar_serie_temporal(start_date, end_date):
+    granularidade = graficos.escolher_granularidade(start_date, end_date)
+    with st.spinner("Carregando série temporal..."):
+        try:
+            return granularidade, cancelamento.executar(carregadores.serie_temporal, engine, start_date, end_date, granularidade)
+        except limites_consulta.ConsultaCancelada:
+            st.error("A consulta excedeu o tempo limite. Reduza o período selecionado.")
+            st.stop()
+
+def carregar_agregado_diario(start_date, end_date):
+    with st.spinner("Carregando o período de comparação..."):
+        try:
+            return cancelamento.executar(carregadores.agregado_diario, engine, start_date, end_date)
+        except limites_consulta.ConsultaCancelada:
+            return None
+
+modo_agregado = limites_consulta.usar_modo_agregado(engine, start_date, end_date)
+if not modo_agregado:
+    try:
+        df_analysis_data, df_payments = carregar_dados_fato_e_explorer(start_date, end_date)
+    except limites_consulta.ConsultaCancelada:
+        modo_agregado = True
+if modo_agregado:
+    df_diario, df_horario, df_produtos_agg, df_pagamentos_agg = carregar_dados_agregados(start_date, end_date)
+    df_sketch_clientes = carregar_sketch_clientes(start_date, end_date)
+granularidade, df_serie = carregar_serie_temporal(start_date, end_date)
+instrumentacao.etapa("carga")
+
+if modo_agregado:
+    import contagem_distinta
+
+    limites_consulta.aviso_modo_agregado()
+    df_diario_filt = filtrar_lojas_e_canais(df_diario)
+    if df_diario.empty:
+        st.info("Nenhum dado de venda encontrado para o período selecionado.")
+    elif df_diario_filt.empty:
+        st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+
+    sem_vendas = df_diario_filt.empty
+    if not sem_vendas:
+        kpis = indicadores.visao_geral_agregada(df_diario_filt)
+        total_revenue = kpis['faturamento']
+        total_sales = kpis['pedidos']
+        # Estimativa HyperLogLog: clientes distintos não podem ser somados entre dias
+        total_customers = (
+            contagem_distinta.estimar(filtrar_lojas_e_canais(df_sketch_clientes)['registros'])
+            if df_sketch_clientes is not None else None
+        )
+        avg_prod_sec = kpis['preparo_seg']
+        avg_del_sec = kpis['entrega_seg']
+        df_pay_merged = filtrar_lojas_e_canais(df_pagamentos_agg).merge(df_payment_types, on='payment_type_id')
+        df_produtos_agrupados = filtrar_lojas_e_canais(df_produtos_agg).groupby('product_name')['product_total_price'].sum()
 else:
-    st.info("Nenhum dado de venda encontrado para o período selecionado.")
-
-df_analysis_filt = df_analysis_data.copy()
-if "Todas as Lojas" not in selected_store_names:
-    df_analysis_filt = df_analysis_filt[df_analysis_filt['store_name'].isin(selected_store_names)]
-if "Todos os Canais" not in selected_channel_names:
-    df_analysis_filt = df_analysis_filt[df_analysis_filt['channel_name'].isin(selected_channel_names)]
-
-if df_analysis_filt.empty and not df_analysis_data.empty:
-    st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+    if df_analysis_data.empty:
+        st.info("Nenhum dado de venda encontrado para o período selecionado.")
+
+    # Recortes compartilhados entre as sessões com os mesmos filtros (somente leitura)
+    df_sales_filt, df_explorer, df_payments_filt = carregar_recortes_vendas(start_date, end_date)
+
+    if df_sales_filt.empty and not df_analysis_data.empty:
+        st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+
+    sem_vendas = df_sales_filt.empty
+    if not sem_vendas:
+        total_revenue = df_sales_filt['total_amount'].sum()
+        total_sales = df_sales_filt['sale_id'].nunique()
+        total_customers = df_sales_filt['customer_id'].nunique()
+        avg_prod_sec = df_sales_filt['production_seconds'].mean()
+        avg_del_sec = df_sales_filt['delivery_seconds'].mean()
+        df_pay_merged = df_payments_filt.merge(df_payment_types, on='payment_type_id')
+        df_produtos_agrupados = df_explorer.groupby('product_name')['product_total_price'].sum()
+
+if not sem_vendas:
+    df_sales_time = filtrar_lojas_e_canais(df_serie).groupby('periodo')['total_amount'].sum().reset_index()
+
+# Os dois lados da comparação saem do agregado diário (cache separado das vendas)
+deltas = {}
+if filtros.comparacao and not sem_vendas:
+    inicio_comparacao, fim_comparacao = indicadores.periodo_de_comparacao(start_date, end_date, filtros.comparacao)
+    df_diario_atual = carregar_agregado_diario(start_date, end_date)
+    df_diario_comparacao = carregar_agregado_diario(inicio_comparacao, fim_comparacao)
+    if df_diario_atual is not None and df_diario_comparacao is not None:
+        deltas = indicadores.variacoes(
+            indicadores.visao_geral_agregada(filtrar_lojas_e_canais(df_diario_atual)),
+            indicadores.visao_geral_agregada(filtrar_lojas_e_canais(df_diario_comparacao))
+        )
 
-df_sales_filt = df_analysis_filt.drop_duplicates(subset=['sale_id'])
-df_explorer = df_analysis_filt.dropna(subset=['product_id'])
-sales_ids_filt = df_sales_filt['sale_id'].tolist()
-df_payments_filt = df_payments[df_payments['sale_id'].isin(sales_ids_filt)]
+instrumentacao.etapa("filtros")
 
 st.title("Seja bem-vinda, Maria")
 
-if df_sales_filt.empty:
+if modo_ao_vivo:
+    import tempo_real
+
+    @st.fragment(run_every=tempo_real.INTERVALO_SEGUNDOS)
+    def painel_ao_vivo():
+        buffer = tempo_real.buffer_de_hoje(engine)
+        lojas, canais = tempo_real.filtros_para_kpis(selected_store_names, selected_channel_names)
+        kpis = buffer.kpis(lojas, canais)
+
+        st.header("Hoje (ao vivo)")
+        if buffer.ultima_atualizacao:
+            st.caption(
+                f"Última atualização: {buffer.ultima_atualizacao.strftime('%H:%M:%S')}. "
+                "Os indicadores do período abaixo não incluem os pedidos novos."
+            )
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Faturamento Hoje", f"R$ {kpis['faturamento']:,.2f}")
+        col2.metric("Pedidos Hoje", f"{kpis['pedidos']}")
+        col3.metric("Ticket Médio Hoje", f"R$ {kpis['ticket_medio']:,.2f}")
+        col4.metric("Clientes Únicos Hoje", f"{kpis['clientes']}")
+
+        if not kpis['por_hora'].empty:
+            fig_hoje = px.line(
+                kpis['por_hora'], x='hora_dia', y='faturamento',
+                title="Faturamento por Hora (Hoje)",
+                labels={'hora_dia': 'Hora do Dia', 'faturamento': 'Faturamento'}
+            )
+            instrumentacao.plotly_chart(fig_hoje, width="stretch")
+
+    painel_ao_vivo()
+    st.markdown("---")
+
+if sem_vendas:
     st.warning("Nenhum dado de venda para exibir na Visão Geral com os filtros atuais.")
 else:
     st.header("Visão Geral")
-    total_revenue = df_sales_filt['total_amount'].sum()
-    total_sales = df_sales_filt['sale_id'].nunique()
+    if deltas:
+        st.caption(f"Variação em relação a {inicio_comparacao:%d/%m/%Y} – {fim_comparacao:%d/%m/%Y}.")
+    elif filtros.comparacao:
+        st.caption("A comparação excedeu o tempo limite do banco.")
     avg_ticket = total_revenue / total_sales if total_sales > 0 else 0
-    total_customers = df_sales_filt['customer_id'].nunique()
-    avg_prod_sec = df_sales_filt['production_seconds'].mean()
-    avg_del_sec = df_sales_filt['delivery_seconds'].mean()
+    delta = {chave: indicadores.formatar_variacao(variacao) for chave, variacao in deltas.items()}
 
     col1, col2, col3 = st.columns(3)
-    col1.metric("Faturamento Total", f"R$ {total_revenue:,.2f}")
-    col2.metric("Total de Pedidos", f"{total_sales}")
-    col3.metric("Ticket Médio", f"R$ {avg_ticket:,.2f}")
+    col1.metric("Faturamento Total", f"R$ {total_revenue:,.2f}", delta.get('faturamento'))
+    col2.metric("Total de Pedidos", f"{total_sales}", delta.get('pedidos'))
+    col3.metric("Ticket Médio", f"R$ {avg_ticket:,.2f}", delta.get('ticket_medio'))
     
     col4, col5, col6 = st.columns(3)
-    col4.metric("Clientes Únicos", f"{total_customers}")
-    col5.metric("Tempo Médio Preparo", f"{avg_prod_sec/60:,.1f} min" if avg_prod_sec else "N/A")
-    col6.metric("Tempo Médio Entrega", f"{avg_del_sec/60:,.1f} min" if avg_del_sec else "N/A")
+    if not modo_agregado:
+        col4.metric("Clientes Únicos", f"{total_customers}")
+    else:
+        col4.metric(
+            "Clientes Únicos", f"≈ {total_customers}" if total_customers is not None else "N/A",
+            help=(
+                f"Estimativa (HyperLogLog), erro padrão de cerca de {contagem_distinta.ERRO_PADRAO:.1%}."
+                if total_customers is not None else "A estimativa excedeu o tempo limite do banco."
+            )
+        )
+    # Tempo menor é melhor: queda em verde
+    col5.metric(
+        "Tempo Médio Preparo", f"{avg_prod_sec/60:,.1f} min" if avg_prod_sec else "N/A",
+        delta.get('preparo_seg'), delta_color="inverse"
+    )
+    col6.metric(
+        "Tempo Médio Entrega", f"{avg_del_sec/60:,.1f} min" if avg_del_sec else "N/A",
+        delta.get('entrega_seg'), delta_color="inverse"
+    )
 
     st.markdown("---")
     st.header("Análises Detalhadas")
     col_graf1, col_graf2 = st.columns(2)
 
     with col_graf1:
-        st.subheader("Vendas por Dia")
-        df_sales_time = df_sales_filt.groupby('created_at_date')['total_amount'].sum().reset_index()
+        st.subheader("Vendas ao Longo do Tempo")
         fig_time = px.line(
-            df_sales_time, x='created_at_date', y='total_amount',
-            title="Faturamento ao Longo do Tempo",
-            labels={'created_at_date': 'Data', 'total_amount': 'Faturamento'}
+            df_sales_time, x='periodo', y='total_amount',
+            title=f"Faturamento ao Longo do Tempo ({graficos.ROTULOS[granularidade]})",
+            labels={'periodo': 'Data', 'total_amount': 'Faturamento'}
         )
-        st.plotly_chart(fig_time, width="stretch")
+        instrumentacao.plotly_chart(fig_time, width="stretch")
 
     with col_graf2:
         st.subheader("Faturamento por Forma de Pagamento")
-        df_pay_merged = df_payments_filt.merge(df_payment_types, on='payment_type_id')
         df_sales_by_payment = df_pay_merged.groupby('payment_description')['value'].sum().reset_index()
         fig_payments = px.pie(
             df_sales_by_payment, names='payment_description', values='value',
             title="Distribuição por Forma de Pagamento"
         )
-        st.plotly_chart(fig_payments, width="stretch")
+        instrumentacao.plotly_chart(fig_payments, width="stretch")
 
     
     st.markdown("---")
     st.header("Análise de Produtos")
     col_prod_1, col_prod_2 = st.columns(2)
 
-    
-    df_produtos_agrupados = df_explorer.groupby('product_name')['product_total_price'].sum()
-
     with col_prod_1:
         st.subheader("Top 10 Produtos (Maior Faturamento)")
         df_top_products = df_produtos_agrupados.nlargest(10).reset_index()
@@ -200,7 +261,7 @@ else:
             x='product_total_price', y='product_name', orientation='h', title="Top 10 Produtos (Maior Faturamento)",
             labels={'product_name': 'Produto', 'product_total_price': 'Faturamento Total'}
         )
-        st.plotly_chart(fig_top_prods, width="stretch")
+        instrumentacao.plotly_chart(fig_top_prods, width="stretch")
 
     with col_prod_2:
         st.subheader("Top 10 Produtos (Menor Faturamento)")
@@ -214,4 +275,6 @@ else:
             labels={'product_name': 'Produto', 'product_total_price': 'Faturamento Total'},
             color_discrete_sequence=['#FF6347']
         )
-        st.plotly_chart(fig_bottom_prods, width="stretch")
\ No newline at end of file
+        instrumentacao.plotly_chart(fig_bottom_prods, width="stretch")
+
+instrumentacao.etapa("calculos e graficos")
@@ -0,0 +1,130 @@
+"""
+Benchmark da matriz de coortes (coortes.py) sobre todo o histórico.
+
+Mede, num processo só, a leitura das vendas pelo COPY binário (ler_vendas),
+o cálculo da matriz (matriz) e quanto o pico de RSS cresceu acima do
+processo já com os imports feitos. Com --sql também mede a mesma matriz
+calculada numa única consulta (GROUP BY por cliente e mês com o primeiro mês
+de cada cliente) e confere que os resultados são iguais.
+
+    python benchmarks/gerar_dados.py --dsn postgresql://postgres@localhost:5432/dashboard_bench_10m --escala 10M
+    python benchmarks/coortes.py --dsn postgresql://postgres@localhost:5432/dashboard_bench_10m --sql
+
+O período das coortes são os últimos --meses meses até a última venda.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import coortes  # noqa: E402
+import queries  # noqa: E402
+
+MATRIZ_SQL = """
+WITH vendas AS (
+    SELECT customer_id, date_trunc('month', created_at) AS mes, total_amount
+    FROM sales
+    WHERE customer_id IS NOT NULL AND total_amount IS NOT NULL AND created_at < %(end)s
+),
+por_mes AS (
+    SELECT customer_id, mes, COUNT(*) AS pedidos, SUM(total_amount) AS receita,
+           MIN(mes) OVER (PARTITION BY customer_id) AS coorte
+    FROM vendas
+    GROUP BY customer_id, mes
+)
+SELECT
+    (EXTRACT(YEAR FROM coorte) - 1970) * 12 + EXTRACT(MONTH FROM coorte) - 1 AS coorte,
+    (EXTRACT(YEAR FROM mes) - EXTRACT(YEAR FROM coorte)) * 12
+        + EXTRACT(MONTH FROM mes) - EXTRACT(MONTH FROM coorte) AS idade,
+    COUNT(*) AS clientes, SUM(pedidos) AS pedidos, SUM(receita) AS receita
+FROM por_mes
+WHERE coorte >= %(inicio)s
+GROUP BY 1, 2
+"""
+
+
+def pico_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir(engine, meses):
+    with engine.connect() as conn:
+        fim = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone().max_date
+    inicio = (fim.replace(day=1) - timedelta(days=31 * (meses - 1))).replace(day=1)
+
+    rss_inicial = pico_rss_mb()
+    t0 = time.perf_counter()
+    clientes, meses_venda, valores = coortes.ler_vendas(engine, fim + timedelta(days=1))
+    t1 = time.perf_counter()
+    df = coortes.matriz(clientes, meses_venda, valores, coortes.mes(inicio), coortes.mes(fim))
+    t2 = time.perf_counter()
+
+    resultado = {
+        "vendas": len(clientes),
+        "celulas": len(df),
+        "leitura_s": round(t1 - t0, 2),
+        "matriz_s": round(t2 - t1, 2),
+        "pico_rss_acima_dos_imports_mb": round(pico_rss_mb() - rss_inicial, 1),
+    }
+    return resultado, df, inicio, fim
+
+
+def medir_sql(engine, inicio, fim):
+    t0 = time.perf_counter()
+    with engine.connect() as conn:
+        df = pd.read_sql(MATRIZ_SQL, conn, params={"inicio": inicio, "end": fim + timedelta(days=1)})
+    return round(time.perf_counter() - t0, 2), df
+
+
+def conferir(df_numpy, df_sql):
+    chaves = ["coorte", "idade"]
+    esperado = df_sql.astype({"coorte": np.int64, "idade": np.int64}).set_index(chaves).sort_index()
+    obtido = df_numpy.astype({"coorte": np.int64, "idade": np.int64}).set_index(chaves)
+    obtido = obtido[obtido["clientes"] > 0].sort_index()
+    if not esperado.index.equals(obtido.index):
+        return False
+    return all(
+        np.allclose(obtido[coluna].to_numpy(dtype=float), esperado[coluna].to_numpy(dtype=float))
+        for coluna in ["clientes", "pedidos", "receita"]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da matriz de coortes.")
+    parser.add_argument("--dsn", default="postgresql://postgres@localhost:5432/dashboard_bench")
+    parser.add_argument("--meses", type=int, default=12, help="Coortes medidas, até a última venda")
+    parser.add_argument("--sql", action="store_true", help="Compara com a versão em uma única consulta")
+    parser.add_argument("--saida", help="Grava o resultado em JSON")
+    args = parser.parse_args()
+
+    engine = sqlalchemy.create_engine(args.dsn)
+    resultado, df, inicio, fim = medir(engine, args.meses)
+    print(
+        f"{resultado['vendas']:,} vendas: COPY + conversão {resultado['leitura_s']:.2f}s, "
+        f"matriz {resultado['matriz_s']:.2f}s, pico de RSS +{resultado['pico_rss_acima_dos_imports_mb']:.0f} MB"
+    )
+
+    if args.sql:
+        resultado["sql_s"], df_sql = medir_sql(engine, inicio, fim)
+        resultado["resultados_iguais"] = conferir(df, df_sql)
+        print(f"Consulta única: {resultado['sql_s']:.2f}s; resultados iguais: {resultado['resultados_iguais']}")
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultado, f, indent=2)
+    if args.sql and not resultado["resultados_iguais"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark ponta a ponta das páginas do dashboard.
+
+Cada página roda sem navegador (streamlit.testing.v1.AppTest) em um processo
+próprio, com um diretório de cache compartilhado vazio, para que o pico de RSS
+e o tempo medidos sejam os de uma carga fria. Para cada página registramos:
+
+- tempo da primeira execução (bootstrap com o período padrão);
+- tempo da execução com o período pedido em --dias;
+- pico de RSS do processo e linhas devolvidas pelo banco;
+- valores dos st.metric exibidos, para detectar mudanças de resultado.
+
+Uso:
+    python benchmarks/executar.py --dsn postgresql://postgres@localhost:5432/dashboard_bench
+    python benchmarks/executar.py --salvar-baseline
+    python benchmarks/executar.py --comparar benchmarks/baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PADRAO = os.path.join(RAIZ, "benchmarks", "baseline.json")
+METRICAS_COMPARADAS = ["tempo_s", "pico_rss_mb", "linhas"]
+
+
+def paginas():
+    return ["Pagina_Principal.py"] + sorted(
+        os.path.relpath(p, RAIZ) for p in glob.glob(os.path.join(RAIZ, "pages", "*.py"))
+    )
+
+
+def medir_pagina(pagina, dsn, dias):
+    """Roda dentro do subprocesso; imprime o resultado como JSON."""
+    import sqlalchemy
+    from sqlalchemy import event
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(RAIZ)
+    sys.path.insert(0, RAIZ)
+    import queries
+
+    engine = sqlalchemy.create_engine(dsn)
+    with engine.connect() as conn:
+        fim = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone().max_date
+    engine.dispose()
+
+    linhas = [0]
+
+    @event.listens_for(sqlalchemy.engine.Engine, "after_cursor_execute")
+    def contar_linhas(conn, cursor, statement, parameters, context, executemany):
+        if cursor.description is not None and cursor.rowcount > 0:
+            linhas[0] += cursor.rowcount
+
+    at = AppTest.from_file(pagina, default_timeout=3600)
+    at.secrets["connections"] = {"neon_db": dsn}
+
+    inicio = time.perf_counter()
+    at.run()
+    tempo_primeira = time.perf_counter() - inicio
+
+    linhas_primeira = linhas[0]
+    linhas[0] = 0
+    tempo = tempo_primeira
+    if at.sidebar.date_input:
+        at.sidebar.date_input[0].set_value((fim - timedelta(days=dias - 1), fim))
+        inicio = time.perf_counter()
+        at.run()
+        tempo = time.perf_counter() - inicio
+
+    erros = [e.message for e in at.exception] + [e.value for e in at.error]
+    return {
+        "tempo_primeira_execucao_s": round(tempo_primeira, 3),
+        "linhas_primeira_execucao": linhas_primeira,
+        "tempo_s": round(tempo, 3),
+        "pico_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "linhas": linhas[0],
+        "metricas": {m.label: m.value for m in at.metric},
+        "erros": erros,
+    }
+
+
+def executar(dsn, dias):
+    resultados = {}
+    for pagina in paginas():
+        with tempfile.TemporaryDirectory() as diretorio_cache:
+            env = dict(os.environ, DASHBOARD_CACHE_DIR=diretorio_cache)
+            processo = subprocess.run(
+                [sys.executable, __file__, "--pagina", pagina, "--dsn", dsn, "--dias", str(dias)],
+                env=env, capture_output=True, text=True,
+            )
+        if processo.returncode != 0:
+            print(processo.stderr, file=sys.stderr)
+            raise SystemExit(f"Falha ao medir {pagina}")
+        resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+        resultados[pagina] = resultado
+        print(f"{pagina}: {resultado['tempo_s']:.2f}s, {resultado['pico_rss_mb']:.0f} MB, {resultado['linhas']:,} linhas")
+        for erro in resultado["erros"]:
+            print(f"  ERRO: {erro}")
+    return resultados
+
+
+def comparar(resultados, baseline, tolerancia):
+    """Devolve True se alguma página piorou além da tolerância ou mudou de resultado."""
+    piorou = False
+    for pagina, atual in resultados.items():
+        anterior = baseline.get(pagina)
+        if not anterior:
+            print(f"{pagina}: sem baseline")
+            continue
+        for chave in METRICAS_COMPARADAS:
+            antes, depois = anterior[chave], atual[chave]
+            variacao = (depois - antes) / antes * 100 if antes else 0
+            marcador = ""
+            if variacao > tolerancia:
+                marcador = "  <-- PIOROU"
+                piorou = True
+            print(f"{pagina} {chave}: {antes} -> {depois} ({variacao:+.1f}%){marcador}")
+        if atual["metricas"] != anterior["metricas"]:
+            print(f"{pagina}: valores exibidos mudaram: {anterior['metricas']} -> {atual['metricas']}")
+            piorou = True
+    return piorou
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das páginas do dashboard.")
+    parser.add_argument("--dsn", default="postgresql://postgres@localhost:5432/dashboard_bench")
+    parser.add_argument("--dias", type=int, default=30, help="Tamanho do período medido")
+    parser.add_argument("--salvar-baseline", action="store_true")
+    parser.add_argument("--comparar", nargs="?", const=BASELINE_PADRAO, help="Arquivo de baseline")
+    parser.add_argument("--tolerancia", type=float, default=20.0, help="Piora aceitável em %%")
+    parser.add_argument("--saida", help="Grava os resultados desta execução em JSON")
+    parser.add_argument("--pagina", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.pagina:
+        print(json.dumps(medir_pagina(args.pagina, args.dsn, args.dias)))
+        return
+
+    resultados = executar(args.dsn, args.dias)
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    if args.salvar_baseline:
+        with open(BASELINE_PADRAO, "w") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Baseline salva em {BASELINE_PADRAO}")
+    if args.comparar:
+        with open(args.comparar) as f:
+            baseline = json.load(f)
+        if comparar(resultados, baseline, args.tolerancia):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Gerador de dados sintéticos para o esquema do dashboard.
+
+Cria lojas, canais, formas de pagamento, categorias, produtos, clientes,
+vendas, itens e pagamentos com uma semente fixa e carrega tudo via COPY em um
+Postgres local. As vendas são geradas em lotes, com ids crescentes no tempo,
+picos de almoço e jantar e lojas/produtos/clientes com popularidade desigual.
+
+Uso:
+    python benchmarks/gerar_dados.py --dsn postgresql://postgres@localhost:5432/bench --escala 1M
+"""
+import argparse
+import io
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+ESCALAS = {"1M": 1_000_000, "10M": 10_000_000, "50M": 50_000_000}
+TAMANHO_LOTE = 500_000
+
+CANAIS = [
+    ("Presencial", "P", 0.35), ("iFood", "D", 0.30), ("Rappi", "D", 0.10),
+    ("Uber Eats", "D", 0.08), ("WhatsApp", "D", 0.07), ("App Próprio", "D", 0.10),
+]
+FORMAS_PAGAMENTO = ["Dinheiro", "Cartão de Crédito", "Cartão de Débito", "Pix", "Vale Refeição"]
+CATEGORIAS = [
+    "Burgers", "Pizzas", "Porções", "Saladas", "Massas", "Pratos Executivos",
+    "Sobremesas", "Bebidas", "Cervejas", "Sucos", "Combos", "Adicionais",
+]
+CIDADES = ["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Curitiba", "Porto Alegre", "Recife", "Salvador"]
+N_PRODUTOS = 400
+
+# Distribuição dos pedidos ao longo do dia (picos no almoço e no jantar)
+PESOS_HORA = np.array([
+    1, 0.5, 0.2, 0.1, 0.1, 0.2, 0.5, 1, 2, 3, 5, 12,
+    16, 12, 5, 3, 3, 5, 10, 15, 16, 12, 6, 3,
+])
+PESOS_HORA = PESOS_HORA / PESOS_HORA.sum()
+
+
+def _pesos_zipf(n, expoente):
+    pesos = 1.0 / np.arange(1, n + 1) ** expoente
+    return pesos / pesos.sum()
+
+
+def _copiar(conn_bruta, tabela, df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    with conn_bruta.cursor() as cur:
+        cur.copy_expert(f"COPY {tabela} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def gerar_dimensoes(rng, n_vendas):
+    n_lojas = int(np.clip(n_vendas // 20_000, 10, 1000))
+    n_clientes = max(1_000, n_vendas // 8)
+
+    ids_lojas = np.arange(1, n_lojas + 1)
+    df_stores = pd.DataFrame({
+        "id": ids_lojas,
+        "name": [f"Loja {i:04d}" for i in ids_lojas],
+        "city": rng.choice(CIDADES, size=n_lojas),
+        "is_active": rng.random(n_lojas) > 0.03,
+    })
+    df_channels = pd.DataFrame({
+        "id": np.arange(1, len(CANAIS) + 1),
+        "name": [nome for nome, _, _ in CANAIS],
+        "type": [tipo for _, tipo, _ in CANAIS],
+    })
+    df_payment_types = pd.DataFrame({
+        "id": np.arange(1, len(FORMAS_PAGAMENTO) + 1),
+        "description": FORMAS_PAGAMENTO,
+    })
+    df_categories = pd.DataFrame({
+        "id": np.arange(1, len(CATEGORIAS) + 1),
+        "name": CATEGORIAS,
+    })
+    ids_produtos = np.arange(1, N_PRODUTOS + 1)
+    categorias_produtos = rng.integers(1, len(CATEGORIAS) + 1, size=N_PRODUTOS)
+    df_products = pd.DataFrame({
+        "id": ids_produtos,
+        "category_id": categorias_produtos,
+        "name": [f"{CATEGORIAS[c - 1]} {i:03d}" for i, c in zip(ids_produtos, categorias_produtos)],
+    })
+    ids_clientes = pd.Series(np.arange(1, n_clientes + 1))
+    df_customers = pd.DataFrame({
+        "id": ids_clientes,
+        "customer_name": "Cliente " + ids_clientes.astype(str),
+        "email": "cliente" + ids_clientes.astype(str) + "@exemplo.com",
+        "phone_number": "119" + pd.Series(rng.integers(10_000_000, 99_999_999, size=n_clientes)).astype(str),
+    })
+    precos = np.round(rng.uniform(6, 90, size=N_PRODUTOS), 2)
+
+    return {
+        "stores": df_stores, "channels": df_channels, "payment_types": df_payment_types,
+        "categories": df_categories, "products": df_products, "customers": df_customers,
+    }, precos
+
+
+def gerar_lote_vendas(rng, primeiro_id, n, n_total, inicio, dias, n_lojas, n_clientes, precos, ids_itens, ids_pagamentos):
+    ids = np.arange(primeiro_id, primeiro_id + n)
+
+    # Os dias crescem com o id; a hora segue a curva de movimento do dia
+    dia = ((ids - 1 + rng.random(n)) / n_total * dias).astype(np.int64)
+    segundos = rng.choice(24, size=n, p=PESOS_HORA) * 3600 + rng.integers(0, 3600, size=n)
+    created_at = np.datetime64(inicio) + dia.astype("timedelta64[D]") + segundos.astype("timedelta64[s]")
+
+    store_id = rng.choice(n_lojas, size=n, p=_pesos_zipf(n_lojas, 0.8)) + 1
+    pesos_canais = np.array([peso for _, _, peso in CANAIS])
+    channel_id = rng.choice(len(CANAIS), size=n, p=pesos_canais / pesos_canais.sum()) + 1
+    delivery = np.array([tipo == "D" for _, tipo, _ in CANAIS])[channel_id - 1]
+
+    customer_id = pd.array((n_clientes * rng.random(n) ** 2).astype(np.int64) + 1, dtype="Int64")
+    customer_id[rng.random(n) < 0.3] = pd.NA
+
+    # Itens: 1 a 8 por venda, produtos com popularidade desigual
+    n_itens = np.clip(1 + rng.poisson(1.5, size=n), 1, 8)
+    venda_do_item = np.repeat(ids, n_itens)
+    m = len(venda_do_item)
+    product_id = rng.choice(N_PRODUTOS, size=m, p=_pesos_zipf(N_PRODUTOS, 1.0)) + 1
+    quantity = 1 + rng.poisson(0.3, size=m)
+    total_price = np.round(precos[product_id - 1] * quantity, 2)
+    df_product_sales = pd.DataFrame({
+        "id": np.arange(ids_itens, ids_itens + m),
+        "sale_id": venda_do_item,
+        "product_id": product_id,
+        "quantity": quantity,
+        "total_price": total_price,
+    })
+
+    total_items = np.round(np.bincount(venda_do_item - primeiro_id, weights=total_price, minlength=n), 2)
+    total_discount = np.where(rng.random(n) < 0.2, np.round(total_items * rng.uniform(0.05, 0.2, size=n), 2), 0)
+    delivery_fee = np.where(delivery, np.round(rng.uniform(0, 12, size=n), 2), 0)
+    service_tax_fee = np.where(~delivery, np.round(total_items * 0.1, 2), 0)
+    total_amount = np.round(total_items - total_discount + delivery_fee + service_tax_fee, 2)
+
+    production_seconds = pd.array(rng.gamma(4, 225, size=n).astype(np.int64), dtype="Int64")
+    delivery_seconds = pd.array(rng.gamma(6, 300, size=n).astype(np.int64), dtype="Int64")
+    delivery_seconds[~delivery] = pd.NA
+
+    df_sales = pd.DataFrame({
+        "id": ids,
+        "store_id": store_id,
+        "channel_id": channel_id,
+        "customer_id": customer_id,
+        "created_at": created_at,
+        "total_amount_items": total_items,
+        "total_discount": total_discount,
+        "delivery_fee": delivery_fee,
+        "service_tax_fee": service_tax_fee,
+        "total_amount": total_amount,
+        "production_seconds": production_seconds,
+        "delivery_seconds": delivery_seconds,
+    })
+
+    # Pagamentos: um por venda, 10% divididos em duas formas
+    dividida = rng.random(n) < 0.1
+    parte = np.round(total_amount * np.where(dividida, 0.5, 1.0), 2)
+    venda_pagamento = np.concatenate([ids, ids[dividida]])
+    valor = np.concatenate([parte, total_amount[dividida] - parte[dividida]])
+    df_payments = pd.DataFrame({
+        "id": np.arange(ids_pagamentos, ids_pagamentos + len(venda_pagamento)),
+        "sale_id": venda_pagamento,
+        "payment_type_id": rng.integers(1, len(FORMAS_PAGAMENTO) + 1, size=len(venda_pagamento)),
+        "value": np.round(valor, 2),
+    })
+
+    return df_sales, df_product_sales, df_payments
+
+
+INDICES = [
+    "CREATE INDEX ON sales (created_at)",
+    "CREATE INDEX ON sales (customer_id)",
+    "CREATE INDEX ON product_sales (sale_id)",
+    "CREATE INDEX ON payments (sale_id)",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos para o dashboard.")
+    parser.add_argument("--dsn", default="postgresql://postgres@localhost:5432/dashboard_bench")
+    parser.add_argument("--escala", default="1M", help="1M, 10M, 50M ou um número de vendas")
+    parser.add_argument("--anos", type=int, default=3, help="Anos de histórico")
+    parser.add_argument("--fim", type=date.fromisoformat, default=date(2025, 10, 31), help="Última data com vendas")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    n_total = ESCALAS.get(args.escala) or int(args.escala)
+    dias = 365 * args.anos
+    inicio = args.fim - timedelta(days=dias - 1)
+    rng = np.random.default_rng(args.seed)
+
+    engine = sqlalchemy.create_engine(args.dsn)
+    with open(os.path.join(os.path.dirname(__file__), "schema.sql")) as f:
+        ddl = f.read()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(ddl)
+
+    inicio_carga = time.perf_counter()
+    dimensoes, precos = gerar_dimensoes(rng, n_total)
+    conn_bruta = engine.raw_connection()
+    try:
+        for tabela, df in dimensoes.items():
+            _copiar(conn_bruta, tabela, df)
+        conn_bruta.commit()
+
+        n_lojas = len(dimensoes["stores"])
+        n_clientes = len(dimensoes["customers"])
+        ids_itens = ids_pagamentos = 1
+        for primeiro_id in range(1, n_total + 1, TAMANHO_LOTE):
+            n = min(TAMANHO_LOTE, n_total - primeiro_id + 1)
+            df_sales, df_product_sales, df_payments = gerar_lote_vendas(
+                rng, primeiro_id, n, n_total, inicio, dias, n_lojas, n_clientes, precos, ids_itens, ids_pagamentos
+            )
+            _copiar(conn_bruta, "sales", df_sales)
+            _copiar(conn_bruta, "product_sales", df_product_sales)
+            _copiar(conn_bruta, "payments", df_payments)
+            conn_bruta.commit()
+            ids_itens += len(df_product_sales)
+            ids_pagamentos += len(df_payments)
+            print(f"{primeiro_id + n - 1:,} / {n_total:,} vendas ({time.perf_counter() - inicio_carga:.0f}s)")
+    finally:
+        conn_bruta.close()
+
+    with engine.begin() as conn:
+        for indice in INDICES:
+            conn.exec_driver_sql(indice)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    print(f"Carga concluída em {time.perf_counter() - inicio_carga:.0f}s ({datetime.now():%H:%M:%S}).")
+
+
+if __name__ == "__main__":
+    main()
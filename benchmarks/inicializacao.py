@@ -0,0 +1,156 @@
+"""
+Benchmark de inicialização e troca de página.
+
+Cada página roda sem navegador (streamlit.testing.v1.AppTest) com a
+instrumentação ligada, e o tempo até a etapa "bootstrap" (barra lateral com
+os filtros globais pronta) é a primeira pintura. Para cada página:
+
+- partida fria: processo novo, nada importado além do Streamlit, cache
+  compartilhado vazio. Mede a primeira pintura, o tempo gasto em imports
+  durante a execução e a execução completa;
+- troca de página: no mesmo processo, logo depois de outra página (a Visão
+  Geral, ou a Análise de Descontos para a própria Visão Geral), como quando o
+  usuário navega pelo menu. Mede a primeira pintura.
+
+Uso:
+    python benchmarks/inicializacao.py --dsn postgresql://postgres@localhost:5432/dashboard_bench
+    python benchmarks/inicializacao.py --saida antes.json
+    python benchmarks/inicializacao.py --comparar antes.json
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def paginas():
+    return ["Pagina_Principal.py"] + sorted(
+        os.path.relpath(p, RAIZ) for p in glob.glob(os.path.join(RAIZ, "pages", "*.py"))
+    )
+
+
+def medir(pagina, origem, dsn):
+    """Roda dentro do subprocesso; imprime o resultado como JSON."""
+    import builtins
+    import threading
+    import time
+
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(RAIZ)
+    sys.path.insert(0, RAIZ)
+
+    # Soma o tempo dos imports de primeiro nível (os aninhados já estão dentro)
+    importar = builtins.__import__
+    profundidade = threading.local()
+    segundos_import = [0.0]
+
+    def importar_medindo(*args, **kwargs):
+        nivel = getattr(profundidade, "nivel", 0)
+        profundidade.nivel = nivel + 1
+        inicio = time.perf_counter()
+        try:
+            return importar(*args, **kwargs)
+        finally:
+            profundidade.nivel = nivel
+            if nivel == 0:
+                segundos_import[0] += time.perf_counter() - inicio
+
+    def rodar(arquivo):
+        import instrumentacao
+
+        at = AppTest.from_file(arquivo, default_timeout=300)
+        at.secrets["connections"] = {"neon_db": dsn}
+        segundos_import[0] = 0.0
+        inicio_relogio, inicio = time.time(), time.perf_counter()
+        at.run()
+        total = time.perf_counter() - inicio
+        if at.exception:
+            raise RuntimeError(f"{arquivo}: {at.exception[0].message}")
+        bootstrap = [
+            e for e in instrumentacao.eventos()
+            if e["tipo"] == "etapa" and e["nome"].endswith(": bootstrap") and e["ts"] >= inicio_relogio
+        ]
+        return {
+            "primeira_pintura_s": bootstrap[-1]["ts"] - inicio_relogio if bootstrap else None,
+            "importacoes_s": segundos_import[0],
+            "total_s": total,
+        }
+
+    builtins.__import__ = importar_medindo
+    if origem:
+        rodar(origem)
+        resultado = {"troca_primeira_pintura_s": rodar(pagina)["primeira_pintura_s"]}
+    else:
+        resultado = rodar(pagina)
+    print(json.dumps(resultado))
+
+
+def rodar_subprocesso(pagina, origem, dsn):
+    with tempfile.TemporaryDirectory() as cache:
+        env = {
+            **os.environ,
+            "DASHBOARD_CACHE_DIR": cache,
+            "DASHBOARD_DIAGNOSTICO": "1",
+            "DASHBOARD_PRE_AQUECIMENTO": "0",
+        }
+        saida = subprocess.run(
+            [sys.executable, __file__, "--interno", pagina, "--origem", origem or "", "--dsn", dsn],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a inicialização e a troca de página do dashboard.")
+    parser.add_argument("--dsn", default="postgresql://postgres@localhost:5432/dashboard_bench")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", help="Arquivo JSON com o resultado")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--interno", help=argparse.SUPPRESS)
+    parser.add_argument("--origem", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno:
+        medir(args.interno, args.origem, args.dsn)
+        return
+
+    resultado = {}
+    for pagina in paginas():
+        origem = "pages/5_Análise_de_Descontos.py" if pagina == "Pagina_Principal.py" else "Pagina_Principal.py"
+        execucoes = [
+            {**rodar_subprocesso(pagina, None, args.dsn), **rodar_subprocesso(pagina, origem, args.dsn)}
+            for _ in range(args.repeticoes)
+        ]
+        resultado[pagina] = {chave: statistics.median(e[chave] for e in execucoes) for chave in execucoes[0]}
+        print(f"{pagina}: " + ", ".join(f"{k}={v:.3f}" for k, v in resultado[pagina].items()), flush=True)
+
+    anterior = {}
+    if args.comparar:
+        with open(args.comparar) as f:
+            anterior = json.load(f)
+
+    colunas = ["primeira_pintura_s", "importacoes_s", "total_s", "troca_primeira_pintura_s"]
+    print(f"\n{'página':<42}" + "".join(f"{c:>28}" for c in colunas))
+    for pagina, medidas in resultado.items():
+        linha = f"{pagina:<42}"
+        for coluna in colunas:
+            valor = f"{medidas[coluna]:.3f}"
+            if pagina in anterior:
+                valor = f"{anterior[pagina][coluna]:.3f} -> {valor}"
+            linha += f"{valor:>28}"
+        print(linha)
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
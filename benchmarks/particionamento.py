@@ -0,0 +1,135 @@
+"""
+Benchmark do particionamento mensal de sales (particionamento.sql).
+
+Mede as consultas do dashboard para uma janela de --dias dias no fim do
+histórico, aplica particionamento.sql e logic.sql, mede de novo e confere no
+plano (EXPLAIN) quantas partições de sales cada consulta lê. Rode sobre uma
+cópia do banco sintético, pois a migração altera o esquema:
+
+    createdb -T dashboard_bench dashboard_bench_part
+    python benchmarks/particionamento.py --dsn postgresql://postgres@localhost:5432/dashboard_bench_part
+
+Com --sem-migrar só mede e confere o esquema atual (útil num banco já migrado).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+import sqlalchemy
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import queries  # noqa: E402
+
+
+def consultas(inicio, fim):
+    """(nome, sql, parâmetros) das consultas medidas."""
+    periodo = {"start": inicio, "end": fim + timedelta(days=1)}
+    return [
+        ("SELECT_ANALYSIS_DATA", queries.SELECT_ANALYSIS_DATA, periodo),
+        ("SELECT_AGREGADO_DIARIO", queries.SELECT_AGREGADO_DIARIO, periodo),
+        ("SELECT_SERIE_TEMPORAL", queries.SELECT_SERIE_TEMPORAL, {**periodo, "granularidade": "day"}),
+        (
+            "v_analysis_explorer",
+            "SELECT * FROM v_analysis_explorer WHERE created_at >= %(start)s AND created_at < %(end)s",
+            periodo,
+        ),
+        ("SELECT_RFM", queries.SELECT_RFM, {"data_ref": fim}),
+    ]
+
+
+def _relacoes(plano):
+    if "Relation Name" in plano:
+        yield plano["Relation Name"]
+    for filho in plano.get("Plans", []):
+        yield from _relacoes(filho)
+
+
+def particoes_lidas(conn, sql, params):
+    plano = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql, params).scalar()
+    return sorted({r for r in _relacoes(plano[0]["Plan"]) if r.startswith("sales")})
+
+
+def medir(engine, inicio, fim, repeticoes):
+    resultado = {}
+    with engine.connect() as conn:
+        for nome, sql, params in consultas(inicio, fim):
+            conn.exec_driver_sql(sql, params).fetchall()  # aquece o cache do Postgres
+            tempos = []
+            for _ in range(repeticoes):
+                t0 = time.perf_counter()
+                linhas = len(conn.exec_driver_sql(sql, params).fetchall())
+                tempos.append(time.perf_counter() - t0)
+            resultado[nome] = {
+                "tempo_s": statistics.median(tempos),
+                "linhas": linhas,
+                "particoes": particoes_lidas(conn, sql, params),
+            }
+    return resultado
+
+
+def aplicar(dsn, arquivo):
+    engine = sqlalchemy.create_engine(dsn)
+    conn = engine.raw_connection()
+    try:
+        conn.driver_connection.autocommit = True
+        with open(os.path.join(RAIZ, arquivo)) as f, conn.cursor() as cur:
+            cur.execute(f.read())
+    finally:
+        conn.close()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o ganho do particionamento mensal de sales.")
+    parser.add_argument("--dsn", default="postgresql://postgres@localhost:5432/dashboard_bench_part")
+    parser.add_argument("--dias", type=int, default=30, help="Tamanho da janela medida")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--sem-migrar", action="store_true", help="Só mede o esquema atual")
+    parser.add_argument("--saida", help="Arquivo JSON com o resultado")
+    args = parser.parse_args()
+
+    aplicar(args.dsn, "logic.sql")  # o banco sintético é criado sem a view
+    engine = sqlalchemy.create_engine(args.dsn)
+    with engine.connect() as conn:
+        fim = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone().max_date
+    inicio = fim - timedelta(days=args.dias - 1)
+
+    resultado = {"janela": [str(inicio), str(fim)]}
+    if not args.sem_migrar:
+        print(f"Medindo sem particionamento ({inicio} a {fim})...")
+        resultado["antes"] = medir(engine, inicio, fim, args.repeticoes)
+        print("Aplicando particionamento.sql e logic.sql...")
+        t0 = time.perf_counter()
+        aplicar(args.dsn, "particionamento.sql")
+        aplicar(args.dsn, "logic.sql")
+        print(f"Migração concluída em {time.perf_counter() - t0:.0f}s.")
+        engine.dispose()
+    resultado["depois"] = medir(engine, inicio, fim, args.repeticoes)
+
+    with engine.connect() as conn:
+        total = conn.exec_driver_sql(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = 'sales'::regclass"
+        ).scalar()
+    print(f"\nPartições de sales: {total}")
+    print(f"{'consulta':<24}{'antes (s)':>11}{'depois (s)':>12}{'ganho':>8}  partições lidas")
+    for nome, depois in resultado["depois"].items():
+        antes = resultado.get("antes", {}).get(nome)
+        ganho = f"{antes['tempo_s'] / depois['tempo_s']:.1f}x" if antes else "-"
+        if antes and antes["linhas"] != depois["linhas"]:
+            ganho += " (linhas diferentes!)"
+        coluna_antes = f"{antes['tempo_s']:.3f}" if antes else "-"
+        print(f"{nome:<24}{coluna_antes:>11}{depois['tempo_s']:>12.3f}{ganho:>8}  {len(depois['particoes'])}")
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+-- Esquema mínimo usado pelo dashboard, para gerar dados sintéticos em um
+-- Postgres local. As chaves estrangeiras ficam de fora para acelerar a carga;
+-- os índices são criados pelo gerar_dados.py depois do COPY.
+
+DROP TABLE IF EXISTS payments, product_sales, sales, customers, products,
+    categories, payment_types, channels, stores CASCADE;
+
+CREATE TABLE stores (
+    id integer PRIMARY KEY,
+    name varchar(255) NOT NULL,
+    city varchar(100),
+    is_active boolean DEFAULT true
+);
+
+CREATE TABLE channels (
+    id integer PRIMARY KEY,
+    name varchar(100) NOT NULL,
+    type char(1)
+);
+
+CREATE TABLE payment_types (
+    id integer PRIMARY KEY,
+    description varchar(100) NOT NULL
+);
+
+CREATE TABLE categories (
+    id integer PRIMARY KEY,
+    name varchar(200) NOT NULL
+);
+
+CREATE TABLE products (
+    id integer PRIMARY KEY,
+    category_id integer,
+    name varchar(500) NOT NULL
+);
+
+CREATE TABLE customers (
+    id integer PRIMARY KEY,
+    customer_name varchar(100),
+    email varchar(100),
+    phone_number varchar(50)
+);
+
+CREATE TABLE sales (
+    id integer PRIMARY KEY,
+    store_id integer NOT NULL,
+    channel_id integer NOT NULL,
+    customer_id integer,
+    created_at timestamp NOT NULL,
+    total_amount_items decimal(10,2) NOT NULL,
+    total_discount decimal(10,2) DEFAULT 0,
+    delivery_fee decimal(10,2) DEFAULT 0,
+    service_tax_fee decimal(10,2) DEFAULT 0,
+    total_amount decimal(10,2) NOT NULL,
+    production_seconds integer,
+    delivery_seconds integer
+);
+
+CREATE TABLE product_sales (
+    id integer PRIMARY KEY,
+    sale_id integer NOT NULL,
+    product_id integer NOT NULL,
+    quantity real NOT NULL,
+    total_price real NOT NULL
+);
+
+CREATE TABLE payments (
+    id integer PRIMARY KEY,
+    sale_id integer NOT NULL,
+    payment_type_id integer,
+    value decimal(10,2) NOT NULL
+);
@@ -0,0 +1,158 @@
+"""
+Teste de carga: memória por sessão com vários usuários simultâneos.
+
+Para cada página e cada N, sobe um servidor `streamlit run` próprio (cache
+compartilhado vazio), abre uma sessão para aquecer o cache e então conecta N
+sessões ao mesmo tempo pelo mesmo websocket que o navegador usa, como N
+usuários abrindo a página juntos com os filtros padrão. Do processo do
+servidor mede:
+
+- pico_por_sessao_mb: (pico de RSS até as N execuções terminarem - RSS antes) / N;
+- retido_por_sessao_mb: (RSS com as N sessões ainda conectadas - RSS antes) / N.
+
+Só funciona no Linux (lê /proc/<pid>/status e zera o pico em clear_refs).
+
+Uso:
+    python benchmarks/sessoes.py --dsn postgresql://postgres@localhost:5432/dashboard_bench --saida antes.json
+    python benchmarks/sessoes.py --sessoes 1 4 8 --comparar antes.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Nome da página na URL ("" é a página principal)
+PAGINAS_PADRAO = ["", "Análise_Operacional", "Análise_Detalhada_(Explorer)", "Análise_de_Descontos"]
+
+
+def _status_mb(pid, campo):
+    with open(f"/proc/{pid}/status") as f:
+        return int(re.search(rf"{campo}:\s+(\d+)", f.read()).group(1)) / 1024
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+async def abrir_sessao(porta, pagina):
+    """Conecta uma sessão, pede a página e espera o fim da execução do script."""
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ClientState_pb2 import ClientState
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    from tornado.websocket import websocket_connect
+
+    ws = await websocket_connect(f"ws://localhost:{porta}/_stcore/stream", subprotocols=["streamlit"])
+    pedido = BackMsg()
+    pedido.rerun_script.CopyFrom(ClientState(query_string="", page_name=pagina))
+    await ws.write_message(pedido.SerializeToString(), binary=True)
+    while True:
+        dado = await ws.read_message()
+        if dado is None:
+            raise RuntimeError(f"{pagina or 'principal'}: o servidor fechou a conexão")
+        msg = ForwardMsg()
+        msg.ParseFromString(dado)
+        tipo = msg.WhichOneof("type")
+        if tipo == "delta" and msg.delta.new_element.WhichOneof("type") == "exception":
+            raise RuntimeError(f"{pagina or 'principal'}: {msg.delta.new_element.exception.message}")
+        if tipo == "script_finished":
+            return ws
+
+
+def medir(pagina, n, dsn):
+    with tempfile.TemporaryDirectory() as pasta:
+        segredos = os.path.join(pasta, "secrets.toml")
+        with open(segredos, "w") as f:
+            f.write(f'[connections]\nneon_db = "{dsn}"\n')
+        porta = _porta_livre()
+        env = {
+            **os.environ,
+            "DASHBOARD_CACHE_DIR": os.path.join(pasta, "cache"),
+            "DASHBOARD_PRE_AQUECIMENTO": "0",
+        }
+        servidor = subprocess.Popen(
+            [
+                sys.executable, "-m", "streamlit", "run", os.path.join(RAIZ, "Pagina_Principal.py"),
+                "--server.headless", "true", "--server.port", str(porta),
+                "--browser.gatherUsageStats", "false", "--secrets.files", segredos,
+            ],
+            cwd=pasta, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            for _ in range(600):
+                try:
+                    urllib.request.urlopen(f"http://localhost:{porta}/_stcore/health", timeout=1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+            async def rodar():
+                aquecimento = await abrir_sessao(porta, pagina)
+                aquecimento.close()
+                await asyncio.sleep(1)
+
+                rss_antes = _status_mb(servidor.pid, "VmRSS")
+                with open(f"/proc/{servidor.pid}/clear_refs", "w") as f:
+                    f.write("5")  # zera o pico (VmHWM) do servidor
+                sessoes = await asyncio.gather(*(abrir_sessao(porta, pagina) for _ in range(n)))
+                pico = _status_mb(servidor.pid, "VmHWM")
+                retido = _status_mb(servidor.pid, "VmRSS")
+                for ws in sessoes:
+                    ws.close()
+                return {
+                    "pico_por_sessao_mb": (pico - rss_antes) / n,
+                    "retido_por_sessao_mb": (retido - rss_antes) / n,
+                }
+
+            return asyncio.run(rodar())
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a memória por sessão com usuários simultâneos.")
+    parser.add_argument("--dsn", default="postgresql://postgres@localhost:5432/dashboard_bench")
+    parser.add_argument("--paginas", nargs="+", default=PAGINAS_PADRAO, help='Nomes na URL ("" = principal)')
+    parser.add_argument("--sessoes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--saida", help="Arquivo JSON com o resultado")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    anterior = {}
+    if args.comparar:
+        with open(args.comparar) as f:
+            anterior = json.load(f)
+
+    resultado = {}
+    colunas = ["pico_por_sessao_mb", "retido_por_sessao_mb"]
+    print(f"{'página':<32}{'sessões':>8}" + "".join(f"{c:>28}" for c in colunas))
+    for pagina in args.paginas:
+        nome = pagina or "Pagina_Principal"
+        resultado[nome] = {}
+        for n in args.sessoes:
+            medidas = resultado[nome][str(n)] = medir(pagina, n, args.dsn)
+            linha = f"{nome:<32}{n:>8}"
+            for coluna in colunas:
+                valor = f"{medidas[coluna]:.1f}"
+                if str(n) in anterior.get(nome, {}):
+                    valor = f"{anterior[nome][str(n)][coluna]:.1f} -> {valor}"
+                linha += f"{valor:>28}"
+            print(linha, flush=True)
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
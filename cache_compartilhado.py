@@ -0,0 +1,362 @@
+"""
+Cache compartilhado entre processos para os DataFrames de fato e dimensão.
+
+Cada resultado é gravado uma única vez como arquivo Arrow IPC (sem compressão)
+em um diretório de memória compartilhada (/dev/shm por padrão). Um pequeno
+índice JSON guarda a validade de cada entrada. Todos os processos do servidor
+mapeiam os mesmos arquivos somente leitura, e cada chamada devolve um
+DataFrame novo que aponta para essas páginas de memória: colunas numéricas e
+de texto não são copiadas, então a memória do host cresce com o tamanho dos
+dados e não com dados x processos x sessões.
+
+O total em disco é limitado por DASHBOARD_CACHE_MAX_MB: ao gravar uma entrada
+que estoure o limite, as entradas usadas há mais tempo (data de modificação
+dos arquivos, atualizada a cada acerto) são removidas. Um processo que ainda
+tenha a entrada removida mapeada percebe a remoção no próximo acesso e solta
+o mapeamento.
+
+Com DASHBOARD_CACHE_COMPRESSAO=lz4 ou zstd os arquivos são gravados
+comprimidos. Ocupam bem menos memória compartilhada, mas deixam de ser
+zero-cópia: cada chamada descomprime um DataFrame próprio, que é liberado ao
+fim da execução da página em vez de ficar mapeado no processo.
+
+O diretório pode ser trocado pela variável de ambiente DASHBOARD_CACHE_DIR.
+"""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+if os.path.isdir("/dev/shm"):
+    _DIRETORIO_PADRAO = os.path.join("/dev/shm", "dashboard_restaurantes")
+else:
+    _DIRETORIO_PADRAO = os.path.join(tempfile.gettempdir(), "dashboard_restaurantes")
+
+DIRETORIO = os.environ.get("DASHBOARD_CACHE_DIR", _DIRETORIO_PADRAO)
+ORCAMENTO_BYTES = int(float(os.environ.get("DASHBOARD_CACHE_MAX_MB", 1024)) * 1024 ** 2)
+COMPRESSAO = os.environ.get("DASHBOARD_CACHE_COMPRESSAO", "").lower() or None
+if COMPRESSAO not in (None, "lz4", "zstd"):
+    raise ValueError(f"DASHBOARD_CACHE_COMPRESSAO inválida: {COMPRESSAO!r} (use lz4 ou zstd)")
+ARQUIVO_INDICE = "indice.json"
+FOLGA_REMOCAO = 60
+
+_mapeados = {}
+_lock_local = threading.Lock()
+# Acertos e falhas deste processo por chave, e entradas removidas pelo limite
+_contadores = defaultdict(lambda: {"acertos": 0, "falhas": 0})
+_removidas = [0]
+
+
+class _Trava:
+    def __init__(self, nome):
+        self.caminho = os.path.join(DIRETORIO, nome)
+        self.arquivo = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        while True:
+            arquivo = open(self.caminho, "a")
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+            # A trava de uma entrada removida é apagada (_remover_travas_orfas):
+            # se o arquivo travado já não é o do caminho, trava o novo.
+            try:
+                mesmo = os.fstat(arquivo.fileno()).st_ino == os.stat(self.caminho).st_ino
+            except FileNotFoundError:
+                mesmo = False
+            if mesmo:
+                self.arquivo = arquivo
+                return self
+            arquivo.close()
+
+    def __exit__(self, *exc):
+        if self.arquivo is not None:
+            fcntl.flock(self.arquivo, fcntl.LOCK_UN)
+            self.arquivo.close()
+
+
+def _ler_indice():
+    try:
+        with open(os.path.join(DIRETORIO, ARQUIVO_INDICE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _gravar_indice(indice):
+    caminho = os.path.join(DIRETORIO, ARQUIVO_INDICE)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w") as f:
+        json.dump(indice, f)
+    os.replace(temporario, caminho)
+
+
+def _para_arrow(df):
+    # Só as colunas são gravadas. Um índice com nome (de um groupby, por
+    # exemplo) é dado e vira coluna; o sem nome é só o rótulo das linhas que
+    # sobrou de um filtro e é descartado, como no reset_index(drop=True).
+    if any(nome is not None for nome in df.index.names):
+        df = df.reset_index()
+    # Floats são gravados com NaN (sem bitmap de nulos) para que a leitura
+    # volte a ser zero-cópia; o resto segue a conversão padrão do pyarrow.
+    colunas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_float_dtype(serie.dtype):
+            colunas[str(coluna)] = pa.array(serie.to_numpy(), from_pandas=False)
+        else:
+            colunas[str(coluna)] = pa.array(serie, from_pandas=True)
+    return pa.table(colunas)
+
+
+def _tipo_pandas(tipo_arrow):
+    if pa.types.is_string(tipo_arrow) or pa.types.is_large_string(tipo_arrow):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def _para_pandas(tabela):
+    return tabela.to_pandas(split_blocks=True, types_mapper=_tipo_pandas)
+
+
+def _remover_arquivos(entrada):
+    for nome in entrada["arquivos"]:
+        try:
+            os.remove(os.path.join(DIRETORIO, nome))
+        except FileNotFoundError:
+            pass
+
+
+def _remover_travas_orfas(indice):
+    """
+    Apaga as travas ({chave}.lock) de entradas que saíram do índice, vencidas
+    ou removidas pelo limite de bytes. Trava em uso (uma carga em andamento)
+    fica para a próxima gravação.
+    """
+    if fcntl is None:
+        return
+    for nome in os.listdir(DIRETORIO):
+        if not nome.endswith(".lock") or nome == "indice.lock" or nome[:-len(".lock")] in indice:
+            continue
+        caminho = os.path.join(DIRETORIO, nome)
+        try:
+            fd = os.open(caminho, os.O_WRONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if os.fstat(fd).st_ino == os.stat(caminho).st_ino:
+                os.remove(caminho)
+        except (BlockingIOError, FileNotFoundError):
+            pass
+        finally:
+            os.close(fd)
+
+
+def _ultimo_acesso(entrada):
+    try:
+        return os.stat(os.path.join(DIRETORIO, entrada["arquivos"][0])).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _contar(chave, campo):
+    with _lock_local:
+        _contadores[chave][campo] += 1
+
+
+def _tocar(entrada):
+    """Marca o acesso para o LRU; FileNotFoundError se a entrada foi removida."""
+    os.utime(os.path.join(DIRETORIO, entrada["arquivos"][0]))
+
+
+def _gravar_entrada(chave, resultado, ttl, assinatura):
+    frames = resultado if isinstance(resultado, tuple) else (resultado,)
+    opcoes = pa.ipc.IpcWriteOptions(compression=COMPRESSAO)
+    arquivos = []
+    tamanho = tamanho_descomprimido = linhas = 0
+    for i, df in enumerate(frames):
+        nome = f"{chave}_{int(time.time() * 1000)}_{i}.arrow"
+        caminho = os.path.join(DIRETORIO, nome)
+        with pa.OSFile(f"{caminho}.tmp", "wb") as sink:
+            tabela = _para_arrow(df)
+            with pa.ipc.new_file(sink, tabela.schema, options=opcoes) as writer:
+                writer.write_table(tabela)
+        os.replace(f"{caminho}.tmp", caminho)
+        arquivos.append(nome)
+        tamanho += os.path.getsize(caminho)
+        tamanho_descomprimido += tabela.nbytes
+        linhas += tabela.num_rows
+
+    agora = time.time()
+    indice = _ler_indice()
+    for antiga, entrada in list(indice.items()):
+        # Entradas vencidas só são apagadas após uma folga, para não remover
+        # arquivos que outro processo acabou de decidir mapear.
+        if antiga == chave or entrada["expira_em"] + FOLGA_REMOCAO <= agora:
+            _remover_arquivos(entrada)
+            del indice[antiga]
+
+    # Limite de bytes: remove as menos usadas recentemente até caber a nova
+    total = tamanho + sum(entrada.get("bytes", 0) for entrada in indice.values())
+    for antiga in sorted(indice, key=lambda k: _ultimo_acesso(indice[k])):
+        if total <= ORCAMENTO_BYTES:
+            break
+        total -= indice[antiga].get("bytes", 0)
+        _remover_arquivos(indice.pop(antiga))
+        _removidas[0] += 1
+
+    entrada = {
+        "arquivos": arquivos,
+        "tupla": isinstance(resultado, tuple),
+        "expira_em": agora + ttl,
+        "assinatura": assinatura[:200],
+        "compressao": COMPRESSAO,
+        "bytes": tamanho,
+        "bytes_descomprimidos": tamanho_descomprimido,
+        "linhas": linhas,
+    }
+    indice[chave] = entrada
+    _gravar_indice(indice)
+    _remover_travas_orfas(indice)
+    return entrada
+
+
+def _mapear(entrada):
+    tabelas = []
+    for nome in entrada["arquivos"]:
+        fonte = pa.memory_map(os.path.join(DIRETORIO, nome), "r")
+        tabelas.append(pa.ipc.open_file(fonte).read_all())
+    return tabelas
+
+
+def _montar(entrada, tabelas):
+    frames = tuple(_para_pandas(tabela) for tabela in tabelas)
+    return frames if entrada["tupla"] else frames[0]
+
+
+def _em_memoria(chave, antecedencia):
+    with _lock_local:
+        em_memoria = _mapeados.get(chave)
+    if not em_memoria or em_memoria[0]["expira_em"] - antecedencia <= time.time():
+        return None
+    entrada, tabelas = em_memoria
+    try:
+        _tocar(entrada)
+    except FileNotFoundError:
+        # Removida pelo limite de bytes em outro processo: solta o mapeamento
+        with _lock_local:
+            _mapeados.pop(chave, None)
+        return None
+    if tabelas is None:  # comprimida: descomprime de novo a cada chamada
+        tabelas = _mapear(entrada)
+    return entrada, tabelas
+
+
+def compartilhado(ttl):
+    """
+    Decorador para funções cujo primeiro argumento é o engine e que devolvem um
+    DataFrame ou uma tupla de DataFrames. O engine fica fora da chave, então
+    páginas diferentes (cada uma com seu engine) compartilham as entradas.
+    """
+    def decorador(func):
+        def obter(engine, args, antecedencia):
+            assinatura = f"{func.__module__}.{func.__qualname__}{args!r}"
+            chave = hashlib.sha1(assinatura.encode()).hexdigest()
+
+            em_memoria = _em_memoria(chave, antecedencia)
+            if em_memoria:
+                _contar(chave, "acertos")
+                return em_memoria
+
+            os.makedirs(DIRETORIO, exist_ok=True)
+            with _Trava(f"{chave}.lock"):
+                entrada = _ler_indice().get(chave)
+                tabelas = None
+                if entrada and entrada["expira_em"] - antecedencia > time.time():
+                    try:
+                        _tocar(entrada)
+                        tabelas = _mapear(entrada)
+                        _contar(chave, "acertos")
+                    except FileNotFoundError:
+                        pass  # removida pelo limite de bytes; recalcula
+                if tabelas is None:
+                    _contar(chave, "falhas")
+                    resultado = func(engine, *args)
+                    with _Trava("indice.lock"):
+                        entrada = _gravar_entrada(chave, resultado, ttl, assinatura)
+                    tabelas = _mapear(entrada)
+
+            with _lock_local:
+                agora = time.time()
+                # Solta também as que outro processo removeu pelo limite de bytes
+                for vencida in [
+                    k for k, (e, _) in _mapeados.items()
+                    if e["expira_em"] <= agora or not os.path.exists(os.path.join(DIRETORIO, e["arquivos"][0]))
+                ]:
+                    del _mapeados[vencida]
+                # Comprimidas não ficam no processo: a cópia descomprimida é da chamada
+                _mapeados[chave] = (entrada, None if entrada.get("compressao") else tabelas)
+            return entrada, tabelas
+
+        @functools.wraps(func)
+        def wrapper(engine, *args):
+            return _montar(*obter(engine, args, 0))
+
+        def aquecer(engine, *args, antecedencia=0):
+            """Garante a entrada no cache com pelo menos `antecedencia` segundos de validade."""
+            obter(engine, args, antecedencia)
+
+        wrapper.aquecer = aquecer
+        return wrapper
+    return decorador
+
+
+def estatisticas():
+    """
+    Uso do cache: tamanho de cada entrada (de todos os processos, pelo índice)
+    e acertos/falhas deste processo.
+    """
+    indice = _ler_indice()
+    with _lock_local:
+        todos = {chave: dict(c) for chave, c in _contadores.items()}
+        removidas = _removidas[0]
+    entradas = []
+    for chave, entrada in indice.items():
+        contadores = todos.get(chave, {"acertos": 0, "falhas": 0})
+        entradas.append({
+            "funcao": entrada.get("assinatura", "?").split("(", 1)[0],
+            "assinatura": entrada.get("assinatura", "?"),
+            "linhas": entrada.get("linhas"),
+            "bytes": entrada.get("bytes", 0),
+            "bytes_descomprimidos": entrada.get("bytes_descomprimidos", 0),
+            "compressao": entrada.get("compressao"),
+            "ultimo_acesso": _ultimo_acesso(entrada),
+            "expira_em": entrada["expira_em"],
+            **contadores,
+        })
+    acertos = sum(c["acertos"] for c in todos.values())
+    falhas = sum(c["falhas"] for c in todos.values())
+    return {
+        "diretorio": DIRETORIO,
+        "compressao": COMPRESSAO,
+        "orcamento_bytes": ORCAMENTO_BYTES,
+        "bytes": sum(e["bytes"] for e in entradas),
+        "acertos": acertos,
+        "falhas": falhas,
+        "taxa_acerto": acertos / (acertos + falhas) if acertos + falhas else None,
+        "removidas": removidas,
+        "entradas": entradas,
+    }
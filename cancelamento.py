@@ -0,0 +1,128 @@
+"""
+Cancelamento das consultas que ficaram obsoletas.
+
+O Streamlit reexecuta o script a cada mudança de widget, mas só interrompe a
+execução anterior no próximo comando st.*. Enquanto o pd.read_sql espera o
+banco, nenhum comando st.* é chamado: a consulta antiga continua rodando no
+Postgres e segurando uma conexão do pool, mesmo que o resultado já não sirva.
+
+`executar` roda a carga numa thread auxiliar e a thread do script fica
+esperando, atualizando o tempo decorrido na tela a cada INTERVALO_SEGUNDOS.
+Cada atualização é um ponto de interrupção do Streamlit: se a sessão pediu
+uma nova execução (ou foi encerrada), a espera é interrompida e a consulta em
+andamento é cancelada no servidor com o cancel() do driver (o mesmo pedido de
+cancelamento do pg_cancel_backend). A conexão volta ao pool logo em seguida.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError
+
+import sqlalchemy
+import streamlit as st
+from sqlalchemy import event
+
+import instrumentacao
+import limites_consulta
+
+INTERVALO_SEGUNDOS = 0.25
+
+_local = threading.local()
+
+
+class CargaSuperada(Exception):
+    """A execução que pediu a carga já foi substituída por uma mais nova."""
+
+
+class _Tarefa:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conexao = None
+        self.cancelada = False
+
+    def cancelar(self):
+        # O cancel() roda com a trava: liberar() espera, e a conexão não volta
+        # ao pool (nem começa a consulta de outra sessão) no meio do pedido.
+        with self.lock:
+            self.cancelada = True
+            if self.conexao is not None:
+                self.conexao.cancel()
+
+    def registrar(self, conexao):
+        with self.lock:
+            if self.cancelada:
+                raise CargaSuperada()
+            self.conexao = conexao
+
+    def liberar(self):
+        # Depois do execute a conexão pode voltar ao pool e atender outra
+        # sessão, então ela deixa de ser alvo do cancelamento.
+        with self.lock:
+            self.conexao = None
+
+
+@event.listens_for(sqlalchemy.engine.Engine, "before_cursor_execute")
+def _antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+    tarefa = getattr(_local, "tarefa", None)
+    if tarefa is not None:
+        tarefa.registrar(conn.connection.dbapi_connection)
+
+
+@event.listens_for(sqlalchemy.engine.Engine, "after_cursor_execute")
+def _depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+    tarefa = getattr(_local, "tarefa", None)
+    if tarefa is not None:
+        tarefa.liberar()
+
+
+@contextmanager
+def cancelavel(conexao_dbapi):
+    """Para operações feitas direto no driver (ex.: COPY), que não passam pelos eventos do SQLAlchemy."""
+    tarefa = getattr(_local, "tarefa", None)
+    if tarefa is None:
+        yield
+        return
+    tarefa.registrar(conexao_dbapi)
+    try:
+        yield
+    finally:
+        tarefa.liberar()
+
+
+def executar(func, *args):
+    """
+    Chama func(*args) numa thread auxiliar e devolve o resultado (ou levanta a
+    mesma exceção; o cancelamento pelo statement_timeout vira
+    limites_consulta.ConsultaCancelada). Deve ser chamada da thread do script.
+    """
+    tarefa = _Tarefa()
+    futuro = Future()
+    pagina = instrumentacao.pagina_atual()
+
+    def alvo():
+        _local.tarefa = tarefa
+        instrumentacao.definir_pagina(pagina)
+        try:
+            futuro.set_result(func(*args))
+        except BaseException as e:
+            if limites_consulta.foi_cancelada(e):
+                cancelada = limites_consulta.ConsultaCancelada(str(e))
+                cancelada.__cause__ = e
+                e = cancelada
+            futuro.set_exception(e)
+
+    threading.Thread(target=alvo, daemon=True, name="carga-cancelavel").start()
+
+    tempo_decorrido = st.empty()
+    inicio = time.perf_counter()
+    try:
+        while True:
+            try:
+                return futuro.result(timeout=INTERVALO_SEGUNDOS)
+            except TimeoutError:
+                tempo_decorrido.caption(f"Tempo decorrido: {time.perf_counter() - inicio:.0f}s")
+    finally:
+        if futuro.done():
+            tempo_decorrido.empty()
+        else:
+            tarefa.cancelar()
@@ -0,0 +1,257 @@
+"""
+Cargas de fato e dimensão usadas por todas as páginas.
+
+Os resultados ficam no cache compartilhado (Arrow mapeado em memória), então
+todas as páginas e todos os processos do servidor leem a mesma cópia. As
+consultas pesadas vão para as réplicas de leitura, quando configuradas
+(replicas.py, que repete no primário a consulta cancelada por conflito com
+a replicação); as dimensões, pequenas, ficam no primário.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+import cache_compartilhado
+import contagem_distinta
+import coortes
+import indicadores
+import instrumentacao
+import queries
+import replicas
+
+SEM_CATEGORIA = "Sem categoria"
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def tabelas_dimensao(engine):
+    with engine.connect() as conn:
+        df_stores = pd.read_sql(queries.SELECT_STORES, conn)
+        df_channels = pd.read_sql(queries.SELECT_CHANNELS, conn)
+        df_payment_types = pd.read_sql(queries.SELECT_PAYMENT_TYPES, conn)
+    return df_stores, df_channels, df_payment_types
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def dados_fato_e_explorer(engine, start_date, end_date):
+    end_date_sql = end_date + timedelta(days=1)
+
+    query_params = {"start": start_date, "end": end_date_sql}
+
+    def consultar(alvo):
+        with alvo.connect() as conn:
+            df_analysis_data = pd.read_sql(queries.SELECT_ANALYSIS_DATA, conn, params=query_params)
+
+            if df_analysis_data.empty:
+                return pd.DataFrame(), pd.DataFrame()
+
+            sales_ids = tuple(df_analysis_data['sale_id'].unique().tolist())
+            df_payments = pd.read_sql(queries.SELECT_PAYMENTS, conn, params={"sales_ids": sales_ids})
+
+        return df_analysis_data, df_payments
+
+    return replicas.ler(engine, consultar)
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def recortes_vendas(engine, start_date, end_date, lojas, canais):
+    """
+    Vendas do período filtradas por lojas e canais (nomes; None = todos):
+    uma linha por venda, as linhas com produto e os pagamentos dessas vendas.
+
+    Calculados uma vez por período e seleção e guardados no cache
+    compartilhado, então sessões com os mesmos filtros recebem DataFrames que
+    apontam para os mesmos arquivos mapeados, sem cópia própria. São somente
+    leitura: quem precisar alterar uma coluna deve copiar antes.
+    """
+    df_analysis_data, df_payments = dados_fato_e_explorer(engine, start_date, end_date)
+    if df_analysis_data.empty:
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+
+    selecionadas = np.ones(len(df_analysis_data), dtype=bool)
+    if lojas is not None:
+        selecionadas &= df_analysis_data['store_name'].isin(lojas).to_numpy()
+    if canais is not None:
+        selecionadas &= df_analysis_data['channel_name'].isin(canais).to_numpy()
+    df_analysis_filt = df_analysis_data[selecionadas]
+
+    df_sales_filt = df_analysis_filt.drop_duplicates(subset=['sale_id'])
+    df_explorer = df_analysis_filt.dropna(subset=['product_id'])
+    df_payments_filt = df_payments[df_payments['sale_id'].isin(df_sales_filt['sale_id'])]
+    return df_sales_filt, df_explorer, df_payments_filt
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def hierarquia_produtos(engine, start_date, end_date, lojas, canais):
+    """
+    Agregado em dois níveis para o detalhamento categoria → produto do
+    Explorer, calculado uma vez por período e seleção de lojas e canais:
+
+    - df_categorias: faturamento, quantidade e pedidos de cada categoria (o
+      código da categoria é a posição da linha), mais inicio e fim;
+    - df_produtos: os mesmos totais por produto, ordenados por categoria e,
+      dentro dela, por faturamento.
+
+    Os produtos da categoria i são df_produtos.iloc[inicio:fim], então abrir
+    ou fechar uma categoria é só uma fatia, sem voltar às vendas. Os pedidos
+    da categoria são as vendas distintas com algum produto dela, não a soma
+    dos pedidos dos produtos.
+    """
+    _, df_explorer, _ = recortes_vendas(engine, start_date, end_date, lojas, canais)
+    if df_explorer.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    df = df_explorer[['category_name', 'product_name', 'sale_id', 'quantity', 'product_total_price']]
+    df = df.assign(category_name=df['category_name'].fillna(SEM_CATEGORIA))
+    totais = {
+        'faturamento': ('product_total_price', 'sum'),
+        'quantidade': ('quantity', 'sum'),
+        'pedidos': ('sale_id', 'nunique'),
+    }
+    df_categorias = df.groupby('category_name').agg(**totais).reset_index()
+    df_produtos = (
+        df.groupby(['category_name', 'product_name']).agg(**totais).reset_index()
+        .sort_values(['category_name', 'faturamento'], ascending=[True, False], ignore_index=True)
+    )
+
+    # As duas tabelas estão em ordem de categoria: os limites saem da contagem
+    # acumulada. Uma categoria só com product_name nulo não tem produtos e
+    # entra com zero, para não deslocar os limites das seguintes.
+    produtos_por_categoria = (
+        df_produtos.groupby('category_name').size()
+        .reindex(df_categorias['category_name'], fill_value=0).to_numpy()
+    )
+    df_categorias['fim'] = np.cumsum(produtos_por_categoria)
+    df_categorias['inicio'] = df_categorias['fim'] - produtos_por_categoria
+    return df_categorias, df_produtos
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def dados_agregados(engine, start_date, end_date):
+    query_params = {"start": start_date, "end": end_date + timedelta(days=1)}
+
+    def consultar(alvo):
+        with alvo.connect() as conn:
+            df_diario = pd.read_sql(queries.SELECT_AGREGADO_DIARIO, conn, params=query_params)
+            df_horario = pd.read_sql(queries.SELECT_AGREGADO_HORARIO, conn, params=query_params)
+            df_produtos = pd.read_sql(queries.SELECT_AGREGADO_PRODUTOS, conn, params=query_params)
+            df_pagamentos = pd.read_sql(queries.SELECT_AGREGADO_PAGAMENTOS, conn, params=query_params)
+
+        return df_diario, df_horario, df_produtos, df_pagamentos
+
+    return replicas.ler(engine, consultar)
+
+
+def _diario_do_mes(engine, inicio_mes):
+    query_params = {"start": inicio_mes, "end": (inicio_mes + timedelta(days=32)).replace(day=1)}
+
+    return replicas.ler(engine, lambda alvo: pd.read_sql(queries.SELECT_AGREGADO_DIARIO, alvo, params=query_params))
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=24 * 3600))
+def diario_mes_fechado(engine, inicio_mes):
+    """Agregado diário de um mês que já terminou: quase não muda, fica um dia no cache."""
+    return _diario_do_mes(engine, inicio_mes)
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def diario_mes_corrente(engine, inicio_mes):
+    return _diario_do_mes(engine, inicio_mes)
+
+
+def entradas_diario(start_date, end_date):
+    """(carregador, primeiro dia do mês) das entradas mensais que cobrem o período."""
+    mes_corrente = date.today().replace(day=1)
+    mes = start_date.replace(day=1)
+    while mes <= end_date:
+        yield (diario_mes_fechado if mes < mes_corrente else diario_mes_corrente), mes
+        mes = (mes + timedelta(days=32)).replace(day=1)
+
+
+def agregado_diario(engine, start_date, end_date):
+    """
+    Agregado por dia, loja e canal do período (colunas de SELECT_AGREGADO_DIARIO),
+    montado a partir de entradas mensais do cache, separadas das linhas de
+    vendas. Períodos diferentes que caem nos mesmos meses (o atual, o anterior,
+    o mesmo do ano passado) reaproveitam as entradas; cada mês custa uma
+    consulta agregada na primeira vez e nenhuma depois.
+    """
+    partes = [carregar(engine, mes) for carregar, mes in entradas_diario(start_date, end_date)]
+
+    com_vendas = [df for df in partes if not df.empty]
+    if not com_vendas:
+        return partes[0]
+    df = pd.concat(com_vendas, ignore_index=True)
+    return df[(df['created_at_date'] >= start_date) & (df['created_at_date'] <= end_date)]
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def serie_temporal(engine, start_date, end_date, granularidade):
+    query_params = {"start": start_date, "end": end_date + timedelta(days=1), "granularidade": granularidade}
+
+    return replicas.ler(engine, lambda alvo: pd.read_sql(queries.SELECT_SERIE_TEMPORAL, alvo, params=query_params))
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def dados_rfm(engine, data_referencia):
+    return replicas.ler(engine, lambda alvo: pd.read_sql(queries.SELECT_RFM, alvo, params={"data_ref": data_referencia}))
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def dados_rfm_por_loja(engine, data_referencia, min_freq, min_rec):
+    query_params = {"data_ref": data_referencia, "min_freq": min_freq, "min_rec": min_rec}
+
+    return replicas.ler(engine, lambda alvo: pd.read_sql(queries.SELECT_RFM_POR_LOJA, alvo, params=query_params))
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def sketch_clientes(engine, start_date, end_date):
+    """
+    Um sketch HyperLogLog dos clientes por loja e canal no período. Os dias
+    guardados em sketch_clientes_diario (contagem_distinta.sql) vêm da
+    tabela; os demais são calculados a partir de sales.
+    """
+    def consultar(alvo):
+        partes = []
+        with alvo.connect() as conn:
+            guardados = None
+            if conn.execute(sqlalchemy.text(queries.SELECT_TABELA_SKETCH)).scalar():
+                guardados = conn.execute(sqlalchemy.text(queries.SELECT_COBERTURA_SKETCH)).fetchone()
+
+            if guardados and guardados.inicio and guardados.inicio <= end_date and guardados.fim >= start_date:
+                inicio, fim = max(start_date, guardados.inicio), min(end_date, guardados.fim)
+                partes.append(pd.read_sql(queries.SELECT_SKETCH_CLIENTES_DIARIO, conn, params={"start": inicio, "end": fim}))
+                faltantes = [(start_date, inicio - timedelta(days=1)), (fim + timedelta(days=1), end_date)]
+            else:
+                faltantes = [(start_date, end_date)]
+
+            for inicio, fim in faltantes:
+                if inicio <= fim:
+                    query_params = {"start": inicio, "end": fim + timedelta(days=1)}
+                    partes.append(pd.read_sql(queries.SELECT_SKETCH_CLIENTES, conn, params=query_params))
+        return partes
+
+    partes = replicas.ler(engine, consultar)
+    return contagem_distinta.mesclar_por_grupo(pd.concat(partes, ignore_index=True), ["store_name", "channel_name"])
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def ranking_lojas(engine, start_date, end_date, canais):
+    """
+    Indicadores de todas as lojas no período (indicadores.ranking_lojas),
+    calculados sobre o agregado diário e os sketches de clientes, sem ler as
+    vendas linha a linha. canais são os nomes ordenados ou None para todos.
+    """
+    df_diario = agregado_diario(engine, start_date, end_date)
+    df_sketch = sketch_clientes(engine, start_date, end_date)
+    if canais is not None:
+        df_diario = df_diario[df_diario['channel_name'].isin(canais)]
+        df_sketch = df_sketch[df_sketch['channel_name'].isin(canais)]
+    df_clientes = contagem_distinta.estimar_por_grupo(df_sketch, ["store_name"])
+    return indicadores.ranking_lojas(df_diario, df_clientes).reset_index()
+
+
+@instrumentacao.carregador(cache_compartilhado.compartilhado(ttl=600))
+def dados_coortes(engine, start_date, end_date, lojas, canais):
+    return replicas.ler(engine, lambda alvo: coortes.calcular(alvo, start_date, end_date, lojas, canais))
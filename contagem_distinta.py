@@ -0,0 +1,91 @@
+"""
+Contagem aproximada de clientes distintos (HyperLogLog).
+
+Contagens distintas não podem ser somadas entre dias, lojas ou canais: o
+mesmo cliente aparece em vários. No modo agregado, em vez de trazer as vendas
+linha a linha para contar customer_id, cada dia × loja × canal traz um
+sketch HyperLogLog dos clientes, e sketches se juntam tomando o máximo de
+cada registro. A junção de qualquer conjunto de células estima os clientes
+distintos do conjunto com erro padrão de ERRO_PADRAO (cerca de 1,6%).
+
+Os registros são calculados no Postgres (queries.SELECT_SKETCH_CLIENTES):
+o hash de 64 bits do cliente (hashint8extended) tem os 12 bits baixos como
+índice do registro, e o rank é a posição do primeiro bit 1 nos 52 bits
+seguintes. Cada sketch chega como bytea esparso, 3 bytes por registro não
+nulo (índice uint16 e rank uint8, big-endian). Com contagem_distinta.sql os
+sketches diários ficam guardados no banco e também podem ser juntados em SQL.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+PRECISAO = 12  # Os SQLs usam os mesmos 12 bits (& 4095, >> 12, bit(52))
+REGISTROS = 1 << PRECISAO
+ERRO_PADRAO = 1.04 / math.sqrt(REGISTROS)
+
+_PAR = np.dtype([("registro", ">u2"), ("rank", "u1")])
+_ALFA = 0.7213 / (1 + 1.079 / REGISTROS)
+
+
+def _pares(sketches):
+    sketches = [bytes(s) for s in sketches]
+    tamanhos = np.fromiter(map(len, sketches), dtype=np.int64, count=len(sketches)) // _PAR.itemsize
+    return np.frombuffer(b"".join(sketches), dtype=_PAR), tamanhos
+
+
+def codificar(denso):
+    """Registros densos (uint8[REGISTROS]) para o formato esparso."""
+    indices = np.flatnonzero(denso)
+    pares = np.empty(len(indices), dtype=_PAR)
+    pares["registro"] = indices
+    pares["rank"] = denso[indices]
+    return pares.tobytes()
+
+
+def mesclar(sketches):
+    """Junta sketches esparsos em um vetor denso de registros."""
+    pares, _ = _pares(sketches)
+    denso = np.zeros(REGISTROS, dtype=np.uint8)
+    np.maximum.at(denso, pares["registro"].astype(np.intp), pares["rank"])
+    return denso
+
+
+def _densos_por_grupo(df, colunas):
+    grupos = df.groupby(colunas, sort=False).ngroup().to_numpy()
+    pares, tamanhos = _pares(df["registros"])
+    denso = np.zeros((grupos.max() + 1, REGISTROS), dtype=np.uint8)
+    np.maximum.at(denso, (np.repeat(grupos, tamanhos), pares["registro"].astype(np.intp)), pares["rank"])
+    return df[colunas].drop_duplicates().reset_index(drop=True), denso
+
+
+def mesclar_por_grupo(df, colunas):
+    """Junta a coluna 'registros' de df por grupo de colunas, num único passo."""
+    if df.empty:
+        return pd.DataFrame(columns=colunas + ["registros"])
+    resultado, denso = _densos_por_grupo(df, colunas)
+    resultado["registros"] = [codificar(linha) for linha in denso]
+    return resultado
+
+
+def _estimativas(denso):
+    """Estimativa de cada linha de registros densos (..., REGISTROS)."""
+    estimativa = _ALFA * REGISTROS * REGISTROS / np.ldexp(1.0, -denso.astype(np.int32)).sum(axis=-1)
+    zeros = (denso == 0).sum(axis=-1)
+    # Poucos elementos: contagem linear sobre os registros vazios é mais precisa
+    linear = REGISTROS * np.log(REGISTROS / np.maximum(zeros, 1))
+    return np.rint(np.where((estimativa <= 2.5 * REGISTROS) & (zeros > 0), linear, estimativa)).astype(np.int64)
+
+
+def estimar(sketches):
+    """Número estimado de clientes distintos na junção dos sketches."""
+    return int(_estimativas(mesclar(sketches)))
+
+
+def estimar_por_grupo(df, colunas):
+    """Clientes distintos estimados de cada grupo de colunas (coluna 'clientes'), num único passo."""
+    if df.empty:
+        return pd.DataFrame(columns=colunas + ["clientes"])
+    resultado, denso = _densos_por_grupo(df, colunas)
+    resultado["clientes"] = _estimativas(denso)
+    return resultado
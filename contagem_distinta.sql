@@ -0,0 +1,99 @@
+-- Sketches HyperLogLog diários dos clientes por loja e canal.
+--
+-- Sem esta tabela o dashboard calcula os sketches do período direto de sales
+-- (queries.SELECT_SKETCH_CLIENTES). Com ela, os dias já guardados vêm
+-- prontos, poucos bytes por dia × loja × canal, e só os dias fora da tabela
+-- são calculados na hora. O formato é o de contagem_distinta.py: registros
+-- não nulos em bytea, 3 bytes cada (índice int2 + rank).
+--
+-- Como aplicar (cria a tabela e preenche todo o histórico):
+--     psql -d banco_avaliacao -f contagem_distinta.sql
+--
+-- Vendas de dias já guardados que chegarem ou mudarem depois só entram na
+-- próxima atualização. Agende, por exemplo a cada hora:
+--     SELECT atualizar_sketch_clientes(current_date - 1, current_date);
+--
+-- Os sketches também podem ser juntados em SQL, para qualquer período e
+-- conjunto de lojas e canais:
+--     SELECT clientes_unicos_estimados('2025-01-01', '2025-03-31', ARRAY[1, 2]);
+
+CREATE TABLE IF NOT EXISTS sketch_clientes_diario (
+    dia date NOT NULL,
+    store_id integer NOT NULL,
+    channel_id integer NOT NULL,
+    registros bytea NOT NULL,
+    PRIMARY KEY (dia, store_id, channel_id)
+);
+
+CREATE OR REPLACE FUNCTION atualizar_sketch_clientes(inicio date, fim date)
+RETURNS bigint
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    linhas bigint;
+BEGIN
+    DELETE FROM sketch_clientes_diario WHERE dia >= inicio AND dia <= fim;
+
+    WITH registros AS (
+        SELECT
+            s.created_at::date AS dia, s.store_id, s.channel_id, x.h & 4095 AS registro,
+            MAX(COALESCE(NULLIF(position(B'1' IN (x.h >> 12)::bit(52)), 0), 53)) AS rank
+        FROM sales s
+        CROSS JOIN LATERAL (SELECT hashint8extended(s.customer_id::int8, 0) AS h) x
+        WHERE s.customer_id IS NOT NULL AND s.created_at >= inicio AND s.created_at < fim + 1
+        GROUP BY 1, 2, 3, 4
+    )
+    INSERT INTO sketch_clientes_diario (dia, store_id, channel_id, registros)
+    SELECT
+        dia, store_id, channel_id,
+        string_agg(int2send(registro::int2) || set_byte(decode('00', 'hex'), 0, rank), ''::bytea)
+    FROM registros
+    GROUP BY 1, 2, 3;
+
+    GET DIAGNOSTICS linhas = ROW_COUNT;
+    RETURN linhas;
+END;
+$$;
+
+-- Registros (índice, rank) de um sketch
+CREATE OR REPLACE FUNCTION hll_registros(sketch bytea)
+RETURNS TABLE (registro integer, rank integer)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT (get_byte(sketch, i) << 8) | get_byte(sketch, i + 1), get_byte(sketch, i + 2)
+    FROM generate_series(0, length(sketch) - 3, 3) AS i
+$$;
+
+CREATE OR REPLACE FUNCTION clientes_unicos_estimados(
+    inicio date, fim date, lojas integer[] DEFAULT NULL, canais integer[] DEFAULT NULL
+)
+RETURNS bigint
+LANGUAGE sql
+STABLE
+AS $$
+    WITH mesclado AS (
+        SELECT r.registro, MAX(r.rank) AS rank
+        FROM sketch_clientes_diario d
+        CROSS JOIN LATERAL hll_registros(d.registros) r
+        WHERE d.dia >= inicio AND d.dia <= fim
+          AND (lojas IS NULL OR d.store_id = ANY(lojas))
+          AND (canais IS NULL OR d.channel_id = ANY(canais))
+        GROUP BY r.registro
+    ),
+    soma AS (
+        SELECT 4096 - count(*) AS zeros, (4096 - count(*)) + coalesce(sum(power(2::float8, -rank)), 0) AS inverso
+        FROM mesclado
+    )
+    SELECT round(
+        CASE WHEN estimativa <= 2.5 * 4096 AND zeros > 0 THEN 4096 * ln(4096.0 / zeros) ELSE estimativa END
+    )::bigint
+    FROM soma
+    CROSS JOIN LATERAL (SELECT 0.7213 / (1 + 1.079 / 4096) * 4096 * 4096 / inverso AS estimativa) e
+$$;
+
+SELECT atualizar_sketch_clientes(min(created_at)::date, max(created_at)::date)
+FROM sales
+WHERE NOT EXISTS (SELECT 1 FROM sketch_clientes_diario);
+
+ANALYZE sketch_clientes_diario;
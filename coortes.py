@@ -0,0 +1,178 @@
+"""
+Retenção por coorte mensal de aquisição.
+
+A coorte de um cliente é o mês da primeira compra. Para cada coorte e cada
+idade (meses desde a primeira compra), calcula clientes ativos, pedidos e
+receita.
+
+Em SQL isso pede um GROUP BY por cliente e mês seguido de uma janela com o
+primeiro mês de cada cliente, o que é lento em dezenas de milhões de vendas.
+Aqui as vendas chegam do banco por COPY binário, uma linha de tamanho fixo
+por venda, e viram arrays do numpy bloco a bloco, sem passar por objetos
+Python nem guardar o fluxo inteiro:
+
+- o mês vira um inteiro (meses desde 1970);
+- o primeiro mês de cada cliente sai de um np.minimum.at;
+- cada venda cai numa célula coorte × idade, e pedidos e receita são
+  np.bincount sobre essas células;
+- clientes ativos contam uma vez cada par (cliente, idade).
+
+O resultado é pequeno (no máximo meses² linhas) e vai para o cache
+compartilhado, uma entrada por período e filtro de lojas e canais.
+"""
+import io
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import cancelamento
+import queries
+
+# Linha do COPY binário: nº de campos (int16) e, para cada campo, o tamanho
+# (int32) seguido do valor. Tudo em big-endian.
+_LINHA = np.dtype([
+    ("campos", ">i2"),
+    ("tam_cliente", ">i4"), ("cliente", ">i8"),
+    ("tam_data", ">i4"), ("data", ">i8"),
+    ("tam_valor", ">i4"), ("valor", ">f8"),
+])
+_EPOCA_POSTGRES = np.datetime64("2000-01-01", "us")
+
+
+def mes(data):
+    """Código inteiro do mês (meses desde jan/1970)."""
+    return int(np.datetime64(data, "M").astype(np.int64))
+
+
+def rotulo_mes(codigo):
+    return str(np.datetime64(int(codigo), "M"))
+
+
+class _LeitorCopy(io.RawIOBase):
+    """
+    Destino do COPY binário que converte as linhas em arrays a cada bloco de
+    TAMANHO_BLOCO bytes, em vez de acumular o fluxo inteiro: além dos arrays
+    finais, a memória guarda só um bloco do fluxo bruto. O driver chama
+    write() uma vez por linha, então o leitor fica atrás de um
+    io.BufferedWriter (em C), que só o chama com blocos inteiros.
+    """
+    TAMANHO_BLOCO = 8 * 1024 ** 2
+
+    def __init__(self):
+        self.pendente = bytearray()
+        self.cabecalho_lido = False
+        self.formato_conferido = False
+        self.clientes, self.meses, self.valores = [], [], []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.pendente += dados
+        self._converter()
+        return len(dados)
+
+    def _converter(self, fim=False):
+        inicio = 0
+        if not self.cabecalho_lido:
+            # Cabeçalho: assinatura (11 bytes), flags (4), tamanho da extensão (4) e a extensão
+            if len(self.pendente) < 19 or len(self.pendente) < 19 + int.from_bytes(self.pendente[15:19], "big"):
+                return
+            inicio = 19 + int.from_bytes(self.pendente[15:19], "big")
+            self.cabecalho_lido = True
+        # 2 bytes finais: marcador de fim
+        n = (len(self.pendente) - inicio - (2 if fim else 0)) // _LINHA.itemsize
+        linhas = np.frombuffer(self.pendente, dtype=_LINHA, offset=inicio, count=n)
+        if n and not self.formato_conferido:
+            if (linhas["campos"][0], linhas["tam_cliente"][0], linhas["tam_data"][0], linhas["tam_valor"][0]) != (3, 8, 8, 8):
+                raise ValueError("Formato inesperado no COPY binário das vendas")
+            self.formato_conferido = True
+
+        self.clientes.append(linhas["cliente"].astype(np.int64))
+        self.meses.append(
+            (_EPOCA_POSTGRES + linhas["data"].astype("timedelta64[us]"))
+            .astype("datetime64[M]")
+            .astype(np.int32)
+        )
+        self.valores.append(linhas["valor"].astype(np.float64))
+        # O bytearray só pode encolher depois que nenhum array aponta para ele
+        del linhas
+        del self.pendente[:inicio + n * _LINHA.itemsize]
+
+    def arrays(self):
+        self._converter(fim=True)
+        resultado = []
+        for partes in (self.clientes, self.meses, self.valores):
+            resultado.append(np.concatenate(partes))
+            partes.clear()  # libera os blocos de uma coluna antes de juntar a próxima
+        return tuple(resultado)
+
+
+def ler_vendas(engine, end_date, lojas=None, canais=None):
+    """
+    Vendas com cliente identificado até end_date (exclusivo), como arrays
+    (clientes, meses, valores).
+    """
+    params = {
+        "end": end_date,
+        "lojas": list(lojas) if lojas is not None else None,
+        "canais": list(canais) if canais is not None else None,
+    }
+    leitor = _LeitorCopy()
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            consulta = cur.mogrify(queries.SELECT_VENDAS_POR_CLIENTE, params).decode()
+            with cancelamento.cancelavel(conn.driver_connection):
+                destino = io.BufferedWriter(leitor, buffer_size=_LeitorCopy.TAMANHO_BLOCO)
+                cur.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT binary)", destino)
+                destino.flush()
+        conn.commit()
+    finally:
+        conn.close()
+
+    return leitor.arrays()
+
+
+def matriz(clientes, meses, valores, mes_inicio, mes_fim):
+    """
+    Uma linha por (coorte, idade) com clientes, pedidos e receita, para as
+    coortes de mes_inicio a mes_fim. As vendas anteriores a mes_inicio entram
+    só para definir a primeira compra de cada cliente.
+    """
+    n = mes_fim - mes_inicio + 1
+    codigos, _ = pd.factorize(clientes)
+    primeiro = np.full(codigos.max() + 1 if len(codigos) else 0, np.iinfo(np.int32).max, dtype=np.int32)
+    np.minimum.at(primeiro, codigos, meses)
+
+    coorte = primeiro[codigos]
+    dentro = (coorte >= mes_inicio) & (meses <= mes_fim)
+    coorte, idade = coorte[dentro] - mes_inicio, meses[dentro] - coorte[dentro]
+    celula = coorte.astype(np.int64) * n + idade
+
+    pedidos = np.bincount(celula, minlength=n * n)
+    receita = np.bincount(celula, weights=valores[dentro], minlength=n * n)
+    primeira_vez = ~pd.Series(codigos[dentro].astype(np.int64) * n + idade).duplicated().to_numpy()
+    ativos = np.bincount(celula[primeira_vez], minlength=n * n)
+
+    indice_coorte, indice_idade = np.divmod(np.arange(n * n), n)
+    df = pd.DataFrame({
+        "coorte": indice_coorte + mes_inicio,
+        "idade": indice_idade,
+        "clientes": ativos,
+        "pedidos": pedidos,
+        "receita": receita,
+    })
+    # Células além de mes_fim ainda não aconteceram
+    df = df[indice_coorte + indice_idade < n].copy()
+    df["tamanho_coorte"] = df.groupby("coorte")["clientes"].transform("first")
+    return df[df["tamanho_coorte"] > 0].reset_index(drop=True)
+
+
+def calcular(engine, start_date, end_date, lojas=None, canais=None):
+    mes_inicio, mes_fim = mes(start_date), mes(end_date)
+    clientes, meses, valores = ler_vendas(engine, end_date + timedelta(days=1), lojas, canais)
+    df = matriz(clientes, meses, valores, mes_inicio, mes_fim)
+    df["coorte"] = df["coorte"].map(rotulo_mes)
+    return df
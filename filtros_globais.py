@@ -0,0 +1,201 @@
+"""
+Inicialização comum a todas as páginas: engine, limites de data e os filtros
+globais da barra lateral.
+
+Com tudo aqui, o engine (e o pool de conexões) e o cache dos limites de data
+e das opções de filtro passam a ser um só para o dashboard inteiro; antes
+cada página criava o seu e repetia as consultas na primeira visita. A seleção
+de período, lojas e canais fica no session_state e acompanha o usuário ao
+trocar de página.
+
+Este módulo não importa pandas nem os carregadores: as páginas desenham a
+barra lateral primeiro e só então importam os módulos pesados, então a
+primeira pintura não espera por eles (ver benchmarks/inicializacao.py).
+"""
+import collections
+import threading
+from datetime import datetime, timedelta
+
+import sqlalchemy
+import streamlit as st
+
+import instrumentacao
+import queries
+import replicas
+
+TODAS_AS_LOJAS = "Todas as Lojas"
+TODOS_OS_CANAIS = "Todos os Canais"
+SEM_COMPARACAO = "Sem comparação"
+# Rótulo -> modo de indicadores.periodo_de_comparacao (repetido aqui para não importar pandas)
+COMPARACOES = {
+    SEM_COMPARACAO: None,
+    "Período anterior": "periodo_anterior",
+    "Mesmo período do ano anterior": "ano_anterior",
+}
+
+# Seleções de lojas e canais (Filtros.nomes) feitas neste processo, fora a
+# padrão, para o pré-aquecimento manter as mais usadas
+_selecoes = collections.Counter()
+_lock_selecoes = threading.Lock()
+
+
+@st.cache_resource
+def get_engine():
+    try:
+        conn_string = st.secrets["connections"]["neon_db"]
+        # Réplicas de leitura opcionais para as consultas analíticas (replicas.py)
+        return replicas.criar_engine(conn_string, st.secrets["connections"].get("replicas", []))
+    except Exception as e:
+        st.error(f"Erro ao conectar ao banco de dados: {e}")
+        st.stop()
+
+
+@instrumentacao.carregador(st.cache_data(ttl=3600))
+def carregar_limites_de_data():
+    with get_engine().connect() as conn:
+        result = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone()
+    if result and result.min_date and result.max_date:
+        return result.min_date, result.max_date
+    fallback_start = datetime.now().date() - timedelta(days=30)
+    fallback_end = datetime.now().date()
+    return (fallback_start, fallback_end)
+
+
+@instrumentacao.carregador(st.cache_data(ttl=600))
+def carregar_opcoes():
+    """(id, nome) das lojas ativas e dos canais, sem passar por DataFrames."""
+    with get_engine().connect() as conn:
+        lojas = [tuple(linha) for linha in conn.execute(sqlalchemy.text(queries.SELECT_STORES))]
+        canais = [tuple(linha) for linha in conn.execute(sqlalchemy.text(queries.SELECT_CHANNELS))]
+    return lojas, canais
+
+
+def carregar_tabelas_dimensao():
+    import carregadores
+
+    with st.spinner("Carregando dimensões..."):
+        return carregadores.tabelas_dimensao(get_engine())
+
+
+def selecoes_populares(n):
+    """As n seleções de (lojas, canais) mais usadas neste processo, no formato de Filtros.nomes()."""
+    with _lock_selecoes:
+        return [selecao for selecao, _ in _selecoes.most_common(n)]
+
+
+def iniciar_pre_aquecimento(engine):
+    import pre_aquecimento
+
+    pre_aquecimento.iniciar(engine, selecoes_populares)
+
+
+class Filtros:
+    def __init__(self, start_date, end_date, lojas, canais, opcoes, comparacao=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.lojas = lojas
+        self.canais = canais
+        self.comparacao = comparacao
+        self._opcoes = opcoes
+
+    def filtrar(self, df):
+        if TODAS_AS_LOJAS not in self.lojas:
+            df = df[df['store_name'].isin(self.lojas)]
+        if TODOS_OS_CANAIS not in self.canais:
+            df = df[df['channel_name'].isin(self.canais)]
+        return df
+
+    def nomes(self):
+        """Lojas e canais escolhidos, ordenados (chave de cache); None quando "Todas/Todos" está marcada."""
+        lojas = None if TODAS_AS_LOJAS in self.lojas else tuple(sorted(self.lojas))
+        canais = None if TODOS_OS_CANAIS in self.canais else tuple(sorted(self.canais))
+        return lojas, canais
+
+    def ids(self):
+        """
+        Ids das lojas e dos canais escolhidos, em ordem estável (servem de
+        chave de cache); None quando a opção "Todas/Todos" está marcada.
+        """
+        lojas_opcoes, canais_opcoes = self._opcoes
+        lojas = None if TODAS_AS_LOJAS in self.lojas else tuple(sorted(i for i, nome in lojas_opcoes if nome in self.lojas))
+        canais = None if TODOS_OS_CANAIS in self.canais else tuple(sorted(i for i, nome in canais_opcoes if nome in self.canais))
+        return lojas, canais
+
+
+def _manter(chave, padrao, valido=lambda valor: True):
+    # O Streamlit descarta o estado de widgets que não aparecem numa execução,
+    # então cada página regrava o valor para que ele sobreviva à troca de página.
+    if chave in st.session_state and valido(st.session_state[chave]):
+        st.session_state[chave] = st.session_state[chave]
+    else:
+        st.session_state[chave] = padrao
+
+
+def barra_lateral(ate_hoje=False, comparar=False):
+    """
+    Desenha os filtros globais e devolve a seleção. Com ate_hoje=True o período
+    padrão termina hoje e não é limitado às datas com vendas; com comparar=True
+    mostra também a escolha do período de comparação (Filtros.comparacao).
+    """
+    opcoes = lojas_opcoes, canais_opcoes = carregar_opcoes()
+
+    st.sidebar.header("Filtros Globais")
+    st.sidebar.write("Estes filtros afetam **todas** as páginas.")
+
+    if ate_hoje:
+        min_date = max_date = None
+        default_end = datetime.now().date()
+        default_start = default_end - timedelta(days=30)
+    else:
+        min_date, max_date = carregar_limites_de_data()
+        default_start = max(min_date, max_date - timedelta(days=30))
+        default_end = max_date
+
+    def periodo_valido(periodo):
+        return len(periodo) != 2 or ate_hoje or (min_date <= periodo[0] and periodo[1] <= max_date)
+
+    _manter("filtro_periodo", (default_start, default_end), periodo_valido)
+    date_range = st.sidebar.date_input(
+        "Selecione o Período",
+        min_value=min_date,
+        max_value=max_date,
+        format="DD/MM/YYYY",
+        key="filtro_periodo"
+    )
+    if len(date_range) != 2:
+        st.sidebar.error("Por favor, selecione um período de início e fim.")
+        st.stop()
+    start_date, end_date = date_range
+
+    store_options = [TODAS_AS_LOJAS] + [nome for _, nome in lojas_opcoes]
+    _manter("filtro_lojas", [TODAS_AS_LOJAS], lambda lojas: set(lojas) <= set(store_options))
+    selected_store_names = st.sidebar.multiselect(
+        "Selecione as Lojas",
+        options=store_options,
+        key="filtro_lojas"
+    )
+
+    channel_options = [TODOS_OS_CANAIS] + [nome for _, nome in canais_opcoes]
+    _manter("filtro_canais", [TODOS_OS_CANAIS], lambda canais: set(canais) <= set(channel_options))
+    selected_channel_names = st.sidebar.multiselect(
+        "Selecione os Canais",
+        options=channel_options,
+        key="filtro_canais"
+    )
+
+    # Mantida também nas páginas sem comparação, para não se perder na navegação
+    _manter("filtro_comparacao", SEM_COMPARACAO, lambda rotulo: rotulo in COMPARACOES)
+    comparacao = None
+    if comparar:
+        comparacao = COMPARACOES[st.sidebar.selectbox(
+            "Comparar com",
+            options=list(COMPARACOES),
+            key="filtro_comparacao"
+        )]
+
+    filtros = Filtros(start_date, end_date, selected_store_names, selected_channel_names, opcoes, comparacao)
+    selecao = filtros.nomes()
+    if selecao != (None, None):
+        with _lock_selecoes:
+            _selecoes[selecao] += 1
+    return filtros
@@ -0,0 +1,22 @@
+"""
+Regras para manter os gráficos de linha leves em períodos longos.
+
+O tamanho do balde de tempo é escolhido pelo período selecionado, para que
+cada série tenha no máximo MAX_PONTOS_GRAFICO pontos, e o agrupamento é feito
+no Postgres com date_trunc (ver queries.SELECT_SERIE_TEMPORAL). Com no
+máximo algumas centenas de pontos, o SVG padrão do Plotly já é leve, então os
+gráficos não precisam de WebGL.
+"""
+MAX_PONTOS_GRAFICO = 400
+
+ROTULOS = {"day": "por dia", "week": "por semana", "month": "por mês"}
+
+
+def escolher_granularidade(start_date, end_date):
+    dias = (end_date - start_date).days + 1
+    if dias <= MAX_PONTOS_GRAFICO:
+        return "day"
+    if dias / 7 <= MAX_PONTOS_GRAFICO:
+        return "week"
+    return "month"
+
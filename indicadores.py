@@ -0,0 +1,127 @@
+"""
+Cálculos das páginas que também são usados fora do Streamlit (relatorios.py).
+
+Recebem DataFrames já filtrados por loja e canal e não chamam nada do st.*.
+"""
+from datetime import timedelta
+
+COMPARAR_PERIODO_ANTERIOR = "periodo_anterior"
+COMPARAR_ANO_ANTERIOR = "ano_anterior"
+
+
+def visao_geral_agregada(df_diario):
+    """Indicadores da Visão Geral a partir do agregado diário por loja e canal."""
+    faturamento = df_diario['total_amount'].sum()
+    pedidos = int(df_diario['pedidos'].sum())
+    n_preparo = df_diario['n_preparo'].sum()
+    n_entrega = df_diario['n_entrega'].sum()
+    return {
+        'faturamento': faturamento,
+        'pedidos': pedidos,
+        'ticket_medio': faturamento / pedidos if pedidos > 0 else 0,
+        'preparo_seg': df_diario['soma_preparo'].sum() / n_preparo if n_preparo > 0 else None,
+        'entrega_seg': df_diario['soma_entrega'].sum() / n_entrega if n_entrega > 0 else None,
+    }
+
+
+def resumo_financeiro(df_sales):
+    """Bruto, descontos, taxas e líquido (Análise de Descontos); aceita vendas ou o agregado diário."""
+    total_bruto = df_sales['total_amount_items'].sum()
+    total_descontos = df_sales['total_discount'].sum()
+    total_taxas_delivery = df_sales['delivery_fee'].sum()
+    total_taxas_servico = df_sales['service_tax_fee'].sum()
+    total_taxas = total_taxas_delivery + total_taxas_servico
+    return {
+        'total_bruto': total_bruto,
+        'total_descontos': total_descontos,
+        'total_taxas_delivery': total_taxas_delivery,
+        'total_taxas_servico': total_taxas_servico,
+        'total_taxas': total_taxas,
+        'total_liquido': total_bruto - total_descontos - total_taxas,
+        'perc_desconto': (total_descontos / total_bruto * 100) if total_bruto > 0 else 0,
+        'perc_taxa': (total_taxas / total_bruto * 100) if total_bruto > 0 else 0,
+    }
+
+
+def descontos_por_canal(df_sales, contagem_pedidos):
+    """
+    Faturamento bruto, descontos, taxas e pedidos por canal. contagem_pedidos
+    é a agregação nomeada dos pedidos: ('sale_id', 'nunique') nas vendas ou
+    ('pedidos', 'sum') no agregado diário.
+    """
+    df_canal = df_sales.groupby('channel_name').agg(
+        Faturamento_Bruto=('total_amount_items', 'sum'),
+        Descontos=('total_discount', 'sum'),
+        Taxas=('delivery_fee', 'sum'),
+        Pedidos=contagem_pedidos
+    )
+    df_canal['Desconto_por_Pedido'] = (df_canal['Descontos'] / df_canal['Pedidos']).fillna(0)
+    return df_canal
+
+
+def ranking_lojas(df_diario, df_clientes):
+    """
+    Indicadores da Visão Geral e da Análise de Descontos de cada loja, num
+    único groupby do agregado diário; df_clientes (store_name, clientes) traz
+    os clientes únicos estimados por loja. Indexado por store_name.
+    """
+    por_loja = df_diario.groupby('store_name').agg(
+        faturamento=('total_amount', 'sum'),
+        pedidos=('pedidos', 'sum'),
+        bruto=('total_amount_items', 'sum'),
+        descontos=('total_discount', 'sum'),
+        taxas_delivery=('delivery_fee', 'sum'),
+        taxas_servico=('service_tax_fee', 'sum'),
+        soma_preparo=('soma_preparo', 'sum'),
+        n_preparo=('n_preparo', 'sum'),
+        soma_entrega=('soma_entrega', 'sum'),
+        n_entrega=('n_entrega', 'sum'),
+    )
+    bruto = por_loja['bruto'].where(por_loja['bruto'] > 0)
+    return por_loja.assign(
+        ticket_medio=por_loja['faturamento'] / por_loja['pedidos'].where(por_loja['pedidos'] > 0),
+        clientes_unicos=df_clientes.set_index('store_name')['clientes'],
+        preparo_seg=por_loja['soma_preparo'] / por_loja['n_preparo'].where(por_loja['n_preparo'] > 0),
+        entrega_seg=por_loja['soma_entrega'] / por_loja['n_entrega'].where(por_loja['n_entrega'] > 0),
+        perc_desconto=por_loja['descontos'] / bruto * 100,
+        perc_taxa=(por_loja['taxas_delivery'] + por_loja['taxas_servico']) / bruto * 100,
+    )[['faturamento', 'pedidos', 'ticket_medio', 'clientes_unicos', 'preparo_seg', 'entrega_seg', 'perc_desconto', 'perc_taxa']]
+
+
+def filtrar_rfm(df_rfm, min_freq, min_rec):
+    """Clientes com min_freq+ pedidos que não compram há min_rec+ dias."""
+    return df_rfm[
+        (df_rfm['frequencia'] >= min_freq) &
+        (df_rfm['dias_sem_comprar'] >= min_rec)
+    ]
+
+
+def _um_ano_antes(dia):
+    try:
+        return dia.replace(year=dia.year - 1)
+    except ValueError:  # 29/02
+        return dia.replace(year=dia.year - 1, day=28)
+
+
+def periodo_de_comparacao(start_date, end_date, modo):
+    """
+    (início, fim) do período comparado: os mesmos dias imediatamente antes
+    (COMPARAR_PERIODO_ANTERIOR) ou as mesmas datas um ano antes.
+    """
+    if modo == COMPARAR_PERIODO_ANTERIOR:
+        return start_date - (end_date - start_date) - timedelta(days=1), start_date - timedelta(days=1)
+    return _um_ano_antes(start_date), _um_ano_antes(end_date)
+
+
+def variacoes(atual, anterior):
+    """Variação relativa de cada indicador; None sem base de comparação."""
+    return {
+        chave: (atual[chave] - anterior[chave]) / abs(anterior[chave])
+        if atual[chave] is not None and anterior.get(chave) else None
+        for chave in atual
+    }
+
+
+def formatar_variacao(variacao):
+    """Texto do delta do st.metric ("+12.3%"); None esconde o delta."""
+    return f"{variacao:+.1%}" if variacao is not None else None
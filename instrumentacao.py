@@ -0,0 +1,394 @@
+"""
+Instrumentação dos carregadores e das etapas de cada página.
+
+Desligada por padrão. Com a variável de ambiente DASHBOARD_DIAGNOSTICO=1:
+
+- cada carregador registra duração total, tempo gasto no banco (execução do
+  cursor, que inclui a transferência das linhas), tempo de conversão do
+  read_sql, linhas, bytes do DataFrame e se foi acerto ou falha de cache;
+- cada página registra a duração das etapas marcadas com `etapa()` e o tempo
+  de serialização dos gráficos Plotly;
+- os eventos vão para o logger "dashboard.metricas" como JSON, aparecem na
+  página oculta `?diagnostico=1` e, se DASHBOARD_METRICAS_PORTA estiver
+  definida, num endpoint HTTP em formato texto do Prometheus (/metrics),
+  aberto só em 127.0.0.1 (DASHBOARD_METRICAS_ENDERECO para ampliar).
+
+A página de diagnóstico e o /metrics também mostram o uso do cache
+compartilhado (bytes por entrada, limite e taxa de acerto), que é contado
+mesmo com a instrumentação desligada. A página, porém, só abre com
+DASHBOARD_DIAGNOSTICO=1: as assinaturas do cache incluem os filtros dos
+usuários.
+
+Desligada, cada decorador devolve a função original e as demais chamadas
+retornam logo na primeira linha.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+
+ATIVO = os.environ.get("DASHBOARD_DIAGNOSTICO", "").lower() in ("1", "true", "sim")
+PORTA_METRICAS = os.environ.get("DASHBOARD_METRICAS_PORTA")
+ENDERECO_METRICAS = os.environ.get("DASHBOARD_METRICAS_ENDERECO", "127.0.0.1")
+
+logger = logging.getLogger("dashboard.metricas")
+if ATIVO and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_eventos = deque(maxlen=2000)
+_totais = defaultdict(lambda: defaultdict(float))
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _registrar(evento):
+    evento["ts"] = time.time()
+    with _lock:
+        _eventos.append(evento)
+        totais = _totais[(evento["tipo"], evento["nome"])]
+        totais["chamadas"] += 1
+        totais["segundos"] += evento["duracao_s"]
+        for chave in ("segundos_banco", "linhas", "bytes"):
+            if chave in evento:
+                totais[chave] += evento[chave]
+        if evento.get("cache"):
+            totais[f"cache_{evento['cache']}"] += 1
+    logger.info(json.dumps(evento, ensure_ascii=False, default=str))
+
+
+def _tamanho(resultado):
+    frames = resultado if isinstance(resultado, tuple) else (resultado,)
+    linhas = bytes_ = 0
+    for df in frames:
+        if hasattr(df, "memory_usage"):
+            linhas += len(df)
+            bytes_ += int(df.memory_usage(index=False, deep=False).sum())
+    return linhas, bytes_
+
+
+def carregador(cache):
+    """
+    Envolve um carregador com o seu decorador de cache e mede a chamada:
+
+        @instrumentacao.carregador(st.cache_data(ttl=600))
+        def carregar_dados_rfm(data_referencia): ...
+
+    A função interna só roda quando o cache falha, o que permite distinguir
+    acertos de falhas sem depender da implementação do cache.
+    """
+    def decorador(func):
+        if not ATIVO:
+            return cache(func)
+
+        @functools.wraps(func)
+        def executar(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # No fim: um carregador chamado por este (acerto ou não) não
+                # pode apagar a marca de que esta função executou
+                _local.executou = True
+
+        em_cache = cache(executar)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            _local.executou = False
+            _local.segundos_banco = 0.0
+            inicio = time.perf_counter()
+            resultado = em_cache(*args, **kwargs)
+            duracao = time.perf_counter() - inicio
+            linhas, bytes_ = _tamanho(resultado)
+            _registrar({
+                "tipo": "carregador",
+                "nome": func.__name__,
+                "pagina": getattr(_local, "pagina", None),
+                "duracao_s": duracao,
+                "segundos_banco": _local.segundos_banco,
+                "segundos_conversao": max(duracao - _local.segundos_banco, 0) if _local.executou else 0,
+                "linhas": linhas,
+                "bytes": bytes_,
+                "cache": "miss" if _local.executou else "hit",
+            })
+            return resultado
+
+        if hasattr(em_cache, "clear"):
+            wrapper.clear = em_cache.clear
+        if hasattr(em_cache, "aquecer"):
+            wrapper.aquecer = em_cache.aquecer
+        return wrapper
+    return decorador
+
+
+def iniciar_pagina(nome):
+    """Marca o início de uma execução da página; as etapas contam a partir daqui."""
+    if not ATIVO:
+        return
+    _local.pagina = nome
+    _local.inicio_etapa = time.perf_counter()
+    _iniciar_servidor()
+
+
+def pagina_atual():
+    return getattr(_local, "pagina", None)
+
+
+def definir_pagina(nome):
+    """Repassa a página da thread do script para uma thread auxiliar."""
+    if not ATIVO:
+        return
+    _local.pagina = nome
+
+
+def etapa(nome):
+    """Registra o tempo decorrido desde a etapa anterior da mesma execução."""
+    if not ATIVO:
+        return
+    agora = time.perf_counter()
+    inicio = getattr(_local, "inicio_etapa", agora)
+    _local.inicio_etapa = agora
+    _registrar({
+        "tipo": "etapa",
+        "nome": f"{getattr(_local, 'pagina', '?')}: {nome}",
+        "pagina": getattr(_local, "pagina", None),
+        "duracao_s": agora - inicio,
+    })
+
+
+def _pontos(fig):
+    total = 0
+    for trace in fig.data:
+        for atributo in ("x", "values", "z"):
+            valores = getattr(trace, atributo, None)
+            if valores is not None:
+                total += len(valores)
+                break
+    return total
+
+
+def plotly_chart(fig, **kwargs):
+    """st.plotly_chart medindo o tempo de serialização e envio da figura."""
+    if not ATIVO:
+        return st.plotly_chart(fig, **kwargs)
+    inicio = time.perf_counter()
+    retorno = st.plotly_chart(fig, **kwargs)
+    _registrar({
+        "tipo": "plotly",
+        "nome": f"{getattr(_local, 'pagina', '?')}: {fig.layout.title.text or 'gráfico'}",
+        "pagina": getattr(_local, "pagina", None),
+        "duracao_s": time.perf_counter() - inicio,
+        "pontos": _pontos(fig),
+    })
+    return retorno
+
+
+def _antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_cursor", []).append(time.perf_counter())
+
+
+def _depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info["inicio_cursor"].pop()
+    _local.segundos_banco = getattr(_local, "segundos_banco", 0.0) + time.perf_counter() - inicio
+
+
+if ATIVO:
+    import sqlalchemy
+    from sqlalchemy import event
+
+    event.listen(sqlalchemy.engine.Engine, "before_cursor_execute", _antes_de_executar)
+    event.listen(sqlalchemy.engine.Engine, "after_cursor_execute", _depois_de_executar)
+
+
+def eventos():
+    with _lock:
+        return list(_eventos)
+
+
+def texto_prometheus():
+    linhas = []
+    series = [
+        ("dashboard_chamadas_total", "chamadas", "counter"),
+        ("dashboard_segundos_total", "segundos", "counter"),
+        ("dashboard_segundos_banco_total", "segundos_banco", "counter"),
+        ("dashboard_linhas_total", "linhas", "counter"),
+        ("dashboard_bytes_total", "bytes", "counter"),
+        ("dashboard_cache_hit_total", "cache_hit", "counter"),
+        ("dashboard_cache_miss_total", "cache_miss", "counter"),
+    ]
+    with _lock:
+        totais = {chave: dict(valores) for chave, valores in _totais.items()}
+    for metrica, campo, tipo in series:
+        linhas.append(f"# TYPE {metrica} {tipo}")
+        for (tipo_evento, nome), valores in sorted(totais.items()):
+            if campo in valores:
+                nome_escapado = nome.replace("\\", "\\\\").replace('"', '\\"')
+                linhas.append(f'{metrica}{{tipo="{tipo_evento}",nome="{nome_escapado}"}} {valores[campo]:g}')
+
+    import cache_compartilhado
+
+    cache = cache_compartilhado.estatisticas()
+    for metrica, valor, tipo in [
+        ("dashboard_cache_compartilhado_bytes", cache["bytes"], "gauge"),
+        ("dashboard_cache_compartilhado_orcamento_bytes", cache["orcamento_bytes"], "gauge"),
+        ("dashboard_cache_compartilhado_entradas", len(cache["entradas"]), "gauge"),
+        ("dashboard_cache_compartilhado_acertos_total", cache["acertos"], "counter"),
+        ("dashboard_cache_compartilhado_falhas_total", cache["falhas"], "counter"),
+        ("dashboard_cache_compartilhado_removidas_total", cache["removidas"], "counter"),
+    ]:
+        linhas.append(f"# TYPE {metrica} {tipo}")
+        linhas.append(f"{metrica} {valor:g}")
+
+    import replicas
+
+    estado_replicas = replicas.estado()
+    if estado_replicas:
+        for metrica, tipo in [
+            ("dashboard_replica_atraso_segundos", "gauge"),
+            ("dashboard_replica_em_dia", "gauge"),
+            ("dashboard_replica_leituras_total", "counter"),
+        ]:
+            linhas.append(f"# TYPE {metrica} {tipo}")
+            for r in estado_replicas:
+                valor = {
+                    "dashboard_replica_atraso_segundos": r["atraso_s"] if r["atraso_s"] is not None else float("nan"),
+                    "dashboard_replica_em_dia": int(r["em_dia"]),
+                    "dashboard_replica_leituras_total": r["leituras"],
+                }[metrica]
+                linhas.append(f'{metrica}{{replica="{r["replica"]}"}} {valor:g}')
+    return "\n".join(linhas) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/metrics", "/metrics.json"):
+            self.send_error(404)
+            return
+        if self.path == "/metrics":
+            corpo = texto_prometheus().encode()
+            tipo = "text/plain; version=0.0.4"
+        else:
+            corpo = json.dumps(eventos(), ensure_ascii=False, default=str).encode()
+            tipo = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+_servidor = None
+
+
+def _iniciar_servidor():
+    global _servidor
+    if not PORTA_METRICAS or _servidor is not None:
+        return
+    with _lock:
+        if _servidor is not None:
+            return
+        try:
+            _servidor = ThreadingHTTPServer((ENDERECO_METRICAS, int(PORTA_METRICAS)), _Handler)
+        except OSError as e:
+            # Outro processo do mesmo host já abriu a porta
+            logger.warning(f"Endpoint de métricas indisponível na porta {PORTA_METRICAS}: {e}")
+            _servidor = False
+            return
+    threading.Thread(target=_servidor.serve_forever, daemon=True).start()
+
+
+def renderizar_painel():
+    """Página oculta de diagnóstico, aberta com ?diagnostico=1."""
+    import pandas as pd
+
+    import cache_compartilhado
+
+    st.title("Diagnóstico")
+    if not ATIVO:
+        st.info("A instrumentação está desligada. Defina DASHBOARD_DIAGNOSTICO=1 e reinicie o servidor.")
+        return
+
+    st.header("Cache Compartilhado")
+    cache = cache_compartilhado.estatisticas()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Em uso", f"{cache['bytes'] / 1024 ** 2:,.1f} MB", help=cache["diretorio"])
+    col2.metric("Limite", f"{cache['orcamento_bytes'] / 1024 ** 2:,.0f} MB", help=f"Compressão: {cache['compressao'] or 'nenhuma'}")
+    col3.metric(
+        "Taxa de acerto (processo)",
+        f"{cache['taxa_acerto']:.0%}" if cache["taxa_acerto"] is not None else "N/A"
+    )
+    col4.metric("Removidas pelo limite", cache["removidas"])
+    df_cache = pd.DataFrame(cache["entradas"])
+    if not df_cache.empty:
+        df_cache['MB'] = df_cache['bytes'] / 1024 ** 2
+        df_cache['MB_descomprimido'] = df_cache['bytes_descomprimidos'] / 1024 ** 2
+        df_cache['ultimo_acesso'] = pd.to_datetime(df_cache['ultimo_acesso'], unit='s')
+        df_cache['expira_em'] = pd.to_datetime(df_cache['expira_em'], unit='s')
+        resumo = df_cache.groupby('funcao').agg(
+            Entradas=('MB', 'size'),
+            MB=('MB', 'sum'),
+            MB_Descomprimido=('MB_descomprimido', 'sum'),
+            Acertos=('acertos', 'sum'),
+            Falhas=('falhas', 'sum'),
+        ).sort_values('MB', ascending=False)
+        st.dataframe(resumo, width="stretch")
+        st.dataframe(
+            df_cache[['assinatura', 'linhas', 'MB', 'MB_descomprimido', 'compressao', 'ultimo_acesso', 'expira_em', 'acertos', 'falhas']]
+            .sort_values('ultimo_acesso', ascending=False),
+            width="stretch"
+        )
+
+    import replicas
+
+    estado_replicas = replicas.estado()
+    if estado_replicas:
+        st.header("Réplicas de Leitura")
+        st.caption(
+            f"Leituras analíticas vão para réplicas com atraso de até {replicas.ATRASO_MAX_S:g} s; "
+            "sem nenhuma em dia, para o primário."
+        )
+        df_replicas = pd.DataFrame(estado_replicas)
+        df_replicas['verificada_em'] = pd.to_datetime(df_replicas['verificada_em'], unit='s')
+        st.dataframe(df_replicas, width="stretch")
+
+    df = pd.DataFrame(eventos())
+    if df.empty:
+        st.info("Nenhum evento registrado ainda neste processo.")
+        return
+
+    st.header("Carregadores")
+    df_carga = df[df['tipo'] == 'carregador']
+    if not df_carga.empty:
+        resumo = df_carga.groupby('nome').agg(
+            Chamadas=('duracao_s', 'size'),
+            Acertos=('cache', lambda s: (s == 'hit').sum()),
+            Falhas=('cache', lambda s: (s == 'miss').sum()),
+            Tempo_Medio_s=('duracao_s', 'mean'),
+            Tempo_Banco_s=('segundos_banco', 'sum'),
+            Tempo_Conversao_s=('segundos_conversao', 'sum'),
+            Linhas=('linhas', 'max'),
+            MB=('bytes', lambda s: s.max() / 1024 ** 2),
+        )
+        st.dataframe(resumo, width="stretch")
+
+    st.header("Etapas das Páginas e Gráficos")
+    df_etapas = df[df['tipo'].isin(['etapa', 'plotly'])]
+    if not df_etapas.empty:
+        resumo = df_etapas.groupby(['tipo', 'nome'])['duracao_s'].agg(['count', 'mean', 'max'])
+        st.dataframe(resumo, width="stretch")
+
+    st.header("Últimos Eventos")
+    st.dataframe(df.sort_values('ts', ascending=False).head(200), width="stretch")
+    st.download_button("Baixar métricas (Prometheus)", texto_prometheus(), file_name="metricas.txt")
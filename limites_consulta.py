@@ -0,0 +1,68 @@
+"""
+Proteções de custo das consultas.
+
+Antes de baixar as linhas detalhadas de um período, estimamos quantas linhas
+o SELECT_ANALYSIS_DATA devolveria usando a estimativa do planejador do
+Postgres (EXPLAIN, sem executar a consulta). Acima de DASHBOARD_MAX_LINHAS as
+páginas passam a usar as consultas agregadas no servidor. Toda conexão também
+recebe um statement_timeout (DASHBOARD_STATEMENT_TIMEOUT_MS), para que nenhuma
+consulta prenda o banco e a memória do contêiner por minutos.
+"""
+import os
+from datetime import timedelta
+
+import psycopg2.errors
+import streamlit as st
+from sqlalchemy import event
+
+import queries
+
+MAX_LINHAS = int(os.environ.get("DASHBOARD_MAX_LINHAS", 2_000_000))
+STATEMENT_TIMEOUT_MS = int(os.environ.get("DASHBOARD_STATEMENT_TIMEOUT_MS", 120_000))
+
+
+class ConsultaCancelada(Exception):
+    """A consulta passou do statement_timeout e foi cancelada pelo Postgres."""
+
+
+def foi_cancelada(erro):
+    """
+    True só para o cancelamento pelo statement_timeout (SQLSTATE 57014), vindo
+    do SQLAlchemy ou direto do driver (COPY). Banco fora do ar, senha errada
+    ou conexão perdida também são OperationalError, mas não são cancelamento.
+    """
+    return isinstance(getattr(erro, "orig", erro), psycopg2.errors.QueryCanceled)
+
+
+def configurar_engine(engine):
+    """Aplica o statement_timeout a cada nova conexão do pool."""
+    @event.listens_for(engine, "connect")
+    def definir_timeout(dbapi_connection, connection_record):
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"SET statement_timeout = {STATEMENT_TIMEOUT_MS}")
+        dbapi_connection.commit()
+
+    return engine
+
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def estimar_linhas(_engine, start_date, end_date):
+    query_params = {"start": start_date, "end": end_date + timedelta(days=1)}
+    with _engine.connect() as conn:
+        plano = conn.exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + queries.SELECT_ANALYSIS_DATA, query_params
+        ).scalar()
+    return int(plano[0]["Plan"]["Plan Rows"])
+
+
+def usar_modo_agregado(engine, start_date, end_date):
+    """True quando o período pedido traria mais linhas que o limite configurado."""
+    return estimar_linhas(engine, start_date, end_date) > MAX_LINHAS
+
+
+def aviso_modo_agregado():
+    st.info(
+        "O período selecionado tem vendas demais para a análise detalhada. "
+        "Exibindo indicadores agregados no servidor; reduza o período para ver os detalhes.",
+        icon="📊"
+    )
@@ -1,117 +1,131 @@
 import streamlit as st
-import pandas as pd
-import sqlalchemy
-import plotly.express as px
-from datetime import datetime, timedelta
-import queries  
-
-@st.cache_resource
-def get_engine():
-    try:
-        conn_string = st.secrets["connections"]["neon_db"]
-        engine = sqlalchemy.create_engine(conn_string)
-        return engine
-    except Exception as e:
-        st.error(f"Erro ao conectar ao banco de dados: {e}")
-        st.stop()
-
-engine = get_engine()
-
-@st.cache_data(ttl=600, show_spinner="Carregando dimensões...")
-def carregar_tabelas_dimensao():
-    with engine.connect() as conn:
-        df_stores = pd.read_sql(queries.SELECT_STORES, conn)
-        df_channels = pd.read_sql(queries.SELECT_CHANNELS, conn)
-        df_payment_types = pd.read_sql(queries.SELECT_PAYMENT_TYPES, conn)
-    return df_stores, df_channels, df_payment_types
-
-@st.cache_data(ttl=600, show_spinner="Carregando dados de vendas...")
-def carregar_dados_fato_e_explorer(start_date, end_date):
-    end_date_sql = end_date + timedelta(days=1)
-    
-    query_params = {"start": start_date, "end": end_date_sql}
-    
-    with engine.connect() as conn:
-        
-        df_analysis_data = pd.read_sql(queries.SELECT_ANALYSIS_DATA, conn, params=query_params)
+import filtros_globais
+import instrumentacao
 
-        if df_analysis_data.empty:
-            return pd.DataFrame(), pd.DataFrame()
+instrumentacao.iniciar_pagina("Análise Operacional")
 
-        sales_ids_list = df_analysis_data['sale_id'].unique().tolist()
-        sales_ids = tuple(sales_ids_list) 
-        if not sales_ids:
-            return df_analysis_data, pd.DataFrame()
+engine = filtros_globais.get_engine()
+filtros = filtros_globais.barra_lateral(ate_hoje=True)
+start_date, end_date = filtros.start_date, filtros.end_date
+selected_store_names, selected_channel_names = filtros.lojas, filtros.canais
+filtrar_lojas_e_canais = filtros.filtrar
 
-        
-        sql_payments_query = f"SELECT sale_id, payment_type_id, value FROM payments WHERE sale_id IN {sales_ids}"
-        
-        
-        df_payments = pd.read_sql(sql_payments_query, conn)
+modo_ao_vivo = st.sidebar.toggle(
+    "Modo ao vivo (hoje)",
+    help="Atualiza os tempos de preparo e entrega do dia atual a cada poucos segundos."
+)
 
-    return df_analysis_data, df_payments
+instrumentacao.etapa("bootstrap")
 
-@st.cache_data(ttl=600, show_spinner="Analisando comportamento dos clientes...")
-def carregar_dados_rfm(data_referencia):
-    
-    query_params = {"data_ref": data_referencia}
-    
-    with engine.connect() as conn:
-        
-        df = pd.read_sql(queries.SELECT_RFM, conn, params=query_params)
-    return df
-
-df_stores, df_channels, df_payment_types = carregar_tabelas_dimensao()
-
-st.sidebar.header("Filtros Globais")
-st.sidebar.write("Estes filtros afetam **todas** as páginas.")
-
-default_start = datetime.now().date() - timedelta(days=30)
-default_end = datetime.now().date()
-date_range = st.sidebar.date_input(
-    "Selecione o Período",
-    (default_start, default_end),
-    format="DD/MM/YYYY"
-)
-if len(date_range) != 2:
-    st.sidebar.error("Por favor, selecione um período de início e fim.")
-    st.stop()
-start_date, end_date = date_range
-
-store_options = ["Todas as Lojas"] + df_stores['store_name'].tolist()
-selected_store_names = st.sidebar.multiselect(
-    "Selecione as Lojas",
-    options=store_options,
-    default=["Todas as Lojas"]
-)
+# Só depois da barra lateral desenhada: pandas, plotly e os carregadores
+# levam quase um segundo para importar numa partida fria.
+import plotly.express as px
+import cancelamento
+import carregadores
+import graficos
+import limites_consulta
 
-channel_options = ["Todos os Canais"] + df_channels['channel_name'].tolist()
-selected_channel_names = st.sidebar.multiselect(
-    "Selecione os Canais",
-    options=channel_options,
-    default=["Todos os Canais"]
-)
+filtros_globais.iniciar_pre_aquecimento(engine)
 
-df_analysis_data, df_payments = carregar_dados_fato_e_explorer(start_date, end_date)
+def carregar_recortes_vendas(start_date, end_date):
+    with st.spinner("Aplicando os filtros..."):
+        return cancelamento.executar(carregadores.recortes_vendas, engine, start_date, end_date, *filtros.nomes())
 
-if not df_analysis_data.empty:
-    df_analysis_data['created_at_date'] = pd.to_datetime(df_analysis_data['created_at']).dt.date
+def carregar_dados_fato_e_explorer(start_date, end_date):
+    with st.spinner("Carregando dados de vendas..."):
+        return cancelamento.executar(carregadores.dados_fato_e_explorer, engine, start_date, end_date)
+
+def carregar_dados_agregados(start_date, end_date):
+    with st.spinner("Agregando vendas no servidor..."):
+        try:
+            return cancelamento.executar(carregadores.dados_agregados, engine, start_date, end_date)
+        except limites_consulta.ConsultaCancelada:
+            st.error("A consulta excedeu o tempo limite. Reduza o período selecionado.")
+            st.stop()
+
+def carregar_serie_temporal(start_date, end_date):
+    granularidade = graficos.escolher_granularidade(start_date, end_date)
+    with st.spinner("Carregando série temporal..."):
+        try:
+            return granularidade, cancelamento.executar(carregadores.serie_temporal, engine, start_date, end_date, granularidade)
+        except limites_consulta.ConsultaCancelada:
+            st.error("A consulta excedeu o tempo limite. Reduza o período selecionado.")
+            st.stop()
+
+modo_agregado = limites_consulta.usar_modo_agregado(engine, start_date, end_date)
+if not modo_agregado:
+    try:
+        df_analysis_data, df_payments = carregar_dados_fato_e_explorer(start_date, end_date)
+    except limites_consulta.ConsultaCancelada:
+        modo_agregado = True
+if modo_agregado:
+    df_diario, df_horario, _, _ = carregar_dados_agregados(start_date, end_date)
+granularidade, df_serie = carregar_serie_temporal(start_date, end_date)
+instrumentacao.etapa("carga")
+
+if modo_agregado:
+    limites_consulta.aviso_modo_agregado()
+    df_diario_filt = filtrar_lojas_e_canais(df_diario)
+    df_horario_filt = filtrar_lojas_e_canais(df_horario)
+    if df_diario.empty:
+        st.info("Nenhum dado de venda encontrado para o período selecionado.")
+    elif df_diario_filt.empty:
+        st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+
+    sem_vendas = df_diario_filt.empty
 else:
-    st.info("Nenhum dado de venda encontrado para o período selecionado.")
+    if df_analysis_data.empty:
+        st.info("Nenhum dado de venda encontrado para o período selecionado.")
 
-df_analysis_filt = df_analysis_data.copy()
-if "Todas as Lojas" not in selected_store_names:
-    df_analysis_filt = df_analysis_filt[df_analysis_filt['store_name'].isin(selected_store_names)]
-if "Todos os Canais" not in selected_channel_names:
-    df_analysis_filt = df_analysis_filt[df_analysis_filt['channel_name'].isin(selected_channel_names)]
+    # Recortes compartilhados entre as sessões com os mesmos filtros (somente leitura)
+    df_sales_filt, _, _ = carregar_recortes_vendas(start_date, end_date)
 
-if df_analysis_filt.empty and not df_analysis_data.empty:
-    st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+    if df_sales_filt.empty and not df_analysis_data.empty:
+        st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+
+    sem_vendas = df_sales_filt.empty
+
+if not sem_vendas:
+    df_por_periodo = filtrar_lojas_e_canais(df_serie).groupby('periodo')[['soma_preparo', 'n_preparo', 'soma_entrega', 'n_entrega']].sum()
+    df_time_prod = (df_por_periodo['soma_preparo'] / df_por_periodo['n_preparo']).rename('production_seconds').reset_index()
+    df_time_del = (df_por_periodo['soma_entrega'] / df_por_periodo['n_entrega']).rename('delivery_seconds').reset_index()
+instrumentacao.etapa("filtros")
 
-df_sales_filt = df_analysis_filt.drop_duplicates(subset=['sale_id'])
 st.title("Análise Operacional")
 
-if df_sales_filt.empty:
+if modo_ao_vivo:
+    import tempo_real
+
+    @st.fragment(run_every=tempo_real.INTERVALO_SEGUNDOS)
+    def painel_ao_vivo():
+        buffer = tempo_real.buffer_de_hoje(engine)
+        lojas, canais = tempo_real.filtros_para_kpis(selected_store_names, selected_channel_names)
+        kpis = buffer.kpis(lojas, canais)
+
+        st.header("Hoje (ao vivo)")
+        if buffer.ultima_atualizacao:
+            st.caption(
+                f"Última atualização: {buffer.ultima_atualizacao.strftime('%H:%M:%S')}. "
+                "Os indicadores do período abaixo não incluem os pedidos novos."
+            )
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Pedidos Hoje", f"{kpis['pedidos']}")
+        col2.metric("Tempo Médio Preparo", f"{kpis['preparo_seg']/60:,.1f} min" if kpis['preparo_seg'] else "N/A")
+        col3.metric("Tempo Médio Entrega", f"{kpis['entrega_seg']/60:,.1f} min" if kpis['entrega_seg'] else "N/A")
+
+        if not kpis['por_hora'].empty:
+            fig_hoje = px.line(
+                kpis['por_hora'], x='hora_dia', y=['tempo_preparo_min', 'tempo_entrega_min'],
+                title="Tempos Médios por Hora (Hoje)",
+                labels={'hora_dia': 'Hora do Dia', 'value': 'Minutos', 'variable': 'Tempo'}
+            )
+            instrumentacao.plotly_chart(fig_hoje, width="stretch")
+
+    painel_ao_vivo()
+    st.markdown("---")
+
+if sem_vendas:
     st.warning("Nenhum dado operacional para exibir com os filtros atuais.")
 else:
     st.header("Análise de Tempos (Preparo e Entrega)")
@@ -120,27 +134,25 @@ else:
     col1, col2 = st.columns(2)
     
     with col1:
-        st.subheader("Tempo Médio de Preparo por Dia")
-        df_time_prod = df_sales_filt.groupby('created_at_date')['production_seconds'].mean().reset_index()
+        st.subheader(f"Tempo Médio de Preparo {graficos.ROTULOS[granularidade]}")
         df_time_prod['tempo_min'] = df_time_prod['production_seconds'] / 60
         fig_prod = px.line(
-            df_time_prod, x='created_at_date', y='tempo_min',
+            df_time_prod, x='periodo', y='tempo_min',
             title="Tempo Médio de Preparo (min)",
-            labels={'created_at_date': 'Data', 'tempo_min': 'Minutos'}
+            labels={'periodo': 'Data', 'tempo_min': 'Minutos'}
         )
-        st.plotly_chart(fig_prod, width="stretch")
+        instrumentacao.plotly_chart(fig_prod, width="stretch")
 
     with col2:
-        st.subheader("Tempo Médio de Entrega por Dia")
-        df_time_del = df_sales_filt.groupby('created_at_date')['delivery_seconds'].mean().reset_index()
+        st.subheader(f"Tempo Médio de Entrega {graficos.ROTULOS[granularidade]}")
         df_time_del['tempo_min'] = df_time_del['delivery_seconds'] / 60
         fig_del = px.line(
-            df_time_del, x='created_at_date', y='tempo_min',
+            df_time_del, x='periodo', y='tempo_min',
             title="Tempo Médio de Entrega (min)",
-            labels={'created_at_date': 'Data', 'tempo_min': 'Minutos'},
+            labels={'periodo': 'Data', 'tempo_min': 'Minutos'},
             color_discrete_sequence=['red']
         )
-        st.plotly_chart(fig_del, width="stretch")
+        instrumentacao.plotly_chart(fig_del, width="stretch")
 
     st.markdown("---")
     st.header("Mapa de Calor: Gargalos Operacionais")
@@ -151,22 +163,34 @@ else:
         ["Tempo de Preparo (seg)", "Tempo de Entrega (seg)", "Nº de Pedidos"]
     )
     
-    if metric_map == "Tempo de Preparo (seg)":
-        value_col = 'production_seconds'
-        agg_func = 'mean'
-    elif metric_map == "Tempo de Entrega (seg)":
-        value_col = 'delivery_seconds'
-        agg_func = 'mean'
+    if modo_agregado:
+        df_celulas = df_horario_filt.groupby(['dia_semana_nome', 'hora_dia'])[
+            ['pedidos', 'soma_preparo', 'n_preparo', 'soma_entrega', 'n_entrega']
+        ].sum()
+        if metric_map == "Tempo de Preparo (seg)":
+            valores = df_celulas['soma_preparo'] / df_celulas['n_preparo']
+        elif metric_map == "Tempo de Entrega (seg)":
+            valores = df_celulas['soma_entrega'] / df_celulas['n_entrega']
+        else:
+            valores = df_celulas['pedidos']
+        heatmap_data = valores.unstack('hora_dia').fillna(0)
     else:
-        value_col = 'sale_id'
-        agg_func = 'nunique'
-
-    heatmap_data = df_sales_filt.pivot_table(
-        index='dia_semana_nome',
-        columns='hora_dia',
-        values=value_col,
-        aggfunc=agg_func
-    ).fillna(0)
+        if metric_map == "Tempo de Preparo (seg)":
+            value_col = 'production_seconds'
+            agg_func = 'mean'
+        elif metric_map == "Tempo de Entrega (seg)":
+            value_col = 'delivery_seconds'
+            agg_func = 'mean'
+        else:
+            value_col = 'sale_id'
+            agg_func = 'nunique'
+
+        heatmap_data = df_sales_filt.pivot_table(
+            index='dia_semana_nome',
+            columns='hora_dia',
+            values=value_col,
+            aggfunc=agg_func
+        ).fillna(0)
     
     if not heatmap_data.empty:
         heatmap_data = heatmap_data.reindex(index=['1. Seg', '2. Ter', '3. Qua', '4. Qui', '5. Sex', '6. Sab', '7. Dom'])
@@ -176,6 +200,8 @@ else:
             labels={'x': 'Hora do Dia', 'y': 'Dia da Semana', 'color': 'Valor'},
             aspect="auto" 
         )
-        st.plotly_chart(fig_heatmap, width="stretch")
+        instrumentacao.plotly_chart(fig_heatmap, width="stretch")
     else:
-        st.info("Nenhum dado para o Mapa de Calor.")
\ No newline at end of file
+        st.info("Nenhum dado para o Mapa de Calor.")
+
+instrumentacao.etapa("calculos e graficos")
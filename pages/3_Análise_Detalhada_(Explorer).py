@@ -1,11 +1,8 @@
 import streamlit as st
-import pandas as pd
-import sqlalchemy
-import plotly.express as px
-from datetime import datetime, timedelta
-import queries  
+import filtros_globais
+import instrumentacao
 
-@st.cache_data
+@st.cache_data(max_entries=8)
 def convert_df_to_csv(df):
     """
     Função em cache para converter o DataFrame para CSV em memória,
@@ -14,130 +11,128 @@ def convert_df_to_csv(df):
     """
     return df.to_csv(index=True, encoding='utf-8-sig').encode('utf-8-sig')
 
-@st.cache_resource
-def get_engine():
-    try:
-        conn_string = st.secrets["connections"]["neon_db"]
-        engine = sqlalchemy.create_engine(conn_string)
-        return engine
-    except Exception as e:
-        st.error(f"Erro ao conectar ao banco de dados: {e}")
-        st.stop()
-
-engine = get_engine()
-
-@st.cache_data(ttl=3600)
-def carregar_limites_de_data():
-    with engine.connect() as conn:
-        result = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone()
-    if result and result.min_date and result.max_date:
-        return result.min_date, result.max_date
-    fallback_start = datetime.now().date() - timedelta(days=30)
-    fallback_end = datetime.now().date()
-    return (fallback_start, fallback_end)
-
-@st.cache_data(ttl=600, show_spinner="Carregando dimensões...")
-def carregar_tabelas_dimensao():
-    with engine.connect() as conn:
-        df_stores = pd.read_sql(queries.SELECT_STORES, conn)
-        df_channels = pd.read_sql(queries.SELECT_CHANNELS, conn)
-        df_payment_types = pd.read_sql(queries.SELECT_PAYMENT_TYPES, conn)
-    return df_stores, df_channels, df_payment_types
-
-@st.cache_data(ttl=600, show_spinner="Carregando dados de vendas...")
-def carregar_dados_fato_e_explorer(start_date, end_date):
-    end_date_sql = end_date + timedelta(days=1)
-    
-    query_params = {"start": start_date, "end": end_date_sql}
-    
-    with engine.connect() as conn:
-        
-        df_analysis_data = pd.read_sql(queries.SELECT_ANALYSIS_DATA, conn, params=query_params)
+instrumentacao.iniciar_pagina("Explorer")
 
-        if df_analysis_data.empty:
-            return pd.DataFrame(), pd.DataFrame()
+engine = filtros_globais.get_engine()
+filtros = filtros_globais.barra_lateral()
+start_date, end_date = filtros.start_date, filtros.end_date
+selected_store_names, selected_channel_names = filtros.lojas, filtros.canais
 
-        sales_ids_list = df_analysis_data['sale_id'].unique().tolist()
-        sales_ids = tuple(sales_ids_list) 
-        if not sales_ids:
-            return df_analysis_data, pd.DataFrame()
+instrumentacao.etapa("bootstrap")
 
-        
-        sql_payments_query = f"SELECT sale_id, payment_type_id, value FROM payments WHERE sale_id IN {sales_ids}"
-        
-        
-        df_payments = pd.read_sql(sql_payments_query, conn)
+# Só depois da barra lateral desenhada: pandas, plotly e os carregadores
+# levam quase um segundo para importar numa partida fria.
+import pandas as pd
+import plotly.express as px
+import cancelamento
+import carregadores
+import limites_consulta
 
-    return df_analysis_data, df_payments
+filtros_globais.iniciar_pre_aquecimento(engine)
 
-@st.cache_data(ttl=600, show_spinner="Analisando comportamento dos clientes...")
-def carregar_dados_rfm(data_referencia):
-    
-    query_params = {"data_ref": data_referencia}
-    
-    with engine.connect() as conn:
-        
-        df = pd.read_sql(queries.SELECT_RFM, conn, params=query_params)
-    return df
-
-min_date, max_date = carregar_limites_de_data()
-df_stores, df_channels, df_payment_types = carregar_tabelas_dimensao()
-
-st.sidebar.header("Filtros Globais")
-st.sidebar.write("Estes filtros afetam **todas** as páginas.")
-
-default_start = max(min_date, max_date - timedelta(days=30))
-default_end = max_date
-
-date_range = st.sidebar.date_input(
-    "Selecione o Período",
-    (default_start, default_end),
-    min_value=min_date,
-    max_value=max_date,
-    format="DD/MM/YYYY"
-)
-if len(date_range) != 2:
-    st.sidebar.error("Por favor, selecione um período de início e fim.")
+def carregar_recortes_vendas(start_date, end_date):
+    with st.spinner("Aplicando os filtros..."):
+        return cancelamento.executar(carregadores.recortes_vendas, engine, start_date, end_date, *filtros.nomes())
+
+def carregar_hierarquia_produtos(start_date, end_date):
+    with st.spinner("Agregando categorias e produtos..."):
+        return cancelamento.executar(carregadores.hierarquia_produtos, engine, start_date, end_date, *filtros.nomes())
+
+def carregar_dados_fato_e_explorer(start_date, end_date):
+    with st.spinner("Carregando dados de vendas..."):
+        return cancelamento.executar(carregadores.dados_fato_e_explorer, engine, start_date, end_date)
+
+if limites_consulta.usar_modo_agregado(engine, start_date, end_date):
+    st.title("Análise Detalhada (Explorer)")
+    st.warning("O período selecionado tem vendas demais para a análise detalhada. Reduza o período para usar o Explorer.")
     st.stop()
-start_date, end_date = date_range
-
-store_options = ["Todas as Lojas"] + df_stores['store_name'].tolist()
-selected_store_names = st.sidebar.multiselect(
-    "Selecione as Lojas",
-    options=store_options,
-    default=["Todas as Lojas"]
-)
-
-channel_options = ["Todos os Canais"] + df_channels['channel_name'].tolist()
-selected_channel_names = st.sidebar.multiselect(
-    "Selecione os Canais",
-    options=channel_options,
-    default=["Todos os Canais"]
-)
-
-df_analysis_data, df_payments = carregar_dados_fato_e_explorer(start_date, end_date)
-
-if not df_analysis_data.empty:
-    df_analysis_data['created_at_date'] = pd.to_datetime(df_analysis_data['created_at']).dt.date
-else:
+try:
+    df_analysis_data, df_payments = carregar_dados_fato_e_explorer(start_date, end_date)
+except limites_consulta.ConsultaCancelada:
+    st.title("Análise Detalhada (Explorer)")
+    st.error("A consulta excedeu o tempo limite. Reduza o período selecionado.")
+    st.stop()
+instrumentacao.etapa("carga")
+
+if df_analysis_data.empty:
     st.info("Nenhum dado de venda encontrado para o período selecionado.")
 
-df_analysis_filt = df_analysis_data.copy()
-if "Todas as Lojas" not in selected_store_names:
-    df_analysis_filt = df_analysis_filt[df_analysis_filt['store_name'].isin(selected_store_names)]
-if "Todos os Canais" not in selected_channel_names:
-    df_analysis_filt = df_analysis_filt[df_analysis_filt['channel_name'].isin(selected_channel_names)]
+# Recortes compartilhados entre as sessões com os mesmos filtros (somente leitura)
+df_sales_filt, df_explorer, _ = carregar_recortes_vendas(start_date, end_date)
 
-if df_analysis_filt.empty and not df_analysis_data.empty:
+if df_sales_filt.empty and not df_analysis_data.empty:
     st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
 
-df_sales_filt = df_analysis_filt.drop_duplicates(subset=['sale_id'])
-df_explorer = df_analysis_filt.dropna(subset=['product_id'])
+instrumentacao.etapa("filtros")
 
 st.title("Análise Detalhada (Explorer)")
 
+modo_explorer = st.radio("Modo", ["Análise livre", "Categorias → Produtos"], horizontal=True, key="modo_explorer")
+
 if df_explorer.empty:
     st.warning("Nenhum dado de produto para analisar com os filtros atuais.")
+elif modo_explorer == "Categorias → Produtos":
+    st.header("Das Categorias aos Produtos")
+    st.write("Abra uma ou mais categorias para ver os produtos de cada uma.")
+
+    # Totais por categoria e por produto calculados uma vez por filtro; abrir e
+    # fechar categorias só fatia df_produtos, sem reagrupar as vendas
+    df_categorias, df_produtos = carregar_hierarquia_produtos(start_date, end_date)
+
+    metrica_hierarquia_map = {
+        "Faturamento Total": "faturamento",
+        "Quantidade Vendida": "quantidade",
+        "Nº de Pedidos (únicos)": "pedidos"
+    }
+    metrica_selec = st.selectbox("Calcular Métrica (Valor)", options=list(metrica_hierarquia_map.keys()), key="metrica_hierarquia")
+    val_col = metrica_hierarquia_map[metrica_selec]
+
+    df_categorias_ord = df_categorias.sort_values(by=val_col, ascending=False)
+    fig = px.bar(
+        df_categorias_ord,
+        x='category_name',
+        y=val_col,
+        title=f"{metrica_selec} por Categoria",
+        labels={'category_name': 'Categoria', val_col: metrica_selec}
+    )
+    instrumentacao.plotly_chart(fig, width="stretch")
+
+    # Categorias que deixaram de existir com outro filtro são fechadas
+    opcoes_categorias = df_categorias_ord['category_name'].tolist()
+    if "categorias_abertas" in st.session_state:
+        st.session_state["categorias_abertas"] = [
+            categoria for categoria in st.session_state["categorias_abertas"] if categoria in opcoes_categorias
+        ]
+    categorias_abertas = st.multiselect(
+        "Categorias abertas",
+        options=opcoes_categorias,
+        key="categorias_abertas",
+        help="Os pedidos de uma categoria contam cada venda uma vez, mesmo com vários produtos dela."
+    )
+
+    limites = df_categorias.set_index('category_name')[['inicio', 'fim']]
+    for categoria in categorias_abertas:
+        inicio, fim = limites.loc[categoria]
+        df_itens = df_produtos.iloc[inicio:fim].sort_values(by=val_col, ascending=False)
+
+        st.subheader(f"{categoria} ({fim - inicio} produtos)")
+        fig = px.bar(
+            df_itens.head(20).sort_values(by=val_col, ascending=True),
+            x=val_col, y='product_name', orientation='h',
+            title=f"Top 20 Produtos de {categoria} por {metrica_selec}",
+            labels={'product_name': 'Produto', val_col: metrica_selec}
+        )
+        instrumentacao.plotly_chart(fig, width="stretch")
+        st.dataframe(df_itens[['product_name', 'faturamento', 'quantidade', 'pedidos']], hide_index=True)
+
+    st.markdown("---")
+    st.download_button(
+        label="Gerar Relatório (Download CSV)",
+        data=convert_df_to_csv(df_produtos.set_index(['category_name', 'product_name'])),
+        file_name="relatorio_explorer_categorias_produtos.csv",
+        mime='text/csv',
+        width='stretch'
+    )
 else:
     st.header("Construa sua própria análise")
     st.write("Use esta página para análisar seus tickets médios ou para ver como estão as vendas dos produtos")
@@ -267,7 +262,7 @@ else:
                 labels={'value': metrica_selec, 'index': dimensao_selec}
             )
         
-        st.plotly_chart(fig, width="stretch")
+        instrumentacao.plotly_chart(fig, width="stretch")
 
         st.subheader("Tabela de Dados (Completa e Ordenada)")
         st.dataframe(analysis_df)
@@ -286,4 +281,6 @@ else:
             )
 
     except Exception as e:
-        st.error(f"Não foi possível gerar a análise. Verifique suas seleções. Erro: {e}")
\ No newline at end of file
+        st.error(f"Não foi possível gerar a análise. Verifique suas seleções. Erro: {e}")
+
+instrumentacao.etapa("calculos e graficos")
@@ -1,131 +1,93 @@
 import streamlit as st
-import pandas as pd
-import sqlalchemy
-import plotly.express as px
-from datetime import datetime, timedelta
-import queries  
-
-@st.cache_resource
-def get_engine():
-    try:
-        conn_string = st.secrets["connections"]["neon_db"]
-        engine = sqlalchemy.create_engine(conn_string)
-        return engine
-    except Exception as e:
-        st.error(f"Erro ao conectar ao banco de dados: {e}")
-        st.stop()
-
-engine = get_engine()
-
-
-@st.cache_data(ttl=3600)
-def carregar_limites_de_data():
-    with engine.connect() as conn:
-        result = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone()
-    if result and result.min_date and result.max_date:
-        return result.min_date, result.max_date
-    fallback_start = datetime.now().date() - timedelta(days=30)
-    fallback_end = datetime.now().date()
-    return (fallback_start, fallback_end)
-
-@st.cache_data(ttl=600, show_spinner="Carregando dimensões...")
-def carregar_tabelas_dimensao():
-    with engine.connect() as conn:
-        df_stores = pd.read_sql(queries.SELECT_STORES, conn)
-        df_channels = pd.read_sql(queries.SELECT_CHANNELS, conn)
-        df_payment_types = pd.read_sql(queries.SELECT_PAYMENT_TYPES, conn)
-    return df_stores, df_channels, df_payment_types
-
-@st.cache_data(ttl=600, show_spinner="Carregando dados de vendas...")
-def carregar_dados_fato_e_explorer(start_date, end_date):
-    end_date_sql = end_date + timedelta(days=1)
-    
-    query_params = {"start": start_date, "end": end_date_sql}
-    
-    with engine.connect() as conn:
-        
-        df_analysis_data = pd.read_sql(queries.SELECT_ANALYSIS_DATA, conn, params=query_params)
+import filtros_globais
+import instrumentacao
 
-        if df_analysis_data.empty:
-            return pd.DataFrame(), pd.DataFrame()
+instrumentacao.iniciar_pagina("Descontos")
 
-        sales_ids_list = df_analysis_data['sale_id'].unique().tolist()
-        sales_ids = tuple(sales_ids_list) 
-        if not sales_ids:
-            return df_analysis_data, pd.DataFrame()
-
-        
-        sql_payments_query = f"SELECT sale_id, payment_type_id, value FROM payments WHERE sale_id IN {sales_ids}"
-        
-        
-        df_payments = pd.read_sql(sql_payments_query, conn)
-
-    return df_analysis_data, df_payments
-
-@st.cache_data(ttl=600, show_spinner="Analisando comportamento dos clientes...")
-def carregar_dados_rfm(data_referencia):
-    
-    query_params = {"data_ref": data_referencia}
-    
-    with engine.connect() as conn:
-        
-        df = pd.read_sql(queries.SELECT_RFM, conn, params=query_params)
-    return df
-
-min_date, max_date = carregar_limites_de_data()
-df_stores, df_channels, df_payment_types = carregar_tabelas_dimensao()
-
-st.sidebar.header("Filtros Globais")
-st.sidebar.write("Estes filtros afetam **todas** as páginas.")
-
-default_start = max(min_date, max_date - timedelta(days=30))
-default_end = max_date
-
-date_range = st.sidebar.date_input(
-    "Selecione o Período",
-    (default_start, default_end),
-    min_value=min_date,
-    max_value=max_date,
-    format="DD/MM/YYYY"
-)
-if len(date_range) != 2:
-    st.sidebar.error("Por favor, selecione um período de início e fim.")
-    st.stop()
-start_date, end_date = date_range
-
-store_options = ["Todas as Lojas"] + df_stores['store_name'].tolist()
-selected_store_names = st.sidebar.multiselect(
-    "Selecione as Lojas",
-    options=store_options,
-    default=["Todas as Lojas"]
-)
-
-channel_options = ["Todos os Canais"] + df_channels['channel_name'].tolist()
-selected_channel_names = st.sidebar.multiselect(
-    "Selecione os Canais",
-    options=channel_options,
-    default=["Todos os Canais"]
-)
-
-df_analysis_data, df_payments = carregar_dados_fato_e_explorer(start_date, end_date)
-
-if not df_analysis_data.empty:
-    df_analysis_data['created_at_date'] = pd.to_datetime(df_analysis_data['created_at']).dt.date
-else:
-    st.info("Nenhum dado de venda encontrado para o período selecionado.")
+engine = filtros_globais.get_engine()
+filtros = filtros_globais.barra_lateral(comparar=True)
+start_date, end_date = filtros.start_date, filtros.end_date
+selected_store_names, selected_channel_names = filtros.lojas, filtros.canais
+filtrar_lojas_e_canais = filtros.filtrar
 
-df_analysis_filt = df_analysis_data.copy()
-if "Todas as Lojas" not in selected_store_names:
-    df_analysis_filt = df_analysis_filt[df_analysis_filt['store_name'].isin(selected_store_names)]
-if "Todos os Canais" not in selected_channel_names:
-    df_analysis_filt = df_analysis_filt[df_analysis_filt['channel_name'].isin(selected_channel_names)]
+instrumentacao.etapa("bootstrap")
 
-if df_analysis_filt.empty and not df_analysis_data.empty:
-    st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+# Só depois da barra lateral desenhada: pandas, plotly e os carregadores
+# levam quase um segundo para importar numa partida fria.
+import plotly.express as px
+import cancelamento
+import carregadores
+import indicadores
+import limites_consulta
 
-df_sales_filt = df_analysis_filt.drop_duplicates(subset=['sale_id'])
+filtros_globais.iniciar_pre_aquecimento(engine)
 
+def carregar_recortes_vendas(start_date, end_date):
+    with st.spinner("Aplicando os filtros..."):
+        return cancelamento.executar(carregadores.recortes_vendas, engine, start_date, end_date, *filtros.nomes())
 
+def carregar_dados_fato_e_explorer(start_date, end_date):
+    with st.spinner("Carregando dados de vendas..."):
+        return cancelamento.executar(carregadores.dados_fato_e_explorer, engine, start_date, end_date)
+
+def carregar_dados_agregados(start_date, end_date):
+    with st.spinner("Agregando vendas no servidor..."):
+        try:
+            return cancelamento.executar(carregadores.dados_agregados, engine, start_date, end_date)
+        except limites_consulta.ConsultaCancelada:
+            st.error("A consulta excedeu o tempo limite. Reduza o período selecionado.")
+            st.stop()
+
+def carregar_agregado_diario(start_date, end_date):
+    with st.spinner("Carregando o período de comparação..."):
+        try:
+            return cancelamento.executar(carregadores.agregado_diario, engine, start_date, end_date)
+        except limites_consulta.ConsultaCancelada:
+            return None
+
+modo_agregado = limites_consulta.usar_modo_agregado(engine, start_date, end_date)
+if not modo_agregado:
+    try:
+        df_analysis_data, df_payments = carregar_dados_fato_e_explorer(start_date, end_date)
+    except limites_consulta.ConsultaCancelada:
+        modo_agregado = True
+if modo_agregado:
+    df_diario, _, _, _ = carregar_dados_agregados(start_date, end_date)
+instrumentacao.etapa("carga")
+
+if modo_agregado:
+    # O agregado diário tem as mesmas colunas financeiras, já somadas por dia, loja e canal
+    limites_consulta.aviso_modo_agregado()
+    df_sales_filt = filtrar_lojas_e_canais(df_diario)
+    if df_diario.empty:
+        st.info("Nenhum dado de venda encontrado para o período selecionado.")
+    elif df_sales_filt.empty:
+        st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+    contagem_pedidos = ('pedidos', 'sum')
+else:
+    if df_analysis_data.empty:
+        st.info("Nenhum dado de venda encontrado para o período selecionado.")
+
+    # Recortes compartilhados entre as sessões com os mesmos filtros (somente leitura)
+    df_sales_filt, _, _ = carregar_recortes_vendas(start_date, end_date)
+
+    if df_sales_filt.empty and not df_analysis_data.empty:
+        st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+    contagem_pedidos = ('sale_id', 'nunique')
+
+# Os dois lados da comparação saem do agregado diário (cache separado das vendas)
+deltas = {}
+if filtros.comparacao and not df_sales_filt.empty:
+    inicio_comparacao, fim_comparacao = indicadores.periodo_de_comparacao(start_date, end_date, filtros.comparacao)
+    df_diario_atual = carregar_agregado_diario(start_date, end_date)
+    df_diario_comparacao = carregar_agregado_diario(inicio_comparacao, fim_comparacao)
+    if df_diario_atual is not None and df_diario_comparacao is not None:
+        deltas = indicadores.variacoes(
+            indicadores.resumo_financeiro(filtrar_lojas_e_canais(df_diario_atual)),
+            indicadores.resumo_financeiro(filtrar_lojas_e_canais(df_diario_comparacao))
+        )
+
+instrumentacao.etapa("filtros")
 
 st.title("Análise de Descontos e Taxas")
 st.write("Entenda para onde está indo seu faturamento e quais canais custam mais caro.")
@@ -133,42 +95,38 @@ st.write("Entenda para onde está indo seu faturamento e quais canais custam mai
 if df_sales_filt.empty:
     st.warning("Nenhum dado de venda para exibir com os filtros atuais.")
 else:
-    
-    total_bruto = df_sales_filt['total_amount_items'].sum()
-    total_descontos = df_sales_filt['total_discount'].sum()
-    total_taxas_delivery = df_sales_filt['delivery_fee'].sum()
-    total_taxas_servico = df_sales_filt['service_tax_fee'].sum()
-    total_taxas = total_taxas_delivery + total_taxas_servico
-    total_liquido = total_bruto - total_descontos - total_taxas
-
-    
-    perc_desconto = (total_descontos / total_bruto * 100) if total_bruto > 0 else 0
-    perc_taxa = (total_taxas / total_bruto * 100) if total_bruto > 0 else 0
+    resumo = indicadores.resumo_financeiro(df_sales_filt)
+    total_bruto = resumo['total_bruto']
+    total_descontos = resumo['total_descontos']
+    total_taxas = resumo['total_taxas']
+    total_liquido = resumo['total_liquido']
+    perc_desconto = resumo['perc_desconto']
+    perc_taxa = resumo['perc_taxa']
 
     st.header("Visão Geral Financeira (Líquida)")
+    if deltas:
+        st.caption(f"Variação em relação a {inicio_comparacao:%d/%m/%Y} – {fim_comparacao:%d/%m/%Y}.")
+    elif filtros.comparacao:
+        st.caption("A comparação excedeu o tempo limite do banco.")
+    delta = {chave: indicadores.formatar_variacao(variacao) for chave, variacao in deltas.items()}
     
+    # Descontos e taxas maiores reduzem o líquido: alta em vermelho
     col1, col2, col3 = st.columns(3)
-    col1.metric("Faturamento Bruto (Itens)", f"R$ {total_bruto:,.2f}")
-    col2.metric("Total de Descontos", f"R$ {total_descontos:,.2f}", 
-                help=f"{perc_desconto:.1f}% do Bruto")
-    col3.metric("Total de Taxas (Serviço/Entrega)", f"R$ {total_taxas:,.2f}",
-                help=f"{perc_taxa:.1f}% do Bruto")
+    col1.metric("Faturamento Bruto (Itens)", f"R$ {total_bruto:,.2f}", delta.get('total_bruto'))
+    col2.metric("Total de Descontos", f"R$ {total_descontos:,.2f}", delta.get('total_descontos'),
+                delta_color="inverse", help=f"{perc_desconto:.1f}% do Bruto")
+    col3.metric("Total de Taxas (Serviço/Entrega)", f"R$ {total_taxas:,.2f}", delta.get('total_taxas'),
+                delta_color="inverse", help=f"{perc_taxa:.1f}% do Bruto")
     
-    st.subheader(f"Faturamento Líquido Estimado: R$ {total_liquido:,.2f}")
+    variacao_liquido = f" ({delta['total_liquido']})" if delta.get('total_liquido') else ""
+    st.subheader(f"Faturamento Líquido Estimado: R$ {total_liquido:,.2f}{variacao_liquido}")
     st.progress((total_liquido / total_bruto) if total_bruto > 0 else 0)
 
     st.markdown("---")
     st.header("Análise Detalhada por Canal")
     st.write("Veja quais canais mais aplicam descontos ou cobram taxas.")
 
-    
-    df_canal = df_sales_filt.groupby('channel_name').agg(
-        Faturamento_Bruto=('total_amount_items', 'sum'),
-        Descontos=('total_discount', 'sum'),
-        Taxas=('delivery_fee', 'sum'), 
-        Pedidos=('sale_id', 'nunique')
-    )
-    df_canal['Desconto_por_Pedido'] = (df_canal['Descontos'] / df_canal['Pedidos']).fillna(0)
+    df_canal = indicadores.descontos_por_canal(df_sales_filt, contagem_pedidos)
     
     
     fig_canal = px.bar(
@@ -178,9 +136,11 @@ else:
         title="Faturamento Bruto vs. Descontos e Taxas por Canal",
         labels={'value': 'Valor (R$)', 'channel_name': 'Canal'}
     )
-    st.plotly_chart(fig_canal, width="stretch")
+    instrumentacao.plotly_chart(fig_canal, width="stretch")
 
     st.subheader("Desconto Médio por Pedido (por Canal)")
     df_canal_display = df_canal[['Desconto_por_Pedido', 'Pedidos']].sort_values(by='Desconto_por_Pedido', ascending=False)
     df_canal_display['Desconto_por_Pedido'] = df_canal_display['Desconto_por_Pedido'].map('R$ {:,.2f}'.format)
-    st.dataframe(df_canal_display, use_container_width=True)
\ No newline at end of file
+    st.dataframe(df_canal_display, use_container_width=True)
+
+instrumentacao.etapa("calculos e graficos")
@@ -0,0 +1,110 @@
+import streamlit as st
+import filtros_globais
+import instrumentacao
+
+@st.cache_data(max_entries=8)
+def convert_df_to_csv(df):
+    """
+    Função em cache para converter o DataFrame para CSV em memória,
+    pronto para download.
+    """
+    return df.to_csv(index=True, encoding='utf-8-sig').encode('utf-8-sig')
+
+instrumentacao.iniciar_pagina("Coortes")
+
+engine = filtros_globais.get_engine()
+filtros = filtros_globais.barra_lateral()
+start_date, end_date = filtros.start_date, filtros.end_date
+selected_store_names, selected_channel_names = filtros.lojas, filtros.canais
+
+st.title("Análise de Coortes de Clientes")
+st.write("Acompanhe quantos clientes de cada mês de primeira compra continuam comprando nos meses seguintes.")
+st.info(
+    "A coorte de um cliente é o mês da sua **primeira compra** (considerando todo o histórico). "
+    "São exibidas as coortes iniciadas dentro do período selecionado, acompanhadas até a data final do filtro."
+)
+
+instrumentacao.etapa("bootstrap")
+
+# Só depois da barra lateral desenhada: plotly e os carregadores (e com eles
+# o pandas) levam quase um segundo para importar numa partida fria.
+import plotly.express as px
+import cancelamento
+import carregadores
+import limites_consulta
+
+filtros_globais.iniciar_pre_aquecimento(engine)
+
+def carregar_dados_coortes(start_date, end_date, lojas, canais):
+    with st.spinner("Calculando coortes de clientes..."):
+        return cancelamento.executar(carregadores.dados_coortes, engine, start_date, end_date, lojas, canais)
+
+lojas, canais = filtros.ids()
+try:
+    df_coortes = carregar_dados_coortes(start_date, end_date, lojas, canais)
+except limites_consulta.ConsultaCancelada:
+    st.error("A análise de coortes excedeu o tempo limite do banco. Reduza o período ou tente novamente em alguns minutos.")
+    st.stop()
+instrumentacao.etapa("carga")
+
+if lojas == () or canais == ():
+    st.warning("Nenhum dado encontrado para os filtros globais aplicados.")
+elif df_coortes.empty:
+    st.warning("Nenhum cliente novo encontrado no período selecionado.")
+else:
+    if df_coortes['coorte'].nunique() < 3:
+        st.caption("Dica: selecione um período de alguns meses para comparar a retenção entre coortes.")
+
+    df_coortes['retencao'] = df_coortes['clientes'] / df_coortes['tamanho_coorte'] * 100
+    df_coortes['receita_por_cliente'] = (
+        df_coortes.groupby('coorte')['receita'].cumsum() / df_coortes['tamanho_coorte']
+    )
+
+    metricas = {
+        "Retenção de clientes (%)": ('retencao', '.1f'),
+        "Clientes ativos": ('clientes', 'd'),
+        "Receita (R$)": ('receita', ',.0f'),
+        "Receita acumulada por cliente (R$)": ('receita_por_cliente', ',.2f'),
+    }
+    metrica = st.radio("Métrica", list(metricas), horizontal=True)
+    coluna, formato = metricas[metrica]
+
+    tamanhos = df_coortes.groupby('coorte')['tamanho_coorte'].first()
+    matriz = df_coortes.pivot(index='coorte', columns='idade', values=coluna)
+    matriz.index = [f"{coorte} ({tamanhos[coorte]:,} clientes)" for coorte in matriz.index]
+    matriz.columns = [f"Mês {idade}" for idade in matriz.columns]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Coortes", len(tamanhos))
+    col2.metric("Clientes Novos", f"{tamanhos.sum():,}")
+    retencao_mes_1 = df_coortes[df_coortes['idade'] == 1]
+    if not retencao_mes_1.empty:
+        col3.metric(
+            "Retenção no Mês 1 (média ponderada)",
+            f"{retencao_mes_1['clientes'].sum() / retencao_mes_1['tamanho_coorte'].sum() * 100:.1f}%"
+        )
+
+    fig = px.imshow(
+        matriz,
+        text_auto=formato,
+        aspect="auto",
+        color_continuous_scale="Blues",
+        labels={'x': 'Meses desde a primeira compra', 'y': 'Coorte (mês da primeira compra)', 'color': metrica},
+        title=f"{metrica} por Coorte"
+    )
+    fig.update_xaxes(side="top")
+    instrumentacao.plotly_chart(fig, width="stretch")
+
+    st.subheader("Tabela da Coorte")
+    st.dataframe(matriz, width="stretch")
+
+    csv_data = convert_df_to_csv(matriz)
+    st.download_button(
+        label="Baixar Tabela (CSV)",
+        data=csv_data,
+        file_name=f"coortes_{coluna}_{start_date}_{end_date}.csv",
+        mime='text/csv',
+        width="stretch"
+    )
+
+instrumentacao.etapa("calculos e graficos")
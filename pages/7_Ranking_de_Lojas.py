@@ -0,0 +1,112 @@
+import streamlit as st
+import filtros_globais
+import instrumentacao
+
+@st.cache_data(max_entries=8)
+def convert_df_to_csv(df):
+    """
+    Função em cache para converter o DataFrame para CSV em memória,
+    pronto para download.
+    """
+    return df.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')
+
+instrumentacao.iniciar_pagina("Ranking de Lojas")
+
+engine = filtros_globais.get_engine()
+filtros = filtros_globais.barra_lateral()
+start_date, end_date = filtros.start_date, filtros.end_date
+selected_store_names, selected_channel_names = filtros.lojas, filtros.canais
+
+st.title("Ranking de Lojas")
+st.write("Compare todas as lojas lado a lado, sem selecioná-las uma a uma na barra lateral.")
+
+instrumentacao.etapa("bootstrap")
+
+# Só depois da barra lateral desenhada: os carregadores (e com eles o pandas)
+# levam quase um segundo para importar numa partida fria.
+import cancelamento
+import carregadores
+import contagem_distinta
+import limites_consulta
+
+filtros_globais.iniciar_pre_aquecimento(engine)
+
+def carregar_ranking_lojas(start_date, end_date, canais):
+    with st.spinner("Calculando os indicadores de todas as lojas..."):
+        return cancelamento.executar(carregadores.ranking_lojas, engine, start_date, end_date, canais)
+
+# O filtro de lojas não restringe o ranking, só marca as lojas escolhidas
+lojas, canais = filtros.nomes()
+try:
+    df_ranking = carregar_ranking_lojas(start_date, end_date, canais)
+except limites_consulta.ConsultaCancelada:
+    st.error("O ranking excedeu o tempo limite do banco. Reduza o período ou tente novamente em alguns minutos.")
+    st.stop()
+instrumentacao.etapa("carga")
+
+if df_ranking.empty:
+    st.warning("Nenhum dado de venda encontrado para o período e os canais selecionados.")
+else:
+    # Rótulo -> (coluna, crescente): tempos, descontos e taxas menores ficam no topo
+    ordens = {
+        "Faturamento": ('faturamento', False),
+        "Pedidos": ('pedidos', False),
+        "Ticket Médio": ('ticket_medio', False),
+        "Clientes Únicos": ('clientes_unicos', False),
+        "Tempo Médio Preparo": ('preparo_min', True),
+        "Tempo Médio Entrega": ('entrega_min', True),
+        "% de Desconto": ('perc_desconto', True),
+        "% de Taxas": ('perc_taxa', True),
+    }
+    ordem = st.selectbox("Ordenar por", list(ordens))
+    coluna, crescente = ordens[ordem]
+
+    df_ranking = df_ranking.assign(
+        preparo_min=df_ranking['preparo_seg'] / 60,
+        entrega_min=df_ranking['entrega_seg'] / 60,
+    ).sort_values(coluna, ascending=crescente, na_position='last')
+    df_ranking.insert(0, 'posicao', range(1, len(df_ranking) + 1))
+    colunas = ['posicao', 'store_name'] + [coluna for coluna, _ in ordens.values()]
+    if lojas is not None:
+        df_ranking['selecionada'] = df_ranking['store_name'].isin(lojas)
+        colunas.append('selecionada')
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Lojas com Vendas", len(df_ranking))
+    col2.metric("Faturamento Total", f"R$ {df_ranking['faturamento'].sum():,.2f}")
+    col3.metric(f"1º em {ordem}", df_ranking['store_name'].iloc[0])
+
+    st.dataframe(
+        df_ranking[colunas],
+        hide_index=True,
+        width="stretch",
+        height=min(35 * (len(df_ranking) + 1) + 3, 700),
+        column_config={
+            'posicao': st.column_config.NumberColumn("Posição"),
+            'store_name': st.column_config.TextColumn("Loja"),
+            'faturamento': st.column_config.NumberColumn("Faturamento", format="R$ %.2f"),
+            'pedidos': st.column_config.NumberColumn("Pedidos"),
+            'ticket_medio': st.column_config.NumberColumn("Ticket Médio", format="R$ %.2f"),
+            'clientes_unicos': st.column_config.NumberColumn(
+                "Clientes Únicos (≈)",
+                help=f"Estimativa (HyperLogLog), erro padrão de cerca de {contagem_distinta.ERRO_PADRAO:.1%}."
+            ),
+            'preparo_min': st.column_config.NumberColumn("Preparo (min)", format="%.1f"),
+            'entrega_min': st.column_config.NumberColumn("Entrega (min)", format="%.1f"),
+            'perc_desconto': st.column_config.NumberColumn("% Desconto", format="%.1f%%"),
+            'perc_taxa': st.column_config.NumberColumn("% Taxas", format="%.1f%%"),
+            'selecionada': st.column_config.CheckboxColumn("No Filtro"),
+        }
+    )
+    st.caption("Clique no título de uma coluna para reordenar a tabela.")
+
+    csv_data = convert_df_to_csv(df_ranking[colunas])
+    st.download_button(
+        label="Baixar Ranking (CSV)",
+        data=csv_data,
+        file_name=f"ranking_lojas_{start_date}_{end_date}.csv",
+        mime='text/csv',
+        width="stretch"
+    )
+
+instrumentacao.etapa("calculos e graficos")
@@ -0,0 +1,163 @@
+-- Particionamento mensal da tabela sales por created_at.
+--
+-- Todas as consultas do dashboard filtram as vendas por período. Com uma
+-- partição por mês, o Postgres lê só os meses do período pedido (partition
+-- pruning) em vez de percorrer anos de histórico. product_sales e payments
+-- não têm created_at e continuam como tabelas comuns, acessadas pelo índice
+-- em sale_id (criado aqui se ainda não existir). Com o random_page_cost
+-- padrão (4, pensado para disco magnético) o planejador pode preferir ler
+-- product_sales inteira a usar esse índice; a migração não muda custos do
+-- planejador. Em SSD, ajuste só o papel do dashboard, para não afetar o PDV:
+--     ALTER ROLE papel_do_dashboard SET random_page_cost = 1.1;
+--
+-- Como aplicar, uma única vez (tudo roda em uma transação):
+--     psql -d banco_avaliacao -f particionamento.sql
+--     psql -d banco_avaliacao -f logic.sql      -- recria a view sobre a nova sales
+--
+-- A chave primária passa a ser (id, created_at), exigência do Postgres para
+-- tabelas particionadas, e as chaves estrangeiras que apontavam para sales(id)
+-- são removidas pelo mesmo motivo. A tabela original fica como
+-- sales_nao_particionada para conferência; depois remova-a com
+--     DROP TABLE sales_nao_particionada;
+--
+-- Partições futuras: a migração já cria os próximos 3 meses. Agende
+--     SELECT criar_particoes_futuras_sales(3);
+-- uma vez por mês (pg_cron ou cron + psql). Vendas de um mês sem partição
+-- caem em sales_padrao e são movidas para a partição do mês quando ela é criada.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION criar_particao_sales(mes date)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    inicio date := date_trunc('month', mes)::date;
+    fim date := (date_trunc('month', mes) + interval '1 month')::date;
+    nome text := 'sales_' || to_char(mes, 'YYYY_MM');
+BEGIN
+    IF to_regclass(nome) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE sales INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nome);
+    IF to_regclass('sales_padrao') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH movidas AS (DELETE FROM sales_padrao WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM movidas',
+            inicio, fim, nome
+        );
+    END IF;
+    EXECUTE format('ALTER TABLE sales ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', nome, inicio, fim);
+    RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION criar_particoes_sales(inicio date, fim date)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    mes date := date_trunc('month', inicio)::date;
+    criadas integer := 0;
+BEGIN
+    WHILE mes <= fim LOOP
+        IF criar_particao_sales(mes) THEN
+            criadas := criadas + 1;
+        END IF;
+        mes := (mes + interval '1 month')::date;
+    END LOOP;
+    RETURN criadas;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION criar_particoes_futuras_sales(meses integer DEFAULT 3)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    SELECT criar_particoes_sales(current_date, (current_date + make_interval(months => meses))::date);
+$$;
+
+DO $$
+DECLARE
+    r record;
+    limites record;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'sales'::regclass) = 'p' THEN
+        RAISE NOTICE 'sales já é particionada; nada a migrar.';
+        RETURN;
+    END IF;
+
+    DROP VIEW IF EXISTS v_analysis_explorer;
+
+    FOR r IN
+        SELECT conrelid::regclass AS tabela, conname
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = 'sales'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', r.tabela, r.conname);
+    END LOOP;
+
+    ALTER TABLE sales RENAME TO sales_nao_particionada;
+    FOR r IN
+        SELECT c.relname AS indice
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'sales_nao_particionada'::regclass
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', r.indice, left(r.indice, 45) || '_nao_particionada');
+    END LOOP;
+
+    CREATE TABLE sales (
+        LIKE sales_nao_particionada INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY
+    ) PARTITION BY RANGE (created_at);
+    ALTER TABLE sales ADD PRIMARY KEY (id, created_at);
+    CREATE INDEX ON sales (created_at);
+    CREATE INDEX ON sales (customer_id);
+    FOR r IN
+        SELECT conname, pg_get_constraintdef(oid) AS definicao
+        FROM pg_constraint
+        WHERE contype = 'f' AND conrelid = 'sales_nao_particionada'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE sales ADD CONSTRAINT %I %s', r.conname, r.definicao);
+    END LOOP;
+
+    SELECT min(created_at)::date AS inicio, max(created_at)::date AS fim
+    INTO limites
+    FROM sales_nao_particionada;
+    PERFORM criar_particoes_sales(
+        coalesce(limites.inicio, current_date), greatest(limites.fim, current_date)
+    );
+    PERFORM criar_particoes_futuras_sales(3);
+    CREATE TABLE sales_padrao PARTITION OF sales DEFAULT;
+
+    INSERT INTO sales OVERRIDING SYSTEM VALUE SELECT * FROM sales_nao_particionada;
+
+    -- id serial: a sequência passa para a nova tabela; identity: a nova tabela
+    -- ganhou uma sequência própria, que continua de onde a antiga parou.
+    IF (SELECT attidentity FROM pg_attribute
+        WHERE attrelid = 'sales_nao_particionada'::regclass AND attname = 'id') <> '' THEN
+        PERFORM setval(pg_get_serial_sequence('sales', 'id'), coalesce(max(id), 0) + 1, false)
+        FROM sales_nao_particionada;
+    ELSIF pg_get_serial_sequence('sales_nao_particionada', 'id') IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY sales.id', pg_get_serial_sequence('sales_nao_particionada', 'id'));
+    END IF;
+
+    FOR r IN SELECT unnest(ARRAY['product_sales', 'payments']) AS tabela LOOP
+        IF NOT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = r.tabela::regclass AND a.attname = 'sale_id'
+        ) THEN
+            EXECUTE format('CREATE INDEX ON %I (sale_id)', r.tabela);
+        END IF;
+    END LOOP;
+END;
+$$;
+
+COMMIT;
+
+ANALYZE sales;
+ANALYZE product_sales;
+ANALYZE payments;
@@ -0,0 +1,158 @@
+"""
+Pré-aquecimento do cache para as visões padrão do dashboard.
+
+Na primeira execução de qualquer página, o processo inicia uma thread em
+segundo plano que carrega no cache compartilhado o que a visão padrão pede:
+dimensões, os últimos 30 dias até a última venda e até hoje (detalhado ou
+agregado, conforme o limite de linhas), a série temporal dos gráficos, o
+agregado diário, o ranking de lojas e a tabela RFM da data mais recente.
+A cada INTERVALO_SEGUNDOS a thread confere as entradas e recalcula as que
+venceriam em menos de ANTECEDENCIA_SEGUNDOS, e também as de uma data final
+nova quando chegam vendas de outro dia. Assim o visitante não cai num cache
+frio nem depois de o TTL vencer.
+
+As vendas do período (dados_fato_e_explorer) são uma entrada por período,
+mas as páginas leem os recortes por lojas e canais (recortes_vendas), o
+detalhamento do Explorer (hierarquia_produtos), o agregado diário por mês
+(comparação de períodos) e o ranking de lojas, cada um com a sua entrada.
+Todos são aquecidos para a seleção padrão, todas as lojas e todos os canais,
+e os recortes e o detalhamento também para as DASHBOARD_PRE_AQUECER_FILTROS
+(padrão 3) seleções de lojas e canais mais usadas no processo. Outros
+períodos populares podem ser aquecidos com DASHBOARD_PRE_AQUECER_DIAS (lista
+de dias separados por vírgula, padrão "30"). DASHBOARD_PRE_AQUECIMENTO=0
+desliga a thread.
+
+Com vários processos, cada um roda a sua thread, mas a trava por entrada do
+cache compartilhado faz com que só o primeiro consulte o banco.
+
+O Streamlit não executa código do app antes da primeira sessão, então a
+thread só começa quando alguém abre uma página. Para que o primeiro visitante
+depois de um deploy ou reinício já encontre o cache quente, rode este módulo
+ao lado do servidor, com o mesmo DASHBOARD_CACHE_DIR:
+
+    python pre_aquecimento.py & streamlit run Pagina_Principal.py
+
+Ele faz o mesmo ciclo em laço (--uma-vez para um ciclo só) e os processos do
+Streamlit mapeiam as entradas que ele gravou.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import sqlalchemy
+
+import carregadores
+import graficos
+import limites_consulta
+import queries
+
+ATIVO = os.environ.get("DASHBOARD_PRE_AQUECIMENTO", "1").lower() not in ("0", "false", "nao", "não")
+PERIODOS_DIAS = [int(d) for d in os.environ.get("DASHBOARD_PRE_AQUECER_DIAS", "30").split(",") if d.strip()]
+FILTROS_POPULARES = int(os.environ.get("DASHBOARD_PRE_AQUECER_FILTROS", 3))
+INTERVALO_SEGUNDOS = 60
+ANTECEDENCIA_SEGUNDOS = 120
+
+logger = logging.getLogger("dashboard.pre_aquecimento")
+
+_thread = None
+_lock = threading.Lock()
+
+
+def aquecer(engine, selecoes=()):
+    """
+    Um ciclo de aquecimento; devolve a data final usada. selecoes são pares
+    (lojas, canais) no formato de Filtros.nomes() aquecidos além da padrão.
+    """
+    with engine.connect() as conn:
+        limites = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone()
+    if not limites or not limites.max_date:
+        return None
+    min_date, max_date = limites.min_date, limites.max_date
+
+    # A Análise Operacional usa hoje como data final; as demais páginas, a última venda
+    hoje = date.today()
+    periodos = {(max(min_date, max_date - timedelta(days=dias)), max_date) for dias in PERIODOS_DIAS}
+    periodos |= {(hoje - timedelta(days=dias), hoje) for dias in PERIODOS_DIAS}
+
+    carregadores.tabelas_dimensao.aquecer(engine, antecedencia=ANTECEDENCIA_SEGUNDOS)
+    for start_date, end_date in sorted(periodos):
+        granularidade = graficos.escolher_granularidade(start_date, end_date)
+        carregadores.serie_temporal.aquecer(
+            engine, start_date, end_date, granularidade, antecedencia=ANTECEDENCIA_SEGUNDOS
+        )
+        for carregar, mes in carregadores.entradas_diario(start_date, end_date):
+            carregar.aquecer(engine, mes, antecedencia=ANTECEDENCIA_SEGUNDOS)
+        carregadores.sketch_clientes.aquecer(engine, start_date, end_date, antecedencia=ANTECEDENCIA_SEGUNDOS)
+        carregadores.ranking_lojas.aquecer(engine, start_date, end_date, None, antecedencia=ANTECEDENCIA_SEGUNDOS)
+        if limites_consulta.usar_modo_agregado(engine, start_date, end_date):
+            carregadores.dados_agregados.aquecer(engine, start_date, end_date, antecedencia=ANTECEDENCIA_SEGUNDOS)
+        else:
+            # Seleção padrão (None = todas as lojas e todos os canais), a mesma chave que as páginas pedem
+            carregadores.dados_fato_e_explorer.aquecer(engine, start_date, end_date, antecedencia=ANTECEDENCIA_SEGUNDOS)
+            for lojas, canais in [(None, None), *selecoes]:
+                carregadores.recortes_vendas.aquecer(
+                    engine, start_date, end_date, lojas, canais, antecedencia=ANTECEDENCIA_SEGUNDOS
+                )
+                carregadores.hierarquia_produtos.aquecer(
+                    engine, start_date, end_date, lojas, canais, antecedencia=ANTECEDENCIA_SEGUNDOS
+                )
+    carregadores.dados_rfm.aquecer(engine, max_date, antecedencia=ANTECEDENCIA_SEGUNDOS)
+    return max_date
+
+
+def _executar(engine, selecoes_populares=None):
+    while True:
+        inicio = time.perf_counter()
+        try:
+            selecoes = selecoes_populares(FILTROS_POPULARES) if selecoes_populares and FILTROS_POPULARES else []
+            max_date = aquecer(engine, selecoes)
+            logger.info(f"Pré-aquecimento concluído em {time.perf_counter() - inicio:.1f}s (data final {max_date})")
+        except Exception:
+            logger.exception("Falha no pré-aquecimento do cache")
+        time.sleep(INTERVALO_SEGUNDOS)
+
+
+def iniciar(engine, selecoes_populares=None):
+    """
+    Inicia a thread de pré-aquecimento uma única vez por processo.
+    selecoes_populares(n) devolve as n seleções de lojas e canais mais usadas.
+    """
+    global _thread
+    if not ATIVO or _thread is not None:
+        return
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(
+            target=_executar, args=(engine, selecoes_populares), daemon=True, name="pre-aquecimento"
+        )
+    _thread.start()
+
+
+def main():
+    import relatorios
+    import replicas
+
+    parser = argparse.ArgumentParser(description="Mantém a visão padrão do dashboard no cache compartilhado.")
+    parser.add_argument("--dsn", default=relatorios.dsn_padrao())
+    parser.add_argument("--replicas", nargs="*", default=relatorios.replicas_padrao(), help="DSNs das réplicas de leitura")
+    parser.add_argument("--uma-vez", action="store_true", help="Faz um único ciclo e termina")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("informe --dsn, DASHBOARD_DSN ou .streamlit/secrets.toml")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    engine = replicas.criar_engine(args.dsn, args.replicas)
+    if args.uma_vez:
+        inicio = time.perf_counter()
+        max_date = aquecer(engine)
+        logger.info(f"Pré-aquecimento concluído em {time.perf_counter() - inicio:.1f}s (data final {max_date})")
+    else:
+        _executar(engine)
+
+
+if __name__ == "__main__":
+    main()
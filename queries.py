@@ -74,4 +74,186 @@ SELECT
 FROM rfm r
 LEFT JOIN customers c ON r.customer_id = c.id
 ORDER BY r.frequencia DESC
-"""
\ No newline at end of file
+"""
+
+
+# RFM por loja para os relatórios em lote (relatorios.py). Os limites de
+# frequência e recência são aplicados no banco, para não trazer um par
+# loja × cliente por compra do histórico inteiro.
+SELECT_RFM_POR_LOJA = """
+WITH rfm AS (
+    SELECT
+        store_id, customer_id, COUNT(id) AS frequencia, SUM(total_amount) AS valor_total,
+        MAX(created_at) AS ultima_compra,
+        (%(data_ref)s::date - MAX(created_at)::date) AS dias_sem_comprar
+    FROM sales
+    WHERE customer_id IS NOT NULL
+    GROUP BY store_id, customer_id
+    HAVING COUNT(id) >= %(min_freq)s AND %(data_ref)s::date - MAX(created_at)::date >= %(min_rec)s
+)
+SELECT
+    st.name AS store_name, c.id, COALESCE(c.customer_name, 'Cliente Desconhecido') AS customer_name,
+    c.phone_number, c.email, r.frequencia, r.valor_total,
+    r.ultima_compra, r.dias_sem_comprar
+FROM rfm r
+JOIN stores st ON r.store_id = st.id
+LEFT JOIN customers c ON r.customer_id = c.id
+ORDER BY r.frequencia DESC
+"""
+
+SELECT_VENDAS_NOVAS = """
+SELECT
+    s.id AS sale_id, s.created_at, s.total_amount, s.production_seconds,
+    s.delivery_seconds, s.customer_id, st.name AS store_name,
+    ch.name AS channel_name, EXTRACT(HOUR FROM s.created_at) AS hora_dia
+FROM sales s
+JOIN stores st ON s.store_id = st.id
+JOIN channels ch ON s.channel_id = ch.id
+WHERE s.created_at >= %(start)s AND s.id > %(ultimo_id)s
+ORDER BY s.id
+"""
+
+
+# Consultas agregadas no servidor, usadas quando o período pedido traria
+# linhas demais (ver limites_consulta.py). Todas trazem store_name e
+# channel_name para que os filtros globais funcionem igual ao modo detalhado.
+SELECT_AGREGADO_DIARIO = """
+SELECT
+    s.created_at::date AS created_at_date, st.name AS store_name, ch.name AS channel_name,
+    COUNT(*) AS pedidos, SUM(s.total_amount) AS total_amount,
+    SUM(s.total_amount_items) AS total_amount_items, SUM(s.total_discount) AS total_discount,
+    SUM(s.delivery_fee) AS delivery_fee, SUM(s.service_tax_fee) AS service_tax_fee,
+    SUM(s.production_seconds) AS soma_preparo, COUNT(s.production_seconds) AS n_preparo,
+    SUM(s.delivery_seconds) AS soma_entrega, COUNT(s.delivery_seconds) AS n_entrega
+FROM sales s
+JOIN stores st ON s.store_id = st.id
+JOIN channels ch ON s.channel_id = ch.id
+WHERE s.created_at >= %(start)s AND s.created_at < %(end)s
+GROUP BY 1, 2, 3
+"""
+
+SELECT_AGREGADO_HORARIO = """
+SELECT
+    st.name AS store_name, ch.name AS channel_name,
+    CASE EXTRACT(ISODOW FROM s.created_at)
+        WHEN 1 THEN '1. Seg' WHEN 2 THEN '2. Ter' WHEN 3 THEN '3. Qua'
+        WHEN 4 THEN '4. Qui' WHEN 5 THEN '5. Sex' WHEN 6 THEN '6. Sab'
+        WHEN 7 THEN '7. Dom'
+    END AS dia_semana_nome,
+    EXTRACT(HOUR FROM s.created_at) AS hora_dia,
+    COUNT(*) AS pedidos,
+    SUM(s.production_seconds) AS soma_preparo, COUNT(s.production_seconds) AS n_preparo,
+    SUM(s.delivery_seconds) AS soma_entrega, COUNT(s.delivery_seconds) AS n_entrega
+FROM sales s
+JOIN stores st ON s.store_id = st.id
+JOIN channels ch ON s.channel_id = ch.id
+WHERE s.created_at >= %(start)s AND s.created_at < %(end)s
+GROUP BY 1, 2, 3, 4
+"""
+
+SELECT_AGREGADO_PRODUTOS = """
+SELECT
+    st.name AS store_name, ch.name AS channel_name, p.id AS product_id,
+    p.name AS product_name, c.name AS category_name,
+    SUM(ps.quantity) AS quantity, SUM(ps.total_price) AS product_total_price
+FROM sales s
+JOIN stores st ON s.store_id = st.id
+JOIN channels ch ON s.channel_id = ch.id
+JOIN product_sales ps ON s.id = ps.sale_id
+JOIN products p ON ps.product_id = p.id
+LEFT JOIN categories c ON p.category_id = c.id
+WHERE s.created_at >= %(start)s AND s.created_at < %(end)s
+GROUP BY 1, 2, 3, 4, 5
+"""
+
+SELECT_AGREGADO_PAGAMENTOS = """
+SELECT
+    st.name AS store_name, ch.name AS channel_name, pg.payment_type_id,
+    SUM(pg.value) AS value
+FROM sales s
+JOIN stores st ON s.store_id = st.id
+JOIN channels ch ON s.channel_id = ch.id
+JOIN payments pg ON s.id = pg.sale_id
+WHERE s.created_at >= %(start)s AND s.created_at < %(end)s
+GROUP BY 1, 2, 3
+"""
+
+
+# Série temporal para os gráficos de linha. O tamanho do balde (day, week ou
+# month) é escolhido por graficos.escolher_granularidade conforme o período.
+SELECT_SERIE_TEMPORAL = """
+SELECT
+    date_trunc(%(granularidade)s, s.created_at)::date AS periodo,
+    st.name AS store_name, ch.name AS channel_name,
+    COUNT(*) AS pedidos, SUM(s.total_amount) AS total_amount,
+    SUM(s.production_seconds) AS soma_preparo, COUNT(s.production_seconds) AS n_preparo,
+    SUM(s.delivery_seconds) AS soma_entrega, COUNT(s.delivery_seconds) AS n_entrega
+FROM sales s
+JOIN stores st ON s.store_id = st.id
+JOIN channels ch ON s.channel_id = ch.id
+WHERE s.created_at >= %(start)s AND s.created_at < %(end)s
+GROUP BY 1, 2, 3
+"""
+
+
+# Uma linha por venda identificada, para a análise de coortes. Lida com
+# COPY ... (FORMAT binary) por coortes.py: todas as colunas têm tamanho fixo e
+# nenhuma é nula, o que permite ler o resultado direto como array do numpy.
+# lojas/canais são listas de ids; NULL significa todas.
+SELECT_VENDAS_POR_CLIENTE = """
+SELECT s.customer_id::int8, s.created_at::timestamp, s.total_amount::float8
+FROM sales s
+WHERE s.customer_id IS NOT NULL AND s.total_amount IS NOT NULL
+  AND s.created_at < %(end)s
+  AND (%(lojas)s::int[] IS NULL OR s.store_id = ANY(%(lojas)s::int[]))
+  AND (%(canais)s::int[] IS NULL OR s.channel_id = ANY(%(canais)s::int[]))
+"""
+
+
+# Sketches HyperLogLog dos clientes (ver contagem_distinta.py). A CTE calcula,
+# para cada registro, o maior rank; o SELECT final empacota os registros não
+# nulos em bytea (índice int2 + rank em 1 byte).
+SELECT_SKETCH_CLIENTES = """
+WITH registros AS (
+    SELECT
+        s.store_id, s.channel_id, x.h & 4095 AS registro,
+        MAX(COALESCE(NULLIF(position(B'1' IN (x.h >> 12)::bit(52)), 0), 53)) AS rank
+    FROM sales s
+    CROSS JOIN LATERAL (SELECT hashint8extended(s.customer_id::int8, 0) AS h) x
+    WHERE s.customer_id IS NOT NULL AND s.created_at >= %(start)s AND s.created_at < %(end)s
+    GROUP BY 1, 2, 3
+)
+SELECT
+    st.name AS store_name, ch.name AS channel_name,
+    string_agg(int2send(r.registro::int2) || set_byte(decode('00', 'hex'), 0, r.rank), ''::bytea) AS registros
+FROM registros r
+JOIN stores st ON r.store_id = st.id
+JOIN channels ch ON r.channel_id = ch.id
+GROUP BY 1, 2
+"""
+
+# Sketches diários guardados por contagem_distinta.sql (opcional)
+SELECT_TABELA_SKETCH = "SELECT to_regclass('sketch_clientes_diario') IS NOT NULL"
+
+SELECT_COBERTURA_SKETCH = "SELECT MIN(dia) AS inicio, MAX(dia) AS fim FROM sketch_clientes_diario"
+
+# Concatenar sketches esparsos equivale a juntá-los: na leitura, cada
+# registro fica com o maior rank entre as repetições.
+SELECT_SKETCH_CLIENTES_DIARIO = """
+SELECT st.name AS store_name, ch.name AS channel_name, string_agg(d.registros, ''::bytea) AS registros
+FROM sketch_clientes_diario d
+JOIN stores st ON d.store_id = st.id
+JOIN channels ch ON d.channel_id = ch.id
+WHERE d.dia >= %(start)s AND d.dia <= %(end)s
+GROUP BY 1, 2
+"""
+
+# Atraso de replicação (replicas.py)
+SELECT_LSN_PRIMARIO = "SELECT pg_current_wal_lsn()::text"
+
+SELECT_POSICAO_REPLICA = """
+SELECT
+    pg_is_in_recovery() AS em_recuperacao,
+    pg_last_wal_replay_lsn()::text AS lsn,
+    EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) AS desde_ultima_transacao_s
+"""
@@ -0,0 +1,213 @@
+"""
+Relatórios por loja em lote, sem abrir o dashboard.
+
+Para cada loja ativa grava os indicadores da Visão Geral e da Análise de
+Descontos, o faturamento por canal, forma de pagamento e produto e a lista
+RFM de clientes que não voltam, em Parquet ou CSV:
+
+    <saida>/resumo_lojas.parquet          uma linha de indicadores por loja
+    <saida>/<id>_<loja>/indicadores.parquet
+    <saida>/<id>_<loja>/descontos_por_canal.parquet
+    <saida>/<id>_<loja>/pagamentos.parquet
+    <saida>/<id>_<loja>/produtos.parquet
+    <saida>/<id>_<loja>/clientes_rfm.parquet
+
+Os dados são carregados uma única vez, para todas as lojas, pelas mesmas
+consultas agregadas do dashboard (carregadores.py), ordenados por loja e
+gravados no cache compartilhado. Os processos do pool mapeiam os mesmos
+arquivos, sem nova consulta nem cópia, guardam só onde começa e termina cada
+loja em cada tabela, e cada relatório lê a fatia df.iloc[inicio:fim] da sua
+loja, montando os indicadores com os cálculos de indicadores.py. Assim a
+memória dos filhos não cresce com o tamanho dos dados.
+
+Uso (agende, por exemplo, todo dia de madrugada):
+    python relatorios.py                                  # últimos 30 dias até a última venda
+    python relatorios.py --inicio 2025-10-01 --fim 2025-10-31 --formato csv
+    python relatorios.py --lojas "Loja 1" "Loja 2" --saida /tmp/relatorios
+
+O banco vem de --dsn, da variável DASHBOARD_DSN ou de .streamlit/secrets.toml;
+as réplicas de leitura (opcionais), de --replicas, de DASHBOARD_REPLICAS
+(separadas por vírgula) ou da chave replicas do mesmo secrets.toml.
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+import sqlalchemy
+import toml
+
+import cache_compartilhado
+import carregadores
+import contagem_distinta
+import indicadores
+import queries
+import replicas
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_SEGREDOS = os.path.join(RAIZ, ".streamlit", "secrets.toml")
+
+NOMES_TABELAS = ['diario', 'produtos', 'pagamentos', 'sketch', 'rfm']
+
+_args = None
+_tabelas = None
+_limites = None
+
+
+def dsn_padrao():
+    if os.environ.get("DASHBOARD_DSN"):
+        return os.environ["DASHBOARD_DSN"]
+    try:
+        return toml.load(ARQUIVO_SEGREDOS)["connections"]["neon_db"]
+    except (FileNotFoundError, KeyError):
+        return None
+
+
+def replicas_padrao():
+    if os.environ.get("DASHBOARD_REPLICAS"):
+        return [dsn.strip() for dsn in os.environ["DASHBOARD_REPLICAS"].split(",") if dsn.strip()]
+    try:
+        return toml.load(ARQUIVO_SEGREDOS)["connections"].get("replicas", [])
+    except (FileNotFoundError, KeyError):
+        return []
+
+
+@cache_compartilhado.compartilhado(ttl=3600)
+def carregar(engine, inicio, fim, min_freq, min_rec):
+    """
+    Todas as cargas do relatório, para todas as lojas de uma vez: as lojas e
+    as tabelas de NOMES_TABELAS, cada uma ordenada por store_name.
+    """
+    df_stores, _, df_payment_types = carregadores.tabelas_dimensao(engine)
+    df_diario, _, df_produtos, df_pagamentos = carregadores.dados_agregados(engine, inicio, fim)
+    df_sketch = carregadores.sketch_clientes(engine, inicio, fim)
+    df_rfm = carregadores.dados_rfm_por_loja(engine, fim, min_freq, min_rec)
+    df_pagamentos = df_pagamentos.merge(df_payment_types, on='payment_type_id')
+    tabelas = (df_diario, df_produtos, df_pagamentos, df_sketch, df_rfm)
+    return (df_stores,) + tuple(
+        df.sort_values('store_name', kind='stable', ignore_index=True) for df in tabelas
+    )
+
+
+def limites_por_loja(df):
+    """{loja: (inicio, fim)} de uma tabela ordenada por store_name."""
+    primeiras = df['store_name'].drop_duplicates()
+    fins = list(primeiras.index[1:]) + [len(df)]
+    return {loja: (inicio, fim) for loja, inicio, fim in zip(primeiras, primeiras.index, fins)}
+
+
+def _iniciar_processo(args):
+    global _args, _tabelas, _limites
+    _args = args
+    # Acerto no cache compartilhado: só mapeia os arquivos gravados pelo processo principal
+    engine = replicas.criar_engine(args.dsn, args.replicas)
+    _, *tabelas = carregar(engine, args.inicio, args.fim, args.min_freq, args.min_rec)
+    _tabelas = dict(zip(NOMES_TABELAS, tabelas))
+    _limites = {nome: limites_por_loja(df) for nome, df in _tabelas.items()}
+
+
+def _da_loja(nome, loja):
+    inicio, fim = _limites[nome].get(loja, (0, 0))
+    return _tabelas[nome].iloc[inicio:fim]
+
+
+def gravar(df, caminho, formato):
+    if formato == "parquet":
+        df.to_parquet(f"{caminho}.parquet", index=False)
+    else:
+        df.to_csv(f"{caminho}.csv", index=False, encoding='utf-8-sig')
+
+
+def gerar_relatorio(loja):
+    """Grava os arquivos de uma loja e devolve a linha dela no resumo."""
+    store_id, store_name = loja
+    df_diario = _da_loja('diario', store_name)
+    df_sketch = _da_loja('sketch', store_name)
+
+    kpis = indicadores.visao_geral_agregada(df_diario)
+    resumo = indicadores.resumo_financeiro(df_diario)
+    linha = {
+        'store_id': store_id,
+        'store_name': store_name,
+        'faturamento': kpis['faturamento'],
+        'pedidos': kpis['pedidos'],
+        'ticket_medio': kpis['ticket_medio'],
+        'clientes_unicos_aprox': contagem_distinta.estimar(df_sketch['registros']),
+        'tempo_medio_preparo_min': kpis['preparo_seg'] / 60 if kpis['preparo_seg'] else None,
+        'tempo_medio_entrega_min': kpis['entrega_seg'] / 60 if kpis['entrega_seg'] else None,
+        **resumo,
+    }
+
+    pasta = os.path.join(_args.saida, f"{store_id}_{re.sub(r'[^0-9A-Za-zÀ-ÿ_-]+', '_', store_name).strip('_')}")
+    os.makedirs(pasta, exist_ok=True)
+    gravar(pd.DataFrame([linha]), os.path.join(pasta, "indicadores"), _args.formato)
+    gravar(
+        indicadores.descontos_por_canal(df_diario, ('pedidos', 'sum')).reset_index(),
+        os.path.join(pasta, "descontos_por_canal"), _args.formato
+    )
+    gravar(
+        _da_loja('pagamentos', store_name).groupby('payment_description', as_index=False)['value'].sum()
+        .sort_values('value', ascending=False),
+        os.path.join(pasta, "pagamentos"), _args.formato
+    )
+    gravar(
+        _da_loja('produtos', store_name).groupby(['product_name', 'category_name'], as_index=False, dropna=False)
+        [['quantity', 'product_total_price']].sum()
+        .sort_values('product_total_price', ascending=False),
+        os.path.join(pasta, "produtos"), _args.formato
+    )
+    gravar(
+        indicadores.filtrar_rfm(_da_loja('rfm', store_name), _args.min_freq, _args.min_rec).drop(columns='store_name'),
+        os.path.join(pasta, "clientes_rfm"), _args.formato
+    )
+    return linha
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera os relatórios de todas as lojas sem abrir o dashboard.")
+    parser.add_argument("--dsn", default=dsn_padrao())
+    parser.add_argument("--replicas", nargs="*", default=replicas_padrao(), help="DSNs das réplicas de leitura")
+    parser.add_argument("--inicio", type=date.fromisoformat, help="Padrão: --dias dias até --fim")
+    parser.add_argument("--fim", type=date.fromisoformat, help="Padrão: data da última venda")
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--lojas", nargs="+", help="Nomes das lojas (padrão: todas as ativas)")
+    parser.add_argument("--formato", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--saida", help="Diretório de saída (padrão: relatorios/<fim>)")
+    parser.add_argument("--min-freq", type=int, default=3, help="RFM: mínimo de pedidos na loja")
+    parser.add_argument("--min-rec", type=int, default=30, help="RFM: mínimo de dias sem comprar")
+    parser.add_argument("--processos", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("informe --dsn, DASHBOARD_DSN ou .streamlit/secrets.toml")
+
+    engine = replicas.criar_engine(args.dsn, args.replicas)
+    if args.fim is None:
+        with engine.connect() as conn:
+            args.fim = conn.execute(sqlalchemy.text(queries.SELECT_DATE_LIMITS)).fetchone().max_date
+    if args.inicio is None:
+        args.inicio = args.fim - timedelta(days=args.dias)
+    args.saida = args.saida or os.path.join("relatorios", str(args.fim))
+
+    inicio = time.perf_counter()
+    print(f"Carregando dados de {args.inicio} a {args.fim}...")
+    df_stores, *_ = carregar(engine, args.inicio, args.fim, args.min_freq, args.min_rec)
+    replicas.fechar_conexoes(engine)  # os processos filhos abrem as próprias conexões
+    if args.lojas:
+        df_stores = df_stores[df_stores['store_name'].isin(args.lojas)]
+    lojas = list(df_stores[['store_id', 'store_name']].itertuples(index=False, name=None))
+    print(f"Dados carregados em {time.perf_counter() - inicio:.1f}s. Gerando {len(lojas)} relatórios...")
+
+    os.makedirs(args.saida, exist_ok=True)
+    processos = max(1, min(args.processos, len(lojas)))
+    with ProcessPoolExecutor(processos, initializer=_iniciar_processo, initargs=(args,)) as pool:
+        linhas = list(pool.map(gerar_relatorio, lojas, chunksize=max(1, len(lojas) // (processos * 4))))
+
+    gravar(pd.DataFrame(linhas), os.path.join(args.saida, "resumo_lojas"), args.formato)
+    print(f"{len(linhas)} relatórios em {args.saida} ({time.perf_counter() - inicio:.1f}s no total).")
+
+
+if __name__ == "__main__":
+    main()
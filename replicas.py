@@ -0,0 +1,234 @@
+"""
+Réplicas de leitura para as consultas analíticas pesadas.
+
+As cargas de carregadores.py (vendas do período, agregados, RFM, coortes)
+pedem o engine a leitura(engine), que devolve uma das réplicas configuradas
+em vez do primário em que o PDV grava. O atraso de cada réplica é medido no
+máximo a cada DASHBOARD_REPLICA_VERIFICACAO_S segundos, numa thread à parte:
+enquanto a verificação espera um servidor lento, as sessões continuam
+roteando pelo último estado conhecido (antes da primeira verificação, o
+primário). Réplica atrasada mais que DASHBOARD_REPLICA_ATRASO_MAX_S, fora do
+ar ou que perdeu a conexão deixa de receber leituras até a próxima
+verificação, e sem nenhuma réplica em dia as leituras voltam ao primário.
+
+O atraso é um limite superior de quão velhos estão os dados da réplica, o
+menor entre:
+
+- o tempo desde a última transação que ela reproduziu (exagera depois de um
+  período sem escritas no primário);
+- o tempo desde a verificação mais recente em que o primário estava numa
+  posição do WAL que a réplica já alcançou.
+
+Réplica que já alcançou a posição atual do primário está em dia.
+
+Uma consulta cancelada na réplica por conflito com a replicação (SQLSTATE
+40001, "conflict with recovery") é repetida no primário por ler(), em vez
+de chegar à página como erro.
+
+Consultas leves que precisam do dado mais novo (limites de data, opções dos
+filtros, modo ao vivo, estimativa de linhas) usam o engine primário direto.
+"""
+import collections
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+
+import psycopg2.errors
+import sqlalchemy
+from sqlalchemy import event
+
+import limites_consulta
+import queries
+
+ATRASO_MAX_S = float(os.environ.get("DASHBOARD_REPLICA_ATRASO_MAX_S", 30))
+VERIFICACAO_S = float(os.environ.get("DASHBOARD_REPLICA_VERIFICACAO_S", 10))
+# Réplica fora do ar ou travada não pode prender a verificação
+TIMEOUT_CONEXAO_S = 3
+TIMEOUT_VERIFICACAO_MS = 3000
+
+logger = logging.getLogger("dashboard.replicas")
+
+_lock = threading.Lock()
+# Engine primário -> _Roteamento
+_roteamentos = weakref.WeakKeyDictionary()
+_vez = itertools.count()
+
+
+def _lsn(texto):
+    """'16/B374D848' -> inteiro comparável."""
+    alto, baixo = texto.split("/")
+    return (int(alto, 16) << 32) + int(baixo, 16)
+
+
+class _Replica:
+    def __init__(self, dsn):
+        self.engine = limites_consulta.configurar_engine(sqlalchemy.create_engine(
+            dsn, pool_pre_ping=True, connect_args={"connect_timeout": TIMEOUT_CONEXAO_S}
+        ))
+        self.nome = self.engine.url.render_as_string(hide_password=True)
+        self.atraso_s = None
+        self.erro = None
+        self.verificada_em = 0.0
+        self.leituras = 0
+
+        @event.listens_for(self.engine, "handle_error")
+        def desconectada(contexto):
+            if contexto.is_disconnect:
+                self.atraso_s = None
+                self.erro = "conexão perdida"
+
+    @property
+    def em_dia(self):
+        return self.atraso_s is not None and self.atraso_s <= ATRASO_MAX_S
+
+
+class _Roteamento:
+    def __init__(self, dsns):
+        self.replicas = [_Replica(dsn) for dsn in dsns]
+        # (instante, LSN do primário) das últimas verificações
+        self.amostras = collections.deque(maxlen=64)
+        self.verificando = False
+
+
+def criar_engine(dsn, dsns_replicas=()):
+    """
+    Engine primário como o dashboard usa: statement_timeout em cada conexão
+    (limites_consulta) e as réplicas de leitura registradas.
+    """
+    engine = limites_consulta.configurar_engine(sqlalchemy.create_engine(dsn))
+    return configurar(engine, dsns_replicas)
+
+
+def configurar(engine, dsns):
+    """Registra as réplicas de leitura (DSNs) do engine primário."""
+    if isinstance(dsns, str):
+        dsns = [dsns]
+    _roteamentos[engine] = _Roteamento(dsns or [])
+    return engine
+
+
+def _atraso(roteamento, posicao, agora):
+    if not posicao.em_recuperacao:
+        return 0.0  # não é uma réplica física
+    if posicao.lsn is None:
+        return None
+    reproduzido = _lsn(posicao.lsn)
+    if roteamento.amostras and reproduzido >= roteamento.amostras[-1][1]:
+        return 0.0
+    limites = [
+        agora - instante for instante, lsn in reversed(roteamento.amostras) if lsn <= reproduzido
+    ][:1]
+    if posicao.desde_ultima_transacao_s is not None:
+        limites.append(float(posicao.desde_ultima_transacao_s))
+    return min(limites) if limites else None
+
+
+def _sondar(engine, consulta):
+    with engine.connect() as conn:
+        # SET LOCAL vale só para esta transação, não para a conexão do pool
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {TIMEOUT_VERIFICACAO_MS}")
+        return conn.exec_driver_sql(consulta).fetchone()
+
+
+def _verificar(engine, roteamento):
+    try:
+        try:
+            lsn = _lsn(_sondar(engine, queries.SELECT_LSN_PRIMARIO)[0])
+            roteamento.amostras.append((time.time(), lsn))
+        except sqlalchemy.exc.SQLAlchemyError as e:
+            logger.warning(f"Posição do WAL do primário indisponível: {e}")
+
+        for replica in roteamento.replicas:
+            try:
+                posicao = _sondar(replica.engine, queries.SELECT_POSICAO_REPLICA)
+                atraso_s = _atraso(roteamento, posicao, time.time())
+                erro = None if atraso_s is not None else "atraso desconhecido"
+            except sqlalchemy.exc.SQLAlchemyError as e:
+                atraso_s = None
+                erro = str(getattr(e, "orig", None) or e).strip().splitlines()[0]
+            with _lock:
+                replica.atraso_s, replica.erro = atraso_s, erro
+                replica.verificada_em = time.time()
+            if not replica.em_dia:
+                logger.warning(
+                    f"Réplica {replica.nome} fora do roteamento "
+                    f"(atraso: {replica.atraso_s}, erro: {replica.erro})"
+                )
+    finally:
+        with _lock:
+            roteamento.verificando = False
+
+
+def leitura(engine):
+    """
+    Engine para uma consulta analítica: as réplicas em dia se revezam; sem
+    nenhuma, o próprio primário. Nunca espera pela verificação do atraso.
+    """
+    roteamento = _roteamentos.get(engine)
+    if not roteamento or not roteamento.replicas:
+        return engine
+
+    with _lock:
+        vencida = time.time() - min(r.verificada_em for r in roteamento.replicas) >= VERIFICACAO_S
+        if vencida and not roteamento.verificando:
+            roteamento.verificando = True
+            threading.Thread(
+                target=_verificar, args=(engine, roteamento), daemon=True, name="verificacao-replicas"
+            ).start()
+        em_dia = [r for r in roteamento.replicas if r.em_dia]
+        if not em_dia:
+            return engine
+        replica = em_dia[next(_vez) % len(em_dia)]
+        replica.leituras += 1
+    return replica.engine
+
+
+def conflito_com_replicacao(erro):
+    """True para a consulta cancelada na réplica por conflito com a replicação (40001)."""
+    return isinstance(getattr(erro, "orig", erro), psycopg2.errors.SerializationFailure)
+
+
+def ler(engine, funcao):
+    """
+    funcao(engine_de_leitura) numa réplica escolhida por leitura(); se a
+    réplica cancelar a consulta por conflito com a replicação, repete no
+    primário.
+    """
+    alvo = leitura(engine)
+    try:
+        return funcao(alvo)
+    except (sqlalchemy.exc.DBAPIError, psycopg2.Error) as e:
+        if alvo is engine or not conflito_com_replicacao(e):
+            raise
+        logger.warning(
+            "Consulta cancelada por conflito na réplica; repetindo no primário: "
+            + str(getattr(e, "orig", None) or e).strip().splitlines()[0]
+        )
+    return funcao(engine)
+
+
+def fechar_conexoes(engine):
+    """Fecha os pools do primário e das réplicas (antes de criar processos filhos)."""
+    engine.dispose()
+    roteamento = _roteamentos.get(engine)
+    for replica in roteamento.replicas if roteamento else []:
+        replica.engine.dispose()
+
+
+def estado():
+    """Uma linha por réplica configurada, para o painel de diagnóstico e as métricas."""
+    with _lock:
+        return [
+            {
+                "replica": r.nome,
+                "atraso_s": r.atraso_s,
+                "em_dia": r.em_dia,
+                "erro": r.erro,
+                "verificada_em": r.verificada_em,
+                "leituras": r.leituras,
+            }
+            for roteamento in _roteamentos.values() for r in roteamento.replicas
+        ]
@@ -0,0 +1,138 @@
+"""
+Modo ao vivo: acompanha as vendas do dia atual sem recarregar o período inteiro.
+
+O buffer do dia é compartilhado entre todas as sessões do processo. A cada
+consulta ele busca apenas as vendas com id maior que o último já visto e soma
+essas linhas aos agregados acumulados, então o custo de cada atualização é
+proporcional ao número de pedidos novos.
+
+Os indicadores do buffer aparecem num painel próprio ("Hoje (ao vivo)"): os
+indicadores e gráficos do período selecionado continuam vindo do cache e não
+somam as vendas novas.
+
+Limitação: uma venda confirmada com id menor que o último visto (transações
+concorrentes no PDV) só aparece quando o buffer do dia seguinte for criado.
+"""
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+import queries
+
+INTERVALO_SEGUNDOS = 5
+
+CHAVES = ['store_name', 'channel_name', 'hora_dia']
+COLUNAS_AGREGADAS = ['faturamento', 'pedidos', 'soma_preparo', 'n_preparo', 'soma_entrega', 'n_entrega']
+
+
+def _agregar(df):
+    return df.assign(
+        n_preparo=df['production_seconds'].notna().astype(int),
+        n_entrega=df['delivery_seconds'].notna().astype(int),
+    ).groupby(CHAVES).agg(
+        faturamento=('total_amount', 'sum'),
+        pedidos=('sale_id', 'count'),
+        soma_preparo=('production_seconds', 'sum'),
+        n_preparo=('n_preparo', 'sum'),
+        soma_entrega=('delivery_seconds', 'sum'),
+        n_entrega=('n_entrega', 'sum'),
+    )
+
+
+class BufferAoVivo:
+    def __init__(self, dia):
+        self.dia = dia
+        self.ultimo_id = 0
+        self.ultima_consulta = 0.0
+        self.ultima_atualizacao = None
+        # Colunas float desde o início: com dtype object as divisões por hora
+        # levantariam ZeroDivisionError em vez de dar NaN
+        self.agregados = pd.DataFrame(
+            {coluna: pd.Series(dtype=float) for coluna in COLUNAS_AGREGADAS},
+            index=pd.MultiIndex.from_arrays([[], [], []], names=CHAVES)
+        )
+        self.clientes = {}
+        self._lock = threading.Lock()
+
+    def atualizar(self, engine):
+        """
+        Busca as vendas novas do dia e as anexa ao buffer. Várias sessões podem
+        chamar ao mesmo tempo: só uma consulta ao banco é feita por intervalo.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            if agora - self.ultima_consulta < INTERVALO_SEGUNDOS:
+                return 0
+            self.ultima_consulta = agora
+
+            query_params = {"start": self.dia, "ultimo_id": self.ultimo_id}
+            with engine.connect() as conn:
+                df_novas = pd.read_sql(queries.SELECT_VENDAS_NOVAS, conn, params=query_params)
+
+            self.ultima_atualizacao = datetime.now()
+            if df_novas.empty:
+                return 0
+
+            self.ultimo_id = int(df_novas['sale_id'].max())
+            self.agregados = self.agregados.add(_agregar(df_novas), fill_value=0)
+
+            df_clientes = df_novas.dropna(subset=['customer_id'])
+            for (loja, canal), ids in df_clientes.groupby(['store_name', 'channel_name'])['customer_id']:
+                self.clientes.setdefault((loja, canal), set()).update(ids)
+            return len(df_novas)
+
+    def kpis(self, lojas=None, canais=None):
+        """
+        Indicadores do dia a partir dos agregados acumulados. `lojas` e `canais`
+        iguais a None significam "todas/todos".
+        """
+        with self._lock:
+            agregados = self.agregados
+            clientes = dict(self.clientes)
+
+        if lojas is not None:
+            agregados = agregados[agregados.index.get_level_values('store_name').isin(lojas)]
+        if canais is not None:
+            agregados = agregados[agregados.index.get_level_values('channel_name').isin(canais)]
+
+        clientes_unicos = set()
+        for (loja, canal), ids in clientes.items():
+            if (lojas is None or loja in lojas) and (canais is None or canal in canais):
+                clientes_unicos |= ids
+
+        totais = agregados.sum()
+        pedidos = totais.get('pedidos', 0)
+        faturamento = totais.get('faturamento', 0)
+        por_hora = agregados.groupby(level='hora_dia')[COLUNAS_AGREGADAS].sum().reset_index()
+        por_hora['tempo_preparo_min'] = por_hora['soma_preparo'] / por_hora['n_preparo'].where(por_hora['n_preparo'] > 0) / 60
+        por_hora['tempo_entrega_min'] = por_hora['soma_entrega'] / por_hora['n_entrega'].where(por_hora['n_entrega'] > 0) / 60
+
+        return {
+            "faturamento": faturamento,
+            "pedidos": int(pedidos),
+            "ticket_medio": faturamento / pedidos if pedidos > 0 else 0,
+            "clientes": len(clientes_unicos),
+            "preparo_seg": totais['soma_preparo'] / totais['n_preparo'] if totais.get('n_preparo', 0) > 0 else None,
+            "entrega_seg": totais['soma_entrega'] / totais['n_entrega'] if totais.get('n_entrega', 0) > 0 else None,
+            "por_hora": por_hora,
+        }
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def obter_buffer(dia):
+    return BufferAoVivo(dia)
+
+
+def buffer_de_hoje(engine):
+    buffer = obter_buffer(datetime.now().date())
+    buffer.atualizar(engine)
+    return buffer
+
+
+def filtros_para_kpis(selected_store_names, selected_channel_names):
+    lojas = None if "Todas as Lojas" in selected_store_names else selected_store_names
+    canais = None if "Todos os Canais" in selected_channel_names else selected_channel_names
+    return lojas, canais
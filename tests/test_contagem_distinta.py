@@ -0,0 +1,81 @@
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import contagem_distinta
+
+
+def sketch(registros):
+    """Sketch no formato do SQL: int2send(registro) || byte do rank, por registro."""
+    return b"".join(struct.pack(">HB", registro, rank) for registro, rank in registros)
+
+
+def sketch_de_clientes(hashes):
+    """O mesmo sketch que SELECT_SKETCH_CLIENTES monta a partir dos hashes de 64 bits."""
+    registros = hashes & 4095
+    resto = (hashes >> np.uint64(12)) & np.uint64((1 << 52) - 1)
+    # position(B'1' IN resto::bit(52)): 1 para o bit mais alto, 53 quando não há bit 1
+    bits = np.array([int(r).bit_length() for r in resto])
+    ranks = np.where(bits == 0, 53, 53 - bits)
+    maximos = pd.Series(ranks).groupby(registros).max()
+    return sketch(zip(maximos.index, maximos.to_numpy()))
+
+
+def hashes(n, semente):
+    return np.unique(np.random.default_rng(semente).integers(0, 2**64, size=n, dtype=np.uint64))
+
+
+def test_mesclar_fica_com_o_maior_rank_de_cada_registro():
+    a = sketch([(5, 3), (10, 1)])
+    b = sketch([(5, 7), (4095, 2)])
+
+    denso = contagem_distinta.mesclar([a, b])
+
+    assert denso.shape == (contagem_distinta.REGISTROS,)
+    assert (denso[5], denso[10], denso[4095]) == (7, 1, 2)
+    assert np.count_nonzero(denso) == 3
+    assert contagem_distinta.codificar(denso) == sketch([(5, 7), (10, 1), (4095, 2)])
+
+
+def test_concatenar_sketches_equivale_a_mesclar():
+    a = sketch([(1, 2), (3, 4)])
+    b = sketch([(1, 5), (2, 1)])
+
+    assert np.array_equal(contagem_distinta.mesclar([a + b]), contagem_distinta.mesclar([a, b]))
+
+
+@pytest.mark.parametrize("n", [100, 3_000, 50_000])
+def test_estimativa_dentro_do_erro_do_hll(n):
+    clientes = hashes(n, semente=n)
+    metade = len(clientes) // 2
+    # Os dois sketches se sobrepõem: o cliente do meio aparece nos dois
+    sketches = [sketch_de_clientes(clientes[:metade + 1]), sketch_de_clientes(clientes[metade:])]
+
+    estimativa = contagem_distinta.estimar(sketches)
+
+    assert abs(estimativa - len(clientes)) <= 3 * contagem_distinta.ERRO_PADRAO * len(clientes)
+
+
+def test_estimar_por_grupo_igual_a_estimar():
+    clientes = hashes(20_000, semente=1)
+    partes = np.array_split(clientes, 6)
+    df = pd.DataFrame({
+        "store_name": ["Loja A", "Loja A", "Loja B", "Loja A", "Loja B", "Loja C"],
+        "channel_name": ["iFood", "Balcão", "iFood", "iFood", "Balcão", "iFood"],
+        "registros": [sketch_de_clientes(parte) for parte in partes],
+    })
+
+    resultado = contagem_distinta.estimar_por_grupo(df, ["store_name"]).set_index("store_name")["clientes"]
+
+    esperado = {
+        loja: contagem_distinta.estimar(grupo["registros"]) for loja, grupo in df.groupby("store_name")
+    }
+    assert resultado.to_dict() == esperado
+
+
+def test_estimar_por_grupo_vazio():
+    df = pd.DataFrame(columns=["store_name", "registros"])
+
+    assert list(contagem_distinta.estimar_por_grupo(df, ["store_name"]).columns) == ["store_name", "clientes"]
@@ -0,0 +1,65 @@
+import struct
+
+import numpy as np
+import pandas as pd
+
+import coortes
+
+
+def test_matriz_conta_clientes_pedidos_e_receita_por_coorte_e_idade():
+    # mes_inicio=10, mes_fim=12; o cliente 1 chegou no mês 9, antes do período
+    vendas = [
+        (1, 9, 50.0), (1, 10, 8.0),
+        (2, 10, 10.0), (2, 10, 5.0), (2, 12, 7.0),
+        (5, 10, 4.0), (5, 11, 6.0),
+        (3, 11, 20.0), (3, 12, 1.0),
+        (4, 12, 3.0),
+    ]
+    clientes, meses, valores = (np.array(coluna) for coluna in zip(*vendas))
+
+    df = coortes.matriz(clientes.astype(np.int64), meses.astype(np.int32), valores, 10, 12)
+
+    esperado = pd.DataFrame(
+        [
+            (10, 0, 2, 3, 19.0, 2),
+            (10, 1, 1, 1, 6.0, 2),
+            (10, 2, 1, 1, 7.0, 2),
+            (11, 0, 1, 1, 20.0, 1),
+            (11, 1, 1, 1, 1.0, 1),
+            (12, 0, 1, 1, 3.0, 1),
+        ],
+        columns=["coorte", "idade", "clientes", "pedidos", "receita", "tamanho_coorte"],
+    )
+    pd.testing.assert_frame_equal(df, esperado, check_dtype=False)
+
+
+def test_matriz_sem_vendas():
+    vazio = np.array([], dtype=np.int64)
+
+    df = coortes.matriz(vazio, vazio.astype(np.int32), vazio.astype(np.float64), 10, 12)
+
+    assert df.empty
+
+
+def copy_binario(vendas):
+    """Fluxo do COPY ... TO STDOUT WITH (FORMAT binary) de (cliente, microssegundos desde 2000, valor)."""
+    cabecalho = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+    linhas = b"".join(
+        struct.pack(">hiqiqid", 3, 8, cliente, 8, micros, 8, valor) for cliente, micros, valor in vendas
+    )
+    return cabecalho + linhas + b"\xff\xff"
+
+
+def test_leitor_copy_converte_o_fluxo_em_blocos_irregulares():
+    um_dia = 24 * 3600 * 10 ** 6
+    vendas = [(7, 0, 1.5), (8, 31 * um_dia, 2.0), (7, 366 * um_dia, 3.25)]  # jan/2000, fev/2000, jan/2001
+    fluxo = copy_binario(vendas)
+
+    leitor = coortes._LeitorCopy()
+    for inicio in range(0, len(fluxo), 5):  # blocos que cortam cabeçalho e linhas no meio
+        leitor.write(fluxo[inicio:inicio + 5])
+    clientes, meses, valores = leitor.arrays()
+
+    assert clientes.tolist() == [7, 8, 7]
+    assert [coortes.rotulo_mes(m) for m in meses] == ["2000-01", "2000-02", "2001-01"]
+    assert valores.tolist() == [1.5, 2.0, 3.25]